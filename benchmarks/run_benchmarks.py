@@ -0,0 +1,380 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+""" Microbenchmarks for the input hot path. Runs with plain Python: no Kit, no hid module and no device needed.
+
+    python benchmarks/run_benchmarks.py                    # run everything and compare against baseline.json
+    python benchmarks/run_benchmarks.py -k filter          # only cases with "filter" in their name
+    python benchmarks/run_benchmarks.py --update-baseline  # store the results as the new baseline
+
+    For every case the time per operation (best of several repeats) and the transient memory a single operation
+    allocates (peak traced by tracemalloc) are reported. A case regresses when it is slower than its baseline by
+    more than the threshold, or allocates more than the threshold beyond its baseline. The exit status is 1 if
+    anything regressed.
+
+    Baselines are machine specific. Regenerate them on the machine that runs the comparison.
+"""
+
+import argparse
+import gc
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+import stubs
+stubs.install()
+
+import numpy as np
+
+from srl.spacemouse.buttons import ButtonState, SpaceMouseButtonDebouncer, DEVICE_BUTTON_STRUCT_INDICES
+from srl.spacemouse.device import DEVICE_SPECS, SpaceMouseData
+from srl.spacemouse.remap import axes_remap, scale_remap
+from srl.spacemouse.spacemouse import SpaceMouse, convert
+from srl.spacemouse.spacemousefilter import SpaceMouseFilter, apply_cubic_deadband
+from srl.spacemouse.synthetic import encode_reports
+
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+# Allocation changes smaller than this many bytes are noise (e.g. small int caching, dict resizes)
+ALLOCATION_SLACK = 128
+
+CASES: Dict[str, Callable[[], Callable[[], None]]] = {}
+
+
+def case(name: str):
+    """ Register a benchmark. The decorated function does the setup and returns the operation to time. """
+    def register(factory):
+        CASES[name] = factory
+        return factory
+    return register
+
+
+def make_filter() -> SpaceMouseFilter:
+    # Same defaults as the extension UI
+    return SpaceMouseFilter(.5, .85, 1., 1., .1, .1, True, True)
+
+
+def make_working_state(spec) -> dict:
+    return {
+        "t": -1, "x": 0., "y": 0., "z": 0., "r": 0., "p": 0., "ya": 0.,
+        "buttons": ButtonState([0] * len(spec.button_mapping)),
+        "buttons_changed": False,
+        "xyz_rpy_change_count": 0,
+    }
+
+
+def synthetic_reports(spec, count: int = 64, seed: int = 0):
+    """ Reports for a random walk of the puck with occasional button changes """
+    rng = np.random.default_rng(seed)
+    values = np.clip(np.cumsum(rng.normal(0, .05, (count, 6)), axis=0), -1, 1)
+    buttons = rng.integers(0, 1 << len(spec.button_mapping), count)
+    reports = []
+    for v, b in zip(values, buttons):
+        reports.extend(encode_reports(spec, v, int(b)))
+    return reports
+
+
+def make_device(spec, filtered: bool = True, resting: bool = False) -> SpaceMouse:
+    device = SpaceMouse(spec)
+    if filtered:
+        filter = make_filter()
+        device.set_filter(filter)
+    if resting:
+        # The filter has settled at zero after the first zero sample, so the second one is at rest
+        for _ in range(2):
+            device._publish(SpaceMouseData(time.time(), np.zeros(3), np.zeros(3), 0))
+        return device
+    device._publish(SpaceMouseData(time.time(), np.array((.3, -.2, .5)), np.array((.1, .6, -.4)), 0))
+    return device
+
+
+@case("convert")
+def bench_convert():
+    return lambda: convert(0x10, 0x01, 350.0)
+
+
+def _process_case(spec):
+    def factory():
+        device = SpaceMouse(spec)
+        state = make_working_state(spec)
+        reports = itertools.cycle(synthetic_reports(spec))
+        return lambda: device.process(next(reports), state)
+    return factory
+
+
+for _name, _spec in DEVICE_SPECS.items():
+    case(f"process[{_name}]")(_process_case(_spec))
+
+
+@case("apply_cubic_deadband")
+def bench_cubic_deadband():
+    src = np.array((.3, -.05, .7))
+    values = src.copy()
+
+    def op():
+        values[:] = src
+        apply_cubic_deadband(values, .1)
+    return op
+
+
+def _filter_case(method: str, src):
+    def factory():
+        filter = make_filter()
+        modifier = getattr(filter, method)
+        values = np.empty(3)
+
+        def op():
+            values[:] = src
+            modifier(values)
+        return op
+    return factory
+
+
+case("filter.translation[moving]")(_filter_case("_translation_modifier", (.3, -.05, .7)))
+case("filter.translation[rest]")(_filter_case("_translation_modifier", (.01, -.02, .0)))
+case("filter.rotation[moving]")(_filter_case("_rotation_modifier", (-.4, .2, .05)))
+case("filter.rotation[rest]")(_filter_case("_rotation_modifier", (.0, .03, .0)))
+
+
+@case("debouncer.update")
+def bench_debouncer():
+    name_to_index = DEVICE_BUTTON_STRUCT_INDICES["SpaceMouse Pro Wireless"]
+    debouncer = SpaceMouseButtonDebouncer(name_to_index, leading={"1", "2", "MENU"}, trailing={"FIT"}, max_wait=.1)
+    values = itertools.cycle((0, 1, 3, 3, 0, 1 << 14, 0))
+    return lambda: debouncer.update(next(values))
+
+
+@case("ButtonState.__int__")
+def bench_button_state_int():
+    state = ButtonState([i % 3 == 0 for i in range(15)])
+    return lambda: int(state)
+
+
+@case("get_controller_state[filtered]")
+def bench_get_controller_state():
+    device = make_device(DEVICE_SPECS["SpaceMouse Compact"])
+    return device.get_controller_state
+
+
+@case("get_controller_state[filtered,new sample]")
+def bench_get_controller_state_new_sample():
+    # Every call publishes a sample, which runs the filter, and polls its output
+    device = make_device(DEVICE_SPECS["SpaceMouse Compact"])
+    sample = device._control
+
+    def op():
+        device._publish(SpaceMouseData(sample.t, sample.xyz, sample.rpy, sample.buttons))
+        device.get_controller_state()
+    return op
+
+
+@case("get_controller_state[resting,new sample]")
+def bench_get_controller_state_resting():
+    # Zero samples keep arriving (e.g. the heartbeat) while the filter output is zero
+    device = make_device(DEVICE_SPECS["SpaceMouse Compact"], resting=True)
+    sample = device._control
+
+    def op():
+        device._publish(SpaceMouseData(sample.t, sample.xyz, sample.rpy, sample.buttons))
+        device.get_controller_state()
+    return op
+
+
+def _state_into_case(num_envs: int, every_other: bool = False):
+    def factory():
+        device = make_device(DEVICE_SPECS["SpaceMouse Compact"])
+        out = np.zeros((num_envs, 6), dtype=np.float32)
+        buttons = np.zeros(num_envs, dtype=np.int64)
+        env_ids = np.arange(0, num_envs, 2) if every_other else None
+        return lambda: device.get_controller_state_into(out, env_ids, buttons)
+    return factory
+
+
+case("get_controller_state_into[1 env]")(_state_into_case(1))
+case("get_controller_state_into[4096 envs]")(_state_into_case(4096))
+case("get_controller_state_into[4096 envs,env_ids]")(_state_into_case(4096, every_other=True))
+
+
+@case("get_controller_state[raw]")
+def bench_get_controller_state_raw():
+    device = make_device(DEVICE_SPECS["SpaceMouse Compact"], filtered=False)
+    return device.get_controller_state
+
+
+def _publish_case(remapped: bool):
+    def factory():
+        device = SpaceMouse(DEVICE_SPECS["SpaceMouse Compact"])
+        if remapped:
+            device.set_axis_remap(scale_remap(.5, 2.) @ axes_remap(("y", "-x", "z"), ("y", "-x", "z")))
+        sample = SpaceMouseData(time.time(), np.array((.3, -.2, .5)), np.array((.1, .6, -.4)), 0)
+        return lambda: device._publish(sample)
+    return factory
+
+
+case("publish")(_publish_case(False))
+case("publish[remap]")(_publish_case(True))
+
+
+class _PlotModel:
+    def set_data(self, *values):
+        pass
+
+
+class _ValueModel:
+    def set_value(self, value):
+        pass
+
+
+def _plotting_case(resting: bool):
+    def factory():
+        from srl.spacemouse.spacemouse_extension import SpaceMouseExtension
+        # Skip on_startup, which builds UI, and provide just what the plotting step touches
+        extension = SpaceMouseExtension.__new__(SpaceMouseExtension)
+        extension._device = make_device(DEVICE_SPECS["SpaceMouse Compact"], resting=resting)
+        extension._plotting_buffer = np.zeros((360, 6))
+        extension._noise_estimator = None
+        extension._models = {
+            "xyz_plot": [_PlotModel() for _ in range(3)],
+            "xyz_vals": [_ValueModel() for _ in range(3)],
+            "rpy_plot": [_PlotModel() for _ in range(3)],
+            "rpy_vals": [_ValueModel() for _ in range(3)],
+        }
+        return lambda: extension._on_plotting_step(None)
+    return factory
+
+
+case("extension._on_plotting_step")(_plotting_case(False))
+case("extension._on_plotting_step[resting]")(_plotting_case(True))
+
+
+def measure_time(op: Callable[[], None], min_time: float, repeats: int) -> float:
+    """ Best nanoseconds per operation over `repeats` batches of roughly min_time / repeats seconds each """
+    batch = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(batch):
+            op()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed * repeats >= min_time * 1e9:
+            break
+        batch *= 2
+    best = elapsed / batch
+    for _ in range(repeats - 1):
+        start = time.perf_counter_ns()
+        for _ in range(batch):
+            op()
+        best = min(best, (time.perf_counter_ns() - start) / batch)
+    return best
+
+
+def measure_allocation(op: Callable[[], None], samples: int = 9) -> int:
+    """ Median of the peak memory (bytes) that one operation allocates on top of what was already live """
+    op()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(samples):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            op()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - current)
+    finally:
+        tracemalloc.stop()
+    return int(sorted(peaks)[len(peaks) // 2])
+
+
+def run(names, min_time: float, repeats: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name in names:
+        op = CASES[name]()
+        gc.disable()
+        try:
+            ns = measure_time(op, min_time, repeats)
+        finally:
+            gc.enable()
+        results[name] = {"ns_per_op": round(ns, 1), "alloc_bytes": measure_allocation(op)}
+    return results
+
+
+def load_baseline(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"threshold": DEFAULT_THRESHOLD, "cases": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, threshold_override=None):
+    """ Returns a list of (name, result, base, regressions) rows """
+    default_threshold = threshold_override if threshold_override is not None else baseline.get("threshold", DEFAULT_THRESHOLD)
+    rows = []
+    for name, result in results.items():
+        base = baseline["cases"].get(name)
+        regressions = []
+        if base is not None:
+            threshold = default_threshold if threshold_override is not None else base.get("threshold", default_threshold)
+            if result["ns_per_op"] > base["ns_per_op"] * (1 + threshold):
+                regressions.append("time")
+            if result["alloc_bytes"] > base["alloc_bytes"] * (1 + threshold) + ALLOCATION_SLACK:
+                regressions.append("alloc")
+        rows.append((name, result, base, regressions))
+    return rows
+
+
+def print_report(rows):
+    width = max(len(name) for name, _, _, _ in rows)
+    print(f"{'case':<{width}}  {'ns/op':>10}  {'alloc B':>8}  {'base ns':>10}  {'change':>8}  status")
+    for name, result, base, regressions in rows:
+        if base is None:
+            base_ns, change = "-", "-"
+        else:
+            base_ns = f"{base['ns_per_op']:.1f}"
+            change = f"{100 * (result['ns_per_op'] / base['ns_per_op'] - 1):+.1f}%"
+        status = "REGRESSED (" + ", ".join(regressions) + ")" if regressions else ("new" if base is None else "ok")
+        print(f"{name:<{width}}  {result['ns_per_op']:>10.1f}  {result['alloc_bytes']:>8d}  {base_ns:>10}  {change:>8}  {status}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="pattern", default="", help="only run cases whose name contains this string")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=None, help="allowed slowdown as a fraction, overrides the baseline's")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to spend timing each case")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    names = [name for name in CASES if args.pattern in name]
+    results = run(names, args.min_time, args.repeats)
+    baseline = load_baseline(args.baseline)
+    rows = compare(results, baseline, args.threshold)
+    print_report(rows)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.update_baseline:
+        for name, result in results.items():
+            previous = baseline["cases"].get(name, {})
+            if "threshold" in previous:
+                result = dict(result, threshold=previous["threshold"])
+            baseline["cases"][name] = result
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        return 0
+    return 1 if any(regressions for _, _, _, regressions in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,514 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+""" Soak test for the threaded parts of SpaceMouse. Runs with plain Python: no Kit, no hid module and no device needed.
+
+    python benchmarks/soak.py                                  # 30 s with the defaults
+    python benchmarks/soak.py --duration 3600 --consumers 16   # an hour against 16 polling threads
+
+    A synthetic device publishes at a high report rate through the real decode path and the extension's filter,
+    while these run concurrently:
+      * polling consumers calling get_controller_state() in a loop, like physics and UI callbacks
+      * listener consumers registered with add_sample_listener(), which must see every sample
+      * a tuner changing filter parameters and the axis remap, like the extension's UI thread
+      * an engage cycler alternately pausing and resuming the device, like disengaging and re-engaging a kept
+        session, and closing it and opening a new one, like switching devices
+
+    Before that, quick checks that filtered output stops when the reader stalls and the watchdog trips, and when
+    the device is paused, that it's the same however many consumers poll (the filter runs once per sample), and
+    that the device comes to rest with sensor jitter inside the deadband, and that calibrating the noise floor
+    isn't thrown off by moving the puck in between.
+
+    Every axis gets the same signal and the remap keeps translation and rotation scaled alike, so in a consistent
+    snapshot the raw x, y, z, roll, pitch and yaw are all equal, and the filtered x, y, z (and roll, pitch, yaw)
+    are equal to each other. Anything else, non-finite values, or time or sequence numbers going backwards is
+    counted as a torn snapshot. Filtered motion read while the device is paused, a sample published while it's
+    paused, or motion from before a pause read after the resume is counted as a stale read. The exit status is 1
+    if there were torn snapshots, stale reads, listener gaps or errors.
+"""
+
+import argparse
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+import stubs
+stubs.install()
+
+import numpy as np
+
+from srl.spacemouse.calibration import NoiseEstimator
+from srl.spacemouse.device import DEVICE_SPECS, SpaceMouseData
+from srl.spacemouse.remap import scale_remap
+from srl.spacemouse.spacemouse import SpaceMouse
+from srl.spacemouse.spacemousefilter import SpaceMouseFilter
+from srl.spacemouse.sweep import SweepParams, run_filter
+from srl.spacemouse.synthetic import AXIS_NAMES, AxisSignal, SyntheticSpaceMouse
+
+# Latency histogram bins, geometric from 1 us to 10 s
+LATENCY_BINS = np.geomspace(1e-6, 10.0, 241).tolist()
+
+
+class LatencyHistogram:
+    """ Fixed-size latency histogram, so hours of samples take constant memory """
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BINS) + 1)
+        self.total = 0
+        self.max = 0.0
+
+    def add(self, latency: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BINS, latency)] += 1
+        self.total += 1
+        self.max = max(self.max, latency)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> float:
+        """ Upper edge of the bin holding the q-th percentile """
+        if self.total == 0:
+            return float("nan")
+        target = q / 100 * self.total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return LATENCY_BINS[index] if index < len(LATENCY_BINS) else self.max
+        return self.max
+
+
+class DeviceHolder:
+    """ Stands in for the extension's global device, which engage/disengage replaces or clears """
+    def __init__(self) -> None:
+        self.device = None
+        self.filter = SpaceMouseFilter(.5, .85, 1., 1., .1, .1, True, True)
+        # (device, time.time() before pause()) of the last resume
+        self.resumed = None
+
+
+def make_device(holder: DeviceHolder, args) -> SyntheticSpaceMouse:
+    spec = DEVICE_SPECS[args.device]
+    signal = AxisSignal("ramp", amplitude=0.9, period=0.5)
+    device = SyntheticSpaceMouse(spec, signals=[signal] * len(AXIS_NAMES), report_rate=args.report_rate, seed=args.seed)
+    device.set_filter(holder.filter)
+    device.run()
+    return device
+
+
+def consistent(xyz, rpy, raw: bool) -> bool:
+    if xyz.shape != (3,) or rpy.shape != (3,) or not (np.isfinite(xyz).all() and np.isfinite(rpy).all()):
+        return False
+    if raw:
+        return bool((xyz == xyz[0]).all() and (rpy == xyz[0]).all())
+    return bool(np.allclose(xyz, xyz[0]) and np.allclose(rpy, rpy[0]))
+
+
+class Worker(threading.Thread):
+    def __init__(self, name: str, holder: DeviceHolder, stop_event: threading.Event) -> None:
+        super().__init__(name=name, daemon=True)
+        self.holder = holder
+        self.stop_event = stop_event
+        self.errors: List[str] = []
+
+    def run(self) -> None:
+        try:
+            self.work()
+        except Exception as e:
+            self.errors.append(f"{type(e).__name__}: {e}")
+
+
+class PollingConsumer(Worker):
+    """ Calls get_controller_state() in a loop and checks every new sample it sees """
+    def __init__(self, name, holder, stop_event, poll_interval: float) -> None:
+        super().__init__(name, holder, stop_event)
+        self.poll_interval = poll_interval
+        self.latency = LatencyHistogram()
+        self.polls = 0
+        self.observed = 0
+        self.torn = 0
+        self.stale = 0
+
+    def work(self) -> None:
+        device, last_sequence, last_t = None, 0, -1.0
+        while not self.stop_event.is_set():
+            current = self.holder.device
+            if current is not device:
+                # Engaged a new device. Its sequence numbers start over.
+                device, last_sequence, last_t = current, 0, -1.0
+            if device is None:
+                time.sleep(1e-3)
+                continue
+            resumed = self.holder.resumed
+            paused = device.is_paused
+            sequence = device.sequence
+            state = device.get_controller_state()
+            now = time.time()
+            self.polls += 1
+            if state is not None and (state.xyz.any() or state.rpy.any()):
+                # Paused before and after the read, so the read was of the paused device
+                if (paused and device.is_paused) or (resumed is not None and resumed[0] is device and state.t < resumed[1]):
+                    self.stale += 1
+            # The device publishes a placeholder with t = -1 before the first report
+            if state is not None and state.t >= 0 and sequence != last_sequence:
+                self.observed += 1
+                self.latency.add(max(now - state.t, 0.0))
+                if sequence < last_sequence or state.t < last_t or not consistent(state.xyz, state.rpy, raw=False):
+                    self.torn += 1
+                last_sequence, last_t = sequence, state.t
+            if self.poll_interval:
+                time.sleep(self.poll_interval)
+
+
+class ListenerConsumer(Worker):
+    """ Registers a sample listener on each engaged device; the listener must see every sequence number """
+    def __init__(self, name, holder, stop_event) -> None:
+        super().__init__(name, holder, stop_event)
+        self.latency = LatencyHistogram()
+        self.observed = 0
+        self.gaps = 0
+        self.torn = 0
+        self.stale = 0
+        self._device = None
+        self._last_sequence = None
+
+    def _on_sample(self, sample, sequence) -> None:
+        device = self._device
+        if device is not None and device.is_paused:
+            self.stale += 1
+        if sample.t >= 0:
+            self.latency.add(max(time.time() - sample.t, 0.0))
+        self.observed += 1
+        if self._last_sequence is not None and sequence != self._last_sequence + 1:
+            self.gaps += 1
+        self._last_sequence = sequence
+        if not consistent(sample.xyz, sample.rpy, raw=True):
+            self.torn += 1
+
+    def work(self) -> None:
+        device = None
+        while not self.stop_event.is_set():
+            current = self.holder.device
+            if current is not device:
+                if device is not None:
+                    device.remove_sample_listener(self._on_sample)
+                device = self._device = current
+                if device is not None:
+                    # Attaching late: start counting from whichever sample arrives first
+                    self._last_sequence = None
+                    device.add_sample_listener(self._on_sample)
+            time.sleep(1e-3)
+        if device is not None:
+            device.remove_sample_listener(self._on_sample)
+
+
+class Tuner(Worker):
+    """ Changes filter parameters and the axis remap at a fixed rate, like the extension's sliders """
+    def __init__(self, name, holder, stop_event, rate: float, seed: int) -> None:
+        super().__init__(name, holder, stop_event)
+        self.rate = rate
+        self.changes = 0
+        self._rng = np.random.default_rng(seed)
+
+    def work(self) -> None:
+        filter = self.holder.filter
+        while not self.stop_event.wait(1.0 / self.rate):
+            rng = self._rng
+            choice = rng.integers(6)
+            if choice == 0:
+                filter.smoothing_factor = float(rng.uniform(0, .99))
+            elif choice == 1:
+                filter.softmax_temp = float(rng.uniform(.05, 1.))
+            elif choice == 2:
+                filter.translation_modifier = filter.rotation_modifier = float(rng.uniform(.1, 2.))
+            elif choice == 3:
+                filter.translation_deadband = filter.rotation_deadband = float(rng.uniform(0, .3))
+            elif choice == 4:
+                filter.translation_enabled = bool(rng.integers(2))
+                filter.rotation_enabled = bool(rng.integers(2))
+            else:
+                device = self.holder.device
+                if device is not None:
+                    scale = float(rng.uniform(.5, 1.))
+                    device.set_axis_remap(scale_remap(scale, scale) if rng.integers(2) else None)
+            self.changes += 1
+
+
+class EngageCycler(Worker):
+    """ Disengages and re-engages the device at a fixed interval, alternately by pausing and resuming it (what
+        the extension does with a kept session) and by closing it and opening a new one
+    """
+    def __init__(self, name, holder, stop_event, interval: float, args) -> None:
+        super().__init__(name, holder, stop_event)
+        self.interval = interval
+        self.args = args
+        self.cycles = 0
+        self.pauses = 0
+
+    def work(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            device = self.holder.device
+            if self.cycles % 2 == 0:
+                paused_at = time.time()
+                device.pause()
+                # Long enough for every poller to read the paused device many times
+                self.stop_event.wait(min(self.interval / 2, 0.5))
+                device.resume()
+                self.holder.resumed = (device, paused_at)
+                self.pauses += 1
+            else:
+                self.holder.device = None
+                device.close()
+                self.holder.device = make_device(self.holder, self.args)
+            self.cycles += 1
+
+
+def _stalled_device(args, holder: DeviceHolder):
+    """ A device moving at constant speed whose reader can be stalled (blocked inside read) on demand """
+    spec = DEVICE_SPECS[args.device]
+    signal = AxisSignal("constant", offset=0.5)
+    device = SyntheticSpaceMouse(spec, signals=[signal] * len(AXIS_NAMES), report_rate=args.report_rate, seed=args.seed)
+    device.set_filter(holder.filter)
+    device.run()
+    stall = threading.Event()
+    release = threading.Event()
+    read = device.device.read
+
+    def stallable_read(*read_args, **read_kwargs):
+        if stall.is_set():
+            release.wait()
+        return read(*read_args, **read_kwargs)
+    device.device.read = stallable_read
+    return device, stall, release
+
+
+def check_stops(args) -> List[str]:
+    """ Errors if filtered output keeps moving after a watchdog trip on a stalled reader, or after pause() """
+    errors = []
+    max_age = 0.1
+    device, stall, release = _stalled_device(args, DeviceHolder())
+    try:
+        time.sleep(0.2)
+        device.set_watchdog(max_age)
+        device.get_controller_state()
+        stall.set()
+        time.sleep(max_age * 3)
+        state = device.get_controller_state()
+        if device.watchdog_trips == 0:
+            errors.append("watchdog didn't trip on a stalled reader")
+        elif state.xyz.any() or state.rpy.any():
+            errors.append(f"filtered output still moving after a watchdog trip: {state.xyz} {state.rpy}")
+    finally:
+        release.set()
+        device.close()
+
+    device, stall, release = _stalled_device(args, DeviceHolder())
+    try:
+        time.sleep(0.2)
+        device.get_controller_state()
+        device.pause()
+        time.sleep(0.1)
+        state = device.get_controller_state()
+        if state.xyz.any() or state.rpy.any() or not device.is_resting:
+            errors.append(f"filtered output still moving after pause(): {state.xyz} {state.rpy}")
+    finally:
+        device.close()
+    return errors
+
+
+def check_poll_independence(args) -> List[str]:
+    """ Errors if filtered output depends on how many threads poll, rather than matching the filter run once per
+        published sample (which is also what `srl.spacemouse.sweep` tunes against)
+    """
+    params = SweepParams(.5, .85, 1., 1., .1, .1)
+    raw = np.zeros((120, 6))
+    raw[20:70] = .6
+    expected = run_filter(params, raw)
+    errors = []
+    for poller_count in (0, 1, 4):
+        device = SpaceMouse(DEVICE_SPECS[args.device])
+        filter = SpaceMouseFilter(*params, True, True)
+        device.set_filter(filter)
+        stop_event = threading.Event()
+
+        def poll():
+            while not stop_event.is_set():
+                device.get_controller_state()
+        pollers = [threading.Thread(target=poll, daemon=True) for _ in range(poller_count)]
+        for poller in pollers:
+            poller.start()
+        outputs = {}
+        try:
+            for index, row in enumerate(raw):
+                device._publish(SpaceMouseData(time.time(), row[:3].copy(), row[3:].copy(), 0))
+                # Only every 10th sample is read here, the rest only by the pollers, if any
+                if index % 10 == 9:
+                    state = device.get_controller_state()
+                    outputs[index] = np.concatenate((state.xyz, state.rpy))
+                # Give the pollers a chance to run between samples
+                time.sleep(1e-4)
+        finally:
+            stop_event.set()
+            for poller in pollers:
+                poller.join()
+        for index, output in outputs.items():
+            if not np.allclose(output, expected[index]):
+                errors.append(f"filtered output with {poller_count} pollers differs from filtering every sample "
+                              f"once, e.g. sample {index}: {output} instead of {expected[index]}")
+                break
+    return errors
+
+
+def check_rest(args) -> List[str]:
+    """ Errors if jitter inside the deadband after some motion keeps the device from resting """
+    device = SpaceMouse(DEVICE_SPECS[args.device])
+    device.enable_perf_counters()
+    device.set_filter(SpaceMouseFilter(.5, .85, 1., 1., .1, .1, True, True))
+    rng = np.random.default_rng(args.seed)
+    raw = np.concatenate((np.full((30, 6), .6), rng.uniform(-.05, .05, (200, 6))))
+    for row in raw:
+        device._publish(SpaceMouseData(time.time(), row[:3].copy(), row[3:].copy(), 0))
+    filter_calls = device.get_perf_counters()["filter_calls"]
+    state = device.get_controller_state()
+    if not device.is_resting or state.xyz.any() or state.rpy.any():
+        return [f"not at rest after jitter inside the deadband: {state.xyz} {state.rpy}"]
+    if filter_calls == len(raw):
+        return ["the filter still ran for every sample of jitter inside the deadband"]
+    return []
+
+
+def check_noise_estimate(args) -> List[str]:
+    """ Errors if moving the puck now and then during calibration biases the noise estimate. Bursts of motion
+        ramp up and down smoothly, so their first and last samples are as small as the noise.
+    """
+    rng = np.random.default_rng(args.seed)
+    t = np.arange(0, 30, 1e-3)
+    # Half a second of motion every 2.5 s, with a different direction on every axis
+    phase = t % 2.5
+    motion = np.where(phase > 2., np.sin(np.pi * (phase - 2.) / .5) ** 2, 0.)[:, None] * rng.uniform(-.6, .6, 6)
+    raw = rng.uniform(-.02, .02, 6) + rng.normal(0, .005, (len(t), 6))
+    interleaved = NoiseEstimator()
+    for sample_t, values in zip(t, raw + motion):
+        interleaved.update(sample_t, values)
+    quiet = NoiseEstimator()
+    for sample_t, values in zip(t[motion[:, 0] == 0], raw[motion[:, 0] == 0]):
+        quiet.update(sample_t, values)
+    expected, estimate = quiet.estimate(), interleaved.estimate()
+    if estimate is None:
+        return ["no noise estimate with motion between resting stretches"]
+    if not np.allclose(estimate.deadband, expected.deadband, rtol=.2):
+        return [f"motion biased the suggested deadbands: {estimate.deadband} instead of {expected.deadband}"]
+    return []
+
+
+def run(args) -> Dict[str, object]:
+    stop_errors = check_stops(args) + check_poll_independence(args) + check_rest(args) + check_noise_estimate(args)
+    holder = DeviceHolder()
+    holder.device = make_device(holder, args)
+    stop_event = threading.Event()
+    pollers = [PollingConsumer(f"poller{i}", holder, stop_event, args.poll_interval) for i in range(args.consumers)]
+    listeners = [ListenerConsumer(f"listener{i}", holder, stop_event) for i in range(args.listeners)]
+    workers: List[Worker] = pollers + listeners
+    tuner = cycler = None
+    if args.param_rate > 0:
+        tuner = Tuner("tuner", holder, stop_event, args.param_rate, args.seed)
+        workers.append(tuner)
+    if args.cycle_interval > 0:
+        cycler = EngageCycler("cycler", holder, stop_event, args.cycle_interval, args)
+        workers.append(cycler)
+
+    published = 0
+    start = time.monotonic()
+    for worker in workers:
+        worker.start()
+    try:
+        while time.monotonic() - start < args.duration:
+            time.sleep(min(1.0, args.duration))
+    except KeyboardInterrupt:
+        pass
+    stop_event.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - start
+    if holder.device is not None:
+        holder.device.close()
+
+    poll_latency = LatencyHistogram()
+    for poller in pollers:
+        poll_latency.merge(poller.latency)
+    listener_latency = LatencyHistogram()
+    for listener in listeners:
+        listener_latency.merge(listener.latency)
+    # Listeners see every sample, so any of them counts what was published while it was attached
+    published = max((listener.observed for listener in listeners), default=0)
+    return {
+        "elapsed_s": elapsed,
+        "published_per_s": published / elapsed,
+        "polls_per_s": sum(poller.polls for poller in pollers) / elapsed,
+        "poll_observed_fraction": (sum(p.observed for p in pollers) / len(pollers) / published) if pollers and published else None,
+        "poll_latency_ms": {f"p{q}": 1e3 * poll_latency.percentile(q) for q in (50, 90, 99, 99.9)},
+        "poll_latency_max_ms": 1e3 * poll_latency.max,
+        "listener_latency_ms": {f"p{q}": 1e3 * listener_latency.percentile(q) for q in (50, 90, 99, 99.9)},
+        "listener_latency_max_ms": 1e3 * listener_latency.max,
+        "torn": sum(p.torn for p in pollers) + sum(l.torn for l in listeners),
+        "listener_gaps": sum(l.gaps for l in listeners),
+        "param_changes": tuner.changes if tuner else 0,
+        "engage_cycles": cycler.cycles if cycler else 0,
+        "pauses": cycler.pauses if cycler else 0,
+        "stale": sum(p.stale for p in pollers) + sum(l.stale for l in listeners),
+        "errors": stop_errors + [f"{worker.name}: {error}" for worker in workers for error in worker.errors],
+    }
+
+
+def print_report(result: Dict[str, object]) -> None:
+    def percentiles(values):
+        return "  ".join(f"{name} {value:.3f}" for name, value in values.items())
+    print(f"elapsed            {result['elapsed_s']:.1f} s")
+    print(f"published          {result['published_per_s']:.0f}/s")
+    print(f"polls              {result['polls_per_s']:.0f}/s")
+    if result["poll_observed_fraction"] is not None:
+        print(f"samples seen/poller {100 * result['poll_observed_fraction']:.1f}% (the rest were replaced before the next poll)")
+    print(f"poll latency ms    {percentiles(result['poll_latency_ms'])}  max {result['poll_latency_max_ms']:.3f}")
+    print(f"listener latency ms {percentiles(result['listener_latency_ms'])}  max {result['listener_latency_max_ms']:.3f}")
+    print(f"param changes      {result['param_changes']}   engage cycles {result['engage_cycles']} ({result['pauses']} paused)")
+    print(f"torn snapshots     {result['torn']}")
+    print(f"stale reads        {result['stale']}")
+    print(f"listener gaps      {result['listener_gaps']}")
+    for error in result["errors"]:
+        print(f"error              {error}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--device", default="SpaceMouse Compact", choices=sorted(DEVICE_SPECS))
+    parser.add_argument("--report-rate", type=float, default=4000.0, help="synthetic HID reports per second")
+    parser.add_argument("--consumers", type=int, default=8, help="polling consumer threads")
+    parser.add_argument("--poll-interval", type=float, default=1e-3, help="sleep between polls, 0 to poll flat out")
+    parser.add_argument("--listeners", type=int, default=2, help="sample listener consumers")
+    parser.add_argument("--param-rate", type=float, default=50.0, help="filter/remap changes per second, 0 to disable")
+    parser.add_argument("--cycle-interval", type=float, default=5.0, help="seconds between engage cycles, 0 to disable")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    failed = result["torn"] or result["stale"] or result["listener_gaps"] or result["errors"]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+""" Minimal stand-ins for the Kit modules (`carb`, `omni`, `pxr`) so the extension can be imported by plain Python.
+
+    Only import-time structure is provided: every attribute of a stub module is a permissive stub class that
+    accepts any constructor call. Nothing that needs a running Kit app will work, which is fine for benchmarking the
+    pure-Python and numpy code paths.
+"""
+
+import importlib.abc
+import importlib.machinery
+import sys
+import types
+
+STUBBED_PACKAGES = ("carb", "omni", "pxr")
+
+
+class _StubMeta(type):
+    def __getattr__(cls, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _StubMeta(name, (_Stub,), {})
+
+
+class _Stub(metaclass=_StubMeta):
+    """ Accepts any constructor arguments. Attribute lookups on the class (e.g. `ui.Type.LINE`) produce more
+        stubs, while lookups on instances behave normally, so mistakes in the code under test still raise.
+    """
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+class _StubModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        # A class, so that it can be used as a base class (e.g. omni.ext.IExt) as well as called
+        stub = _StubMeta(name, (_Stub,), {})
+        setattr(self, name, stub)
+        return stub
+
+
+class _StubFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    def find_spec(self, fullname, path, target=None):
+        if fullname.split(".")[0] not in STUBBED_PACKAGES:
+            return None
+        return importlib.machinery.ModuleSpec(fullname, self, is_package=True)
+
+    def create_module(self, spec):
+        module = _StubModule(spec.name)
+        module.__path__ = []
+        return module
+
+    def exec_module(self, module):
+        pass
+
+
+def _log(*args, **kwargs):
+    pass
+
+
+def install():
+    """ Make `carb`, `omni.*` and `pxr.*` importable. Real modules win if they are installed. """
+    for finder in sys.meta_path:
+        if isinstance(finder, _StubFinder):
+            return
+    sys.meta_path.append(_StubFinder())
+    import carb
+    if isinstance(carb, _StubModule):
+        for name in ("log_verbose", "log_info", "log_warn", "log_error"):
+            setattr(carb, name, _log)
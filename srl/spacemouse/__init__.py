@@ -3,4 +3,13 @@
 # Licensed under the MIT License [see LICENSE for details].
 
 from srl.spacemouse.spacemouse import SpaceMouse
-from srl.spacemouse.spacemouse_extension import SpaceMouseExtension
+
+try:
+    import omni.ext
+    _in_kit = True
+except ImportError:
+    # Outside of Kit only the driver is available
+    _in_kit = False
+
+if _in_kit:
+    from srl.spacemouse.spacemouse_extension import SpaceMouseExtension
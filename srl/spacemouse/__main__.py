@@ -0,0 +1,218 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+""" Command line tools for the driver, usable without Kit:
+
+    python -m srl.spacemouse list                    attached devices
+    python -m srl.spacemouse monitor                 live filtered output of the first attached device
+    python -m srl.spacemouse throughput              decode and filter throughput on this machine
+
+    Use --synthetic (with --device to choose what to imitate) to try monitor or throughput --live without hardware.
+"""
+
+import argparse
+import sys
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from srl.spacemouse.buttons import ButtonState, DEVICE_BUTTON_STRUCT_INDICES
+from srl.spacemouse.counters import format_snapshot
+from srl.spacemouse.device import DEVICE_NAMES, DEVICE_SPECS, SpaceMouseData
+from srl.spacemouse.spacemouse import SpaceMouse
+from srl.spacemouse.spacemousefilter import SpaceMouseFilter
+from srl.spacemouse.synthetic import SYNTHETIC_REPORT_RATE, SyntheticSpaceMouse, encode_reports
+
+# Device imitated by --synthetic unless --device is given
+CLI_SYNTHETIC_DEVICE = "SpaceMouse Compact"
+CLI_MONITOR_RATE = 20.0
+CLI_THROUGHPUT_SAMPLES = 2000
+
+
+def _require_hid() -> bool:
+    try:
+        import hid  # noqa: F401
+    except ImportError:
+        print("The hid module isn't installed. Install it with: pip install hidapi", file=sys.stderr)
+        return False
+    return True
+
+
+def _make_filter(args) -> SpaceMouseFilter:
+    return SpaceMouseFilter(args.smoothing, args.softmax, args.trans_sensitivity, args.rot_sensitivity,
+                            args.trans_deadband, args.rot_deadband, True, True)
+
+
+def _open_device(args) -> Optional[SpaceMouse]:
+    """ The device chosen by the arguments, running, or None (after saying why) """
+    if args.synthetic:
+        spec = DEVICE_SPECS[args.device or CLI_SYNTHETIC_DEVICE]
+        device = SyntheticSpaceMouse(spec, report_rate=args.report_rate, seed=args.seed, button_toggle_rate=0.5)
+    else:
+        if not _require_hid():
+            return None
+        if args.device is None:
+            from srl.spacemouse.hotplug import attached_devices
+            attached = attached_devices()
+            if not attached:
+                print("No supported device is attached. Check the udev rules, or use --synthetic.", file=sys.stderr)
+                return None
+            spec = attached[0][0]
+        else:
+            spec = DEVICE_SPECS[args.device]
+        device = SpaceMouse(spec, auto_reconnect=True)
+    try:
+        device.run()
+    except RuntimeError:
+        print(f"Unable to open {device.name}", file=sys.stderr)
+        return None
+    return device
+
+
+def list_devices(args) -> int:
+    if not _require_hid():
+        return 1
+    from srl.spacemouse.hotplug import attached_devices
+    attached = attached_devices()
+    if not attached:
+        print("No supported devices attached")
+        return 0
+    for spec, info in attached:
+        product = info.get("product_string") or ""
+        print(f"{spec.name:<32} {info['vendor_id']:04x}:{info['product_id']:04x}  {product}  {info['path'].decode(errors='replace')}")
+    return 0
+
+
+def _format_state(state: SpaceMouseData, button_names: List[str]) -> str:
+    pressed = [name for index, name in enumerate(button_names) if (state.buttons >> index) & 1]
+    return (f"xyz {state.xyz[0]:+.3f} {state.xyz[1]:+.3f} {state.xyz[2]:+.3f}   "
+            f"rpy {state.rpy[0]:+.3f} {state.rpy[1]:+.3f} {state.rpy[2]:+.3f}   "
+            f"buttons {' '.join(pressed) or '-'}")
+
+
+def monitor(args) -> int:
+    device = _open_device(args)
+    if device is None:
+        return 1
+    if not args.raw:
+        filter = _make_filter(args)
+        device.set_filter(filter)
+    button_names = list(DEVICE_BUTTON_STRUCT_INDICES[device.name])
+    # Overwrite one line on a terminal, one line per update otherwise (e.g. piped into a file)
+    end = "\r" if sys.stdout.isatty() else "\n"
+    print(f"{device.name} ({'raw' if args.raw else 'filtered'}), Ctrl+C to stop")
+    deadline = time.monotonic() + args.duration if args.duration else None
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            state = device.get_controller_state()
+            if state is not None and state.t >= 0:
+                print(_format_state(state, button_names).ljust(80), end=end, flush=True)
+            time.sleep(1.0 / args.rate)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print()
+        device.close()
+    return 0
+
+
+def _rate(count: int, seconds: float) -> str:
+    return f"{count / seconds:>12,.0f}/s  {1e6 * seconds / count:8.2f} us each"
+
+
+def throughput(args) -> int:
+    spec = DEVICE_SPECS[args.device or CLI_SYNTHETIC_DEVICE]
+    rng = np.random.default_rng(args.seed)
+    values = rng.uniform(-1, 1, (args.samples, 6)) * (rng.random((args.samples, 1)) < .8)
+    reports = [report for row in values for report in encode_reports(spec, row, include_buttons=False)]
+    print(f"{spec.name}, {args.samples} samples ({len(reports)} reports)")
+
+    device = SpaceMouse(spec)
+    state = dict.fromkeys(spec.mappings, 0.)
+    state.update(t=0., buttons=ButtonState([0] * len(spec.button_mapping)), buttons_changed=False, xyz_rpy_change_count=0)
+    start = time.perf_counter()
+    for report in reports:
+        device.process(report, state)
+    print(f"decode             {_rate(len(reports), time.perf_counter() - start)}")
+
+    filter = _make_filter(args)
+    start = time.perf_counter()
+    for row in values:
+        row = row.copy()
+        filter.modify(row[:3], row[3:])
+    print(f"filter             {_rate(len(values), time.perf_counter() - start)}")
+
+    # What a consumer sees: each sample published, then polled once with filtering
+    device.set_filter(filter)
+    samples = [SpaceMouseData(float(i), row[:3].copy(), row[3:].copy(), 0) for i, row in enumerate(values)]
+    start = time.perf_counter()
+    for sample in samples:
+        device._publish(sample)
+        device.get_controller_state()
+    print(f"publish + poll     {_rate(len(samples), time.perf_counter() - start)}")
+
+    if args.live:
+        live = _open_device(args)
+        if live is None:
+            return 1
+        live.enable_perf_counters()
+        live.set_filter(filter)
+        deadline = time.monotonic() + args.live
+        try:
+            # Poll like a 1 kHz consumer, so the counters include filtering
+            while time.monotonic() < deadline:
+                live.get_controller_state()
+                time.sleep(1e-3)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            snapshot = live.get_perf_counters()
+            live.close()
+        print(f"\nlive {live.name} for {args.live:g} s:")
+        print(format_snapshot(snapshot))
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m srl.spacemouse", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    device_args = argparse.ArgumentParser(add_help=False)
+    device_args.add_argument("--device", choices=DEVICE_NAMES, help="device type; defaults to the first attached")
+    device_args.add_argument("--synthetic", action="store_true", help="generate input instead of opening a device")
+    device_args.add_argument("--report-rate", type=float, default=SYNTHETIC_REPORT_RATE, help="synthetic reports/s")
+    device_args.add_argument("--seed", type=int, default=0)
+
+    # Defaults match the extension's sliders
+    filter_args = argparse.ArgumentParser(add_help=False)
+    filter_args.add_argument("--smoothing", type=float, default=.5)
+    filter_args.add_argument("--softmax", type=float, default=.85)
+    filter_args.add_argument("--trans-sensitivity", type=float, default=1.)
+    filter_args.add_argument("--rot-sensitivity", type=float, default=1.)
+    filter_args.add_argument("--trans-deadband", type=float, default=.1)
+    filter_args.add_argument("--rot-deadband", type=float, default=.1)
+
+    command = commands.add_parser("list", help="list attached devices")
+    command.set_defaults(run=list_devices)
+
+    command = commands.add_parser("monitor", parents=[device_args, filter_args], help="show live output")
+    command.add_argument("--raw", action="store_true", help="show the unfiltered samples")
+    command.add_argument("--rate", type=float, default=CLI_MONITOR_RATE, help="updates/s")
+    command.add_argument("--duration", type=float, default=None, help="seconds, defaults to until Ctrl+C")
+    command.set_defaults(run=monitor)
+
+    command = commands.add_parser("throughput", parents=[device_args, filter_args], help="measure decode and filter throughput")
+    command.add_argument("--samples", type=int, default=CLI_THROUGHPUT_SAMPLES)
+    command.add_argument("--live", type=float, default=0.0, metavar="SECONDS",
+                         help="also run the device (or --synthetic) this long and show its counters")
+    command.set_defaults(run=throughput)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+
+import asyncio
+from typing import Optional
+
+from srl.spacemouse.device import SpaceMouseData
+
+
+class SampleChannel:
+    """ Hands samples from the device's reader thread to an asyncio event loop.
+
+        The reader thread only records the newest sample and schedules at most one wake-up on the loop at a
+        time, so a consumer that falls behind gets the latest sample rather than a backlog.
+    """
+    def __init__(self, device, filtered: bool = True, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Args:
+            device (SpaceMouse): device to receive samples from
+            filtered (bool): deliver `device.get_controller_state()` (which applies the position/rotation
+                callbacks) instead of the raw published sample
+            loop (asyncio.AbstractEventLoop, optional): loop to deliver to. Defaults to the running loop.
+        """
+        self._device = device
+        self._filtered = filtered
+        self._loop = loop if loop is not None else asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        self._latest = None
+        self._delivered_sequence = 0
+        self._wake_pending = False
+        self._closed = False
+        device.add_sample_listener(self._on_sample)
+
+    def _on_sample(self, sample: SpaceMouseData, sequence: int) -> None:
+        # Called on the reader thread
+        self._latest = (sequence, sample)
+        if self._wake_pending:
+            return
+        self._wake_pending = True
+        try:
+            self._loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            # The loop was closed underneath us
+            self.close()
+
+    def _wake(self) -> None:
+        self._wake_pending = False
+        self._event.set()
+
+    async def next(self) -> SpaceMouseData:
+        """ Wait for a sample newer than the last one returned """
+        while True:
+            latest = self._latest
+            if latest is not None and latest[0] > self._delivered_sequence:
+                break
+            self._event.clear()
+            await self._event.wait()
+        sequence, sample = latest
+        self._delivered_sequence = sequence
+        if self._filtered:
+            state = self._device.get_controller_state()
+            if state is not None:
+                return state
+        return sample
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._device.remove_sample_listener(self._on_sample)
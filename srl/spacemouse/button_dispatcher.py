@@ -0,0 +1,238 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+
+import asyncio
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from srl.spacemouse.buttons import DEVICE_BUTTON_STRUCT_INDICES, SpaceMouseButtonDebouncer
+from srl.spacemouse.device import SpaceMouseData
+from srl.spacemouse.log import log_error
+
+DISPATCHER_MAX_WORKERS = 2
+DISPATCHER_DEBOUNCE = 0.05
+
+# Passed to handlers. t is the timestamp of the sample with the edge, buttons the full bitfield at that time.
+ButtonEvent = namedtuple("ButtonEvent", ["name", "pressed", "t", "buttons"])
+
+
+class _Binding:
+    """ A handler for one edge of one button, with its coalescing state and timing stats """
+    def __init__(self, name: str, pressed: bool, handler: Callable, coalesce: bool, on_loop: bool) -> None:
+        self.name = name
+        self.pressed = pressed
+        self.handler = handler
+        self.coalesce = coalesce
+        self.on_loop = on_loop
+        self.lock = threading.Lock()
+        self.running = False
+        self.pending = None
+        self.calls = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.max_delay = 0.0
+
+    @property
+    def key(self) -> str:
+        edge = "press" if self.pressed else "release"
+        return f"{self.name}:{edge}:{getattr(self.handler, '__name__', repr(self.handler))}"
+
+    def record(self, queued_at: float, started: float, finished: float, failed: bool) -> None:
+        self.calls += 1
+        self.errors += failed
+        self.total_time += finished - started
+        self.max_time = max(self.max_time, finished - started)
+        self.max_delay = max(self.max_delay, started - queued_at)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "mean_ms": 1e3 * self.total_time / self.calls if self.calls else 0.0,
+            "max_ms": 1e3 * self.max_time,
+            "max_delay_ms": 1e3 * self.max_delay,
+        }
+
+
+class ButtonDispatcher:
+    """ Runs handlers when SpaceMouse buttons are pressed or released, off the input path.
+
+        Edges are found on the device's reader thread with a SpaceMouseButtonDebouncer, which only costs a few
+        bit operations per sample. Handlers then run on a small thread pool, or on an asyncio event loop (e.g.
+        Kit's) for handlers that must touch the stage or UI, so a slow handler never delays input sampling.
+
+        With coalesce=True (the default), an edge that arrives while the handler is still queued or running is
+        merged into a single rerun once it finishes, so a slow handler can't build up a backlog.
+
+        Note that, as with the debouncer, asking for both the press and the release of the same button only
+        reports the release if it comes more than `debounce` seconds after the press.
+    """
+    def __init__(self, device, max_workers: int = DISPATCHER_MAX_WORKERS, debounce: float = DISPATCHER_DEBOUNCE,
+                 loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Args:
+            device (SpaceMouse): device whose buttons to watch
+            max_workers (int): threads running handlers
+            debounce (float): changes of a button within this many seconds of its last change are ignored
+            loop (asyncio.AbstractEventLoop, optional): loop for on_loop handlers. Defaults to the loop running
+                (or set) in the thread creating the dispatcher, if any.
+        """
+        self._device = device
+        self._name_to_index = DEVICE_BUTTON_STRUCT_INDICES[device.name]
+        self.debounce = debounce
+        if loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+        self._loop = loop
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="spacemouse-buttons")
+        # Copy on write, like the device's listeners, so the reader thread never needs a lock
+        self._bindings: List[_Binding] = []
+        self._debouncer = None
+        self._last_buttons = 0
+        self._closed = False
+        device.add_sample_listener(self._on_sample)
+
+    def on_press(self, name: str, handler: Callable, coalesce: bool = True, on_loop: bool = False) -> None:
+        """ Call handler(ButtonEvent) when the named button is pressed. With on_loop, the handler (a function
+            or a coroutine function) runs on the event loop instead of the thread pool.
+        """
+        self._bind(name, True, handler, coalesce, on_loop)
+
+    def on_release(self, name: str, handler: Callable, coalesce: bool = True, on_loop: bool = False) -> None:
+        """ Like on_press, for the button being released """
+        self._bind(name, False, handler, coalesce, on_loop)
+
+    def remove(self, name: str, handler: Optional[Callable] = None) -> None:
+        """ Remove the handlers of a button, or only the given one """
+        self._bindings = [b for b in self._bindings if not (b.name == name and (handler is None or b.handler == handler))]
+        self._rebuild_debouncer()
+
+    def _bind(self, name: str, pressed: bool, handler: Callable, coalesce: bool, on_loop: bool) -> None:
+        if name not in self._name_to_index:
+            raise ValueError(f"{self._device.name} has no button {name}. Buttons: {', '.join(self._name_to_index)}")
+        if on_loop and self._loop is None:
+            raise ValueError("on_loop handlers need an event loop; pass one to the dispatcher")
+        self._bindings = self._bindings + [_Binding(name, pressed, handler, coalesce, on_loop)]
+        self._rebuild_debouncer()
+
+    def _rebuild_debouncer(self) -> None:
+        leading = {b.name for b in self._bindings if b.pressed}
+        trailing = {b.name for b in self._bindings if not b.pressed}
+        debouncer = SpaceMouseButtonDebouncer(self._name_to_index, leading, trailing, self.debounce)
+        # Start from the current state, so buttons held right now don't look like fresh presses
+        debouncer._last_value = self._last_buttons
+        self._debouncer = debouncer
+
+    def _on_sample(self, sample: SpaceMouseData, sequence: int) -> None:
+        # Called on the reader thread
+        buttons = sample.buttons
+        if buttons == self._last_buttons:
+            return
+        self._last_buttons = buttons
+        debouncer = self._debouncer
+        if debouncer is None:
+            return
+        # Without passthrough bits, the debounced value only has bits for edges worth reporting
+        edges = debouncer.update(buttons).value & ~debouncer.ignore
+        if not edges:
+            return
+        queued_at = time.perf_counter()
+        for binding in self._bindings:
+            mask = 1 << self._name_to_index[binding.name]
+            if edges & mask and bool(buttons & mask) == binding.pressed:
+                self._submit(binding, ButtonEvent(binding.name, binding.pressed, sample.t, buttons), queued_at)
+
+    def _submit(self, binding: _Binding, event: ButtonEvent, queued_at: float) -> None:
+        if self._closed:
+            return
+        with binding.lock:
+            if binding.running and binding.coalesce:
+                # Run once more after the current call, with the newest event
+                if binding.pending is not None:
+                    binding.coalesced += 1
+                binding.pending = (event, queued_at)
+                return
+            binding.running = True
+        if binding.on_loop:
+            self._loop.call_soon_threadsafe(self._run_on_loop, binding, event, queued_at)
+        else:
+            self._executor.submit(self._run, binding, event, queued_at)
+
+    def _next_pending(self, binding: _Binding):
+        with binding.lock:
+            pending = binding.pending
+            binding.pending = None
+            if pending is None:
+                binding.running = False
+            return pending
+
+    def _call(self, binding: _Binding, event: ButtonEvent, queued_at: float) -> None:
+        started = time.perf_counter()
+        failed = False
+        try:
+            binding.handler(event)
+        except Exception as e:
+            failed = True
+            log_error(f"SpaceMouse button handler {binding.key} failed: {e}")
+        binding.record(queued_at, started, time.perf_counter(), failed)
+
+    def _run(self, binding: _Binding, event: ButtonEvent, queued_at: float) -> None:
+        # On a pool thread. Without coalescing, calls may overlap and pending stays empty.
+        while True:
+            self._call(binding, event, queued_at)
+            if not binding.coalesce:
+                return
+            pending = self._next_pending(binding)
+            if pending is None:
+                return
+            event, queued_at = pending
+
+    def _run_on_loop(self, binding: _Binding, event: ButtonEvent, queued_at: float) -> None:
+        if asyncio.iscoroutinefunction(binding.handler):
+            asyncio.ensure_future(self._run_coroutine(binding, event, queued_at), loop=self._loop)
+            return
+        self._call(binding, event, queued_at)
+        self._finish_on_loop(binding)
+
+    async def _run_coroutine(self, binding: _Binding, event: ButtonEvent, queued_at: float) -> None:
+        started = time.perf_counter()
+        failed = False
+        try:
+            await binding.handler(event)
+        except Exception as e:
+            failed = True
+            log_error(f"SpaceMouse button handler {binding.key} failed: {e}")
+        binding.record(queued_at, started, time.perf_counter(), failed)
+        self._finish_on_loop(binding)
+
+    def _finish_on_loop(self, binding: _Binding) -> None:
+        if not binding.coalesce:
+            return
+        pending = self._next_pending(binding)
+        if pending is not None:
+            # Yield to the loop between calls rather than running back to back
+            self._loop.call_soon(self._run_on_loop, binding, *pending)
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """ Per handler ("BUTTON:press|release:handler name") calls, coalesced edges, errors, run time and the
+            longest delay between the edge and the handler starting
+        """
+        return {binding.key: binding.stats() for binding in self._bindings}
+
+    def close(self, wait: bool = True) -> None:
+        """ Stop listening to the device. With wait, also wait for running handlers to finish. """
+        if self._closed:
+            return
+        self._closed = True
+        self._device.remove_sample_listener(self._on_sample)
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,184 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+
+from collections import deque, namedtuple
+from typing import Optional, Tuple
+
+import numpy as np
+
+AXIS_NAMES = ("x", "y", "z", "r", "p", "ya")
+
+# Samples further than this (on any axis) from the first sample of a quiet stretch are treated as the puck being
+# moved. Well below the deadbands being estimated, yet several times the noise of a typical unit.
+CALIBRATION_REST_THRESHOLD = 0.04
+# Seconds a quiet stretch must last before and after a sample for it to count, which keeps out the start and end
+# of deliberate motion
+CALIBRATION_HOLD_TIME = 0.25
+# Samples needed before the estimate is trusted
+CALIBRATION_MIN_SAMPLES = 100
+# Suggested deadbands cover this many standard deviations of the noise
+CALIBRATION_SIGMA = 4.0
+CALIBRATION_WINDOW = 256
+
+# Per-axis results, in the device's (x, y, z, roll, pitch, yaw) order
+NoiseEstimate = namedtuple("NoiseEstimate", ["count", "offset", "std", "deadband"])
+
+
+class NoiseEstimator:
+    """ Streaming per-axis statistics of the device's output while the puck is at rest.
+
+        A sample is resting if all axes stay within rest_threshold of where a quiet stretch started, and the
+        stretch lasts at least hold_time before and after it. Samples wait in a queue for the second half, and
+        the queue is dropped when the puck moves, so the slow start of a deliberate motion doesn't count.
+
+        Mean and variance are accumulated with Welford's algorithm over every resting sample. The mean is the
+        unit's zero offset and the standard deviation its noise floor, which gives the smallest deadband that
+        keeps the noise out. Optionally the last `window` resting samples are kept for a spectral estimate.
+
+        Consecutive identical samples are counted once: the device only reports changes, and repeats of the same
+        sample (e.g. the reader's heartbeat) would otherwise drag the variance towards zero.
+    """
+    def __init__(self,
+        resolution: float = 0.0,
+        rest_threshold: float = CALIBRATION_REST_THRESHOLD,
+        hold_time: float = CALIBRATION_HOLD_TIME,
+        min_samples: int = CALIBRATION_MIN_SAMPLES,
+        sigma: float = CALIBRATION_SIGMA,
+        spectral: bool = False,
+        window: int = CALIBRATION_WINDOW) -> None:
+        """
+        Args:
+            resolution (float): size of one device count in output units, added to suggested deadbands to cover
+                quantization
+            rest_threshold (float): largest distance from the start of a quiet stretch that still counts as rest
+            hold_time (float): seconds the puck must stay quiet before and after a sample for it to count
+            min_samples (int): resting samples needed before estimate() returns anything
+            sigma (float): suggested deadbands are sigma standard deviations of the noise, plus the resolution
+            spectral (bool): keep a ring buffer of resting samples for spectrum()
+            window (int): ring buffer length
+        """
+        self.resolution = resolution
+        self.rest_threshold = rest_threshold
+        self.hold_time = hold_time
+        self.min_samples = min_samples
+        self.sigma = sigma
+        self.spectral = spectral
+        self.window = window
+        self.reset()
+
+    def reset(self) -> None:
+        self.count = 0
+        self.rejected = 0
+        self._mean = np.zeros(len(AXIS_NAMES))
+        self._m2 = np.zeros(len(AXIS_NAMES))
+        self._last = None
+        # Start of the current quiet stretch, (t, values), and its samples not yet counted
+        self._quiet_start = None
+        self._pending = deque()
+        self._ring = np.zeros((self.window, len(AXIS_NAMES))) if self.spectral else None
+        self._ring_t = np.zeros(self.window) if self.spectral else None
+        self._ring_fill = 0
+
+    def update(self, t: float, values: np.ndarray) -> bool:
+        """ Add a sample of all six axes. Returns whether the puck looks quiet; the sample is only counted once
+            it has stayed quiet for hold_time after it.
+        """
+        if self._last is not None and np.array_equal(values, self._last):
+            return False
+        self._last = values.copy()
+        if self._quiet_start is None or np.abs(values - self._quiet_start[1]).max() >= self.rest_threshold:
+            # Moving, or the first sample. Whatever was waiting may have been the start of the motion.
+            self.rejected += len(self._pending) + (self._quiet_start is not None)
+            self._pending.clear()
+            self._quiet_start = (t, self._last)
+            return False
+        self._pending.append((t, self._last))
+        quiet_since = self._quiet_start[0] + self.hold_time
+        while self._pending and self._pending[0][0] <= t - self.hold_time:
+            sample_t, sample = self._pending.popleft()
+            if sample_t >= quiet_since:
+                self._add(sample_t, sample)
+            else:
+                self.rejected += 1
+        return True
+
+    def _add(self, t: float, values: np.ndarray) -> None:
+        self.count += 1
+        delta = values - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (values - self._mean)
+        if self._ring is not None:
+            index = self._ring_fill % self.window
+            self._ring[index] = values
+            self._ring_t[index] = t
+            self._ring_fill += 1
+
+    @property
+    def offset(self) -> np.ndarray:
+        return self._mean.copy()
+
+    @property
+    def variance(self) -> np.ndarray:
+        if self.count < 2:
+            return np.zeros(len(AXIS_NAMES))
+        return self._m2 / (self.count - 1)
+
+    def estimate(self, remap: Optional[np.ndarray] = None) -> Optional[NoiseEstimate]:
+        """ The current estimate, or None until min_samples resting samples were seen.
+
+            The offset is in device axes, to be subtracted from the raw samples. Noise and deadbands are for the
+            published axes after the offset is subtracted: if a 6x6 remap is given, the noise of every output
+            axis is combined from the device axes it mixes (assuming independent noise).
+        """
+        if self.count < self.min_samples:
+            return None
+        variance = self.variance
+        if remap is not None:
+            variance = (np.asarray(remap) ** 2) @ variance
+        std = np.sqrt(variance)
+        return NoiseEstimate(self.count, self.offset, std, self.sigma * std + self.resolution)
+
+    def spectrum(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """ (frequencies in Hz, power spectral density per axis with shape (frequencies, 6)) of the last `window`
+            resting samples, or None until the ring buffer is full. The sample rate is taken from the median time
+            between samples.
+        """
+        if self._ring is None or self._ring_fill < self.window:
+            return None
+        order = np.argsort(self._ring_t)
+        t = self._ring_t[order]
+        values = self._ring[order]
+        dt = float(np.median(np.diff(t)))
+        if dt <= 0:
+            return None
+        taper = np.hanning(self.window)[:, None]
+        transform = np.fft.rfft((values - values.mean(axis=0)) * taper, axis=0)
+        psd = (np.abs(transform) ** 2) * dt / np.sum(taper ** 2)
+        return np.fft.rfftfreq(self.window, dt), psd
+
+    def peak_frequencies(self) -> Optional[np.ndarray]:
+        """ Frequency with the most noise power for every axis, ignoring DC """
+        result = self.spectrum()
+        if result is None:
+            return None
+        freqs, psd = result
+        return freqs[1 + np.argmax(psd[1:], axis=0)]
+
+
+def format_estimate(estimate: Optional[NoiseEstimate], peaks: Optional[np.ndarray] = None) -> str:
+    """ Multi-line summary of an estimate for display """
+    if estimate is None:
+        return "Collecting resting samples..."
+    def row(values, fmt):
+        return " ".join(format(value, fmt) for value in values)
+    lines = [
+        f"Samples: {estimate.count}   axes: {' '.join(f'{name:>6}' for name in AXIS_NAMES)}",
+        f"Offset:   {row(estimate.offset, '+6.3f')}",
+        f"Noise:    {row(estimate.std, '6.4f')}",
+        f"Deadband: {row(estimate.deadband, '6.3f')}",
+    ]
+    if peaks is not None:
+        lines.append(f"Peak Hz:  {row(peaks, '6.1f')}")
+    return "\n".join(lines)
@@ -0,0 +1,135 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+
+import time
+from collections import namedtuple
+from typing import Dict
+
+# What a reader counts about its reads, handed from an isolated reader process to the device in the parent
+ReadCounts = namedtuple("ReadCounts", ["reports", "read_timeouts", "overrun_count", "overrun_time", "overrun_max"])
+
+
+class PerfCounters:
+    """ Runtime counters for a SpaceMouse, maintained by its reader thread and by get_controller_state.
+
+        Updates are plain attribute increments without locking; concurrent consumers can occasionally lose an
+        increment, which is fine for counters meant to guide tuning.
+    """
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.start = time.monotonic()
+        self.reports = {}
+        self.read_timeouts = 0
+        self.published = 0
+        self.overwritten = 0
+        self.ring_overruns = 0
+        self.consumed_sequence = 0
+        self.polls = 0
+        self.filter_calls = 0
+        self.filter_time = 0.0
+        self.filter_time_max = 0.0
+        self.overrun_count = 0
+        self.overrun_time = 0.0
+        self.overrun_max = 0.0
+        self.stale_reads = 0
+        self.watchdog_trips = 0
+        self.stale_age_max = 0.0
+
+    def on_read(self, report, elapsed: float, timeout: float) -> None:
+        if report:
+            channel = report[0]
+            self.reports[channel] = self.reports.get(channel, 0) + 1
+            return
+        self.read_timeouts += 1
+        # A read that timed out should come back right at the timeout. Anything beyond that is time the
+        # reader thread spent waiting to be scheduled, mostly on the GIL.
+        overrun = elapsed - timeout
+        if overrun > 0:
+            self.overrun_count += 1
+            self.overrun_time += overrun
+            self.overrun_max = max(self.overrun_max, overrun)
+
+    def take_read_counts(self) -> ReadCounts:
+        """ The read counts since the last call, or since the last reset, and start counting afresh """
+        reports, self.reports = self.reports, {}
+        counts = ReadCounts(reports, self.read_timeouts, self.overrun_count, self.overrun_time, self.overrun_max)
+        self.read_timeouts = self.overrun_count = 0
+        self.overrun_time = self.overrun_max = 0.0
+        return counts
+
+    def add_read_counts(self, counts: ReadCounts) -> None:
+        # Reads done by another reader (e.g. in an isolated reader process) on behalf of this device
+        for channel, count in counts.reports.items():
+            self.reports[channel] = self.reports.get(channel, 0) + count
+        self.read_timeouts += counts.read_timeouts
+        self.overrun_count += counts.overrun_count
+        self.overrun_time += counts.overrun_time
+        self.overrun_max = max(self.overrun_max, counts.overrun_max)
+
+    def on_publish(self, sequence: int) -> None:
+        self.published += 1
+        # The previous sample is being replaced; nobody read it if the consumed sequence didn't reach it
+        if sequence > 1 and self.consumed_sequence < sequence - 1:
+            self.overwritten += 1
+
+    def on_ring_overrun(self, count: int) -> None:
+        # Samples an IsolatedSpaceMouse couldn't republish, because the shared memory ring wrapped first
+        self.ring_overruns += count
+
+    def on_poll(self, sequence: int) -> None:
+        self.polls += 1
+        self.consumed_sequence = sequence
+
+    def on_filter(self, elapsed: float) -> None:
+        self.filter_calls += 1
+        self.filter_time += elapsed
+        self.filter_time_max = max(self.filter_time_max, elapsed)
+
+    def on_stale_read(self, age: float) -> None:
+        self.stale_reads += 1
+        self.stale_age_max = max(self.stale_age_max, age)
+
+    def on_watchdog(self, age: float) -> None:
+        self.watchdog_trips += 1
+        self.stale_age_max = max(self.stale_age_max, age)
+
+    def snapshot(self) -> Dict[str, float]:
+        """ Current values and rates since the last reset, as a flat dict """
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        result = {
+            "elapsed_s": elapsed,
+            "read_timeouts": self.read_timeouts,
+            "published": self.published,
+            "published_per_s": self.published / elapsed,
+            "overwritten": self.overwritten,
+            "ring_overruns": self.ring_overruns,
+            "polls_per_s": self.polls / elapsed,
+            "filter_calls": self.filter_calls,
+            "filter_time_mean_us": 1e6 * self.filter_time / self.filter_calls if self.filter_calls else 0.0,
+            "filter_time_max_us": 1e6 * self.filter_time_max,
+            "gil_wait_mean_ms": 1e3 * self.overrun_time / self.overrun_count if self.overrun_count else 0.0,
+            "gil_wait_max_ms": 1e3 * self.overrun_max,
+            "stale_reads": self.stale_reads,
+            "watchdog_trips": self.watchdog_trips,
+            "stale_age_max_ms": 1e3 * self.stale_age_max,
+        }
+        for channel, count in sorted(self.reports.items()):
+            result[f"reports_per_s[{channel}]"] = count / elapsed
+        return result
+
+
+def format_snapshot(snapshot: Dict[str, float]) -> str:
+    """ Multi-line summary of a snapshot for display """
+    reports = ", ".join(f"ch{key[len('reports_per_s['):-1]} {value:.0f}" for key, value in snapshot.items() if key.startswith("reports_per_s["))
+    return "\n".join((
+        f"Reports/s: {reports or '-'}   Timeouts: {snapshot['read_timeouts']}",
+        f"Published: {snapshot['published']} ({snapshot['published_per_s']:.0f}/s)   Overwritten: {snapshot['overwritten']}"
+        f"   Ring overruns: {snapshot['ring_overruns']}",
+        f"Polls/s: {snapshot['polls_per_s']:.0f}   Filter: {snapshot['filter_time_mean_us']:.0f} us (max {snapshot['filter_time_max_us']:.0f})",
+        f"GIL wait: {snapshot['gil_wait_mean_ms']:.1f} ms (max {snapshot['gil_wait_max_ms']:.1f})",
+        f"Stale reads: {snapshot['stale_reads']}   Watchdog trips: {snapshot['watchdog_trips']}   Oldest: {snapshot['stale_age_max_ms']:.0f} ms",
+    ))
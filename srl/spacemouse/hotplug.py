@@ -0,0 +1,84 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from srl.spacemouse.device import DEVICE_SPECS, DeviceSpec
+
+HOTPLUG_MIN_INTERVAL = 0.05
+HOTPLUG_MAX_INTERVAL = 2.0
+
+
+def device_present(hid_ids: List[List[int]]) -> bool:
+    """ Whether any device with one of the (vendor id, product id) pairs is attached """
+    import hid
+    wanted = {(vendor_id, product_id) for vendor_id, product_id in hid_ids}
+    for info in hid.enumerate():
+        if (info["vendor_id"], info["product_id"]) in wanted:
+            return True
+    return False
+
+
+def attached_devices() -> List[Tuple[DeviceSpec, Dict]]:
+    """ Supported devices that are attached, with the `hid.enumerate()` info of each. Devices with several HID
+        interfaces are listed once.
+    """
+    import hid
+    by_ids = {(vendor_id, product_id): spec for spec in DEVICE_SPECS.values() for vendor_id, product_id in spec.hid_ids}
+    found = {}
+    for info in hid.enumerate():
+        ids = (info["vendor_id"], info["product_id"])
+        if ids in by_ids:
+            found.setdefault(ids + (info.get("serial_number"),), (by_ids[ids], info))
+    return list(found.values())
+
+
+def _dev_mtime() -> Optional[int]:
+    # Creating or removing a device node (e.g. /dev/hidraw3) changes the modification time of /dev
+    try:
+        return os.stat("/dev").st_mtime_ns
+    except OSError:
+        return None
+
+
+class HotplugWatcher:
+    """ Waits for a device to be attached, without hammering the USB stack.
+
+        `hid.enumerate()` is run with exponential backoff between min_interval and max_interval. Whenever /dev
+        changes (a device node appeared or disappeared) it is run immediately instead, so a replugged device is
+        usually found within min_interval regardless of how long it was gone.
+    """
+    def __init__(self, hid_ids: List[List[int]], min_interval: float = HOTPLUG_MIN_INTERVAL, max_interval: float = HOTPLUG_MAX_INTERVAL) -> None:
+        self.hid_ids = hid_ids
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.reset()
+
+    def reset(self) -> None:
+        self._delay = self.min_interval
+
+    def next_delay(self) -> float:
+        """ The current backoff delay, doubling it for next time """
+        delay = self._delay
+        self._delay = min(self._delay * 2, self.max_interval)
+        return delay
+
+    def wait_for_device(self, stop_event: threading.Event) -> bool:
+        """ Block until a matching device is enumerated (True) or stop_event is set (False) """
+        dev_mtime = _dev_mtime()
+        next_enumerate = 0.0
+        while not stop_event.is_set():
+            now = time.monotonic()
+            mtime = _dev_mtime()
+            if mtime != dev_mtime or now >= next_enumerate:
+                dev_mtime = mtime
+                if device_present(self.hid_ids):
+                    return True
+                next_enumerate = now + self.next_delay()
+            stop_event.wait(self.min_interval)
+        return False
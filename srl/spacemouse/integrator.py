@@ -0,0 +1,118 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+
+import time
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+# Orientations are unit quaternions stored as (w, x, y, z)
+IDENTITY_QUATERNION = np.array((1., 0., 0., 0.))
+
+INTEGRATOR_LINEAR_SPEED = 0.25
+INTEGRATOR_ANGULAR_SPEED = 1.0
+# Longest stretch a single command is held for. Devices go quiet when the puck is at rest, so a gap longer than
+# this means the last command is stale rather than still being applied.
+INTEGRATOR_MAX_DT = 0.1
+
+
+def quat_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    aw, ax, ay, az = a
+    bw, bx, by, bz = b
+    return np.array((
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+    ))
+
+
+def quat_from_rotation_vector(v: np.ndarray) -> np.ndarray:
+    angle = np.linalg.norm(v)
+    if angle < 1e-12:
+        return IDENTITY_QUATERNION.copy()
+    half = 0.5 * angle
+    return np.concatenate(((np.cos(half),), np.sin(half) * v / angle))
+
+
+def quat_rotate(q: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """ Rotate vector v by quaternion q """
+    w, u = q[0], q[1:]
+    return v + 2.0 * np.cross(u, np.cross(u, v) + w * v)
+
+
+class PoseIntegrator:
+    """ Integrates velocity-like 6-DoF commands into a target pose.
+
+        Each command is held from its own timestamp until the next one arrives (zero-order hold), so the pose
+        only depends on the command timestamps, not on how often anybody looks at it.
+    """
+    def __init__(self,
+        linear_speed: float = INTEGRATOR_LINEAR_SPEED,
+        angular_speed: float = INTEGRATOR_ANGULAR_SPEED,
+        frame: str = "world",
+        position_bounds: Optional[Tuple[Sequence[float], Sequence[float]]] = None,
+        max_dt: float = INTEGRATOR_MAX_DT) -> None:
+        """
+        Args:
+            linear_speed (float): translation per second at full deflection
+            angular_speed (float): rotation (rad) per second at full deflection
+            frame (str): "world" applies commands in the fixed frame, "tool" in the frame of the current pose
+            position_bounds (Tuple, optional): (min xyz, max xyz) workspace box to clamp the position to
+            max_dt (float): longest time a single command is held for
+        """
+        if frame not in ("world", "tool"):
+            raise ValueError(f"Unknown frame {frame}, expected 'world' or 'tool'")
+        self.linear_speed = linear_speed
+        self.angular_speed = angular_speed
+        self.frame = frame
+        self.max_dt = max_dt
+        self._bounds = None
+        if position_bounds is not None:
+            self._bounds = (np.array(position_bounds[0], dtype=float), np.array(position_bounds[1], dtype=float))
+        self.reset()
+
+    def reset(self, position: Optional[Sequence[float]] = None, orientation: Optional[Sequence[float]] = None) -> None:
+        """ Re-anchor the target pose, e.g. to the robot's current pose. Defaults to the origin and identity. """
+        p = np.zeros(3) if position is None else np.array(position, dtype=float)
+        q = IDENTITY_QUATERNION.copy() if orientation is None else np.array(orientation, dtype=float)
+        q /= np.linalg.norm(q)
+        # The whole state is swapped as one tuple so readers on other threads never see half an update:
+        # (time of last command, position, orientation, linear velocity, angular velocity)
+        self._state = (None, self._clamp(p), q, np.zeros(3), np.zeros(3))
+
+    def _clamp(self, p: np.ndarray) -> np.ndarray:
+        if self._bounds is None:
+            return p
+        return np.clip(p, self._bounds[0], self._bounds[1])
+
+    def _advance(self, p: np.ndarray, q: np.ndarray, v: np.ndarray, w: np.ndarray, dt: float):
+        if dt <= 0:
+            return p, q
+        if self.frame == "world":
+            p = p + v * dt
+            q = quat_multiply(quat_from_rotation_vector(w * dt), q)
+        else:
+            p = p + quat_rotate(q, v * dt)
+            q = quat_multiply(q, quat_from_rotation_vector(w * dt))
+        return self._clamp(p), q / np.linalg.norm(q)
+
+    def update(self, t: float, xyz: Sequence[float], rpy: Sequence[float]) -> None:
+        """ Apply the previous command up to time t, then hold this one """
+        last_t, p, q, v, w = self._state
+        if last_t is not None:
+            p, q = self._advance(p, q, v, w, min(max(t - last_t, 0.0), self.max_dt))
+        self._state = (t, p, q, self.linear_speed * np.asarray(xyz, dtype=float), self.angular_speed * np.asarray(rpy, dtype=float))
+
+    def get_pose(self, now: Optional[float] = None, extrapolate: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """ Returns (position, orientation quaternion (w, x, y, z)). With extrapolate, the command being held is
+            applied up to `now` (defaults to the current time), otherwise the pose is the one at the last command.
+        """
+        last_t, p, q, v, w = self._state
+        if extrapolate and last_t is not None:
+            if now is None:
+                now = time.time()
+            p, q = self._advance(p, q, v, w, min(max(now - last_t, 0.0), self.max_dt))
+        return p.copy(), q.copy()
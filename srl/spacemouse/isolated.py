@@ -0,0 +1,277 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+""" Run the HID reader in its own process, so input timing doesn't depend on how busy this interpreter is.
+
+    The child process opens the device and decodes reports with a regular `SpaceMouse`, then publishes samples
+    through shared memory (see `srl.spacemouse.shm`). It also writes one byte to a pipe per sample, so a thread
+    in this process can sleep until there is something new instead of polling. That thread republishes every
+    sample on the `IsolatedSpaceMouse`, in order, so callbacks, listeners, counters and recordings work
+    unchanged. Samples the ring overwrote before the thread got to them are counted as ring overruns. The
+    reads themselves (reports per channel, timeouts, GIL waits) are counted in the child, which sends the
+    counts over once per ISOLATED_COUNTS_INTERVAL.
+"""
+
+import multiprocessing
+import multiprocessing.spawn
+import os
+import sys
+import threading
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+
+from srl.spacemouse.device import DEVICE_SPECS, DeviceSpec, SpaceMouseData
+from srl.spacemouse.log import log_error, log_warn
+from srl.spacemouse.shm import SHM_RING_SIZE, SharedMemoryPublisher, SharedMemoryReader
+from srl.spacemouse.spacemouse import SpaceMouse, TELEOP_CONTROL_RATE
+
+# How long run() waits for the child to start and open the device
+ISOLATED_START_TIMEOUT = 5.0
+# Seconds between the child's reports of its read counts
+ISOLATED_COUNTS_INTERVAL = 1.0
+
+
+def _configure_process(cpu_affinity: Optional[Iterable[int]], nice: Optional[int], realtime_priority: Optional[int]):
+    try:
+        if cpu_affinity is not None:
+            os.sched_setaffinity(0, set(cpu_affinity))
+        if nice is not None:
+            os.setpriority(os.PRIO_PROCESS, 0, nice)
+        if realtime_priority is not None:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(realtime_priority))
+    except (OSError, AttributeError) as e:
+        # Raising priority usually needs privileges. Carry on at normal priority.
+        log_warn(f"Unable to apply SpaceMouse reader process affinity/priority: {e}")
+
+
+def _reader_process_main(device_name, control_rate, auto_reconnect, ring_size, connection, notify, stop_event,
+                         cpu_affinity, nice, realtime_priority):
+    _configure_process(cpu_affinity, nice, realtime_priority)
+    publisher = SharedMemoryPublisher(ring_size=ring_size)
+    notify_fd = notify.fileno()
+    os.set_blocking(notify_fd, False)
+
+    def on_sample(sample, sequence):
+        publisher.on_sample(sample, sequence)
+        try:
+            os.write(notify_fd, b"\0")
+        except (BlockingIOError, BrokenPipeError):
+            # The parent isn't draining the pipe; it reads the newest sample from shared memory anyway
+            pass
+
+    device = SpaceMouse(DEVICE_SPECS[device_name], control_rate, auto_reconnect)
+    device.add_sample_listener(on_sample)
+    device.set_unexpected_close_callback(stop_event.set)
+    # The reads happen here, so this is where they're counted
+    device.enable_perf_counters()
+    try:
+        device.run()
+    except RuntimeError as e:
+        connection.send(("error", str(e)))
+        publisher.close()
+        return
+    connection.send(("ready", publisher.name))
+    # A parent that stopped reading mustn't hold this process up. The messages are far below the size a pipe
+    # writes atomically, so a full pipe drops a message whole.
+    os.set_blocking(connection.fileno(), False)
+    try:
+        while not stop_event.wait(ISOLATED_COUNTS_INTERVAL):
+            try:
+                connection.send(("reads", device._counters.take_read_counts()))
+            except (BlockingIOError, BrokenPipeError):
+                pass
+    finally:
+        device.close()
+        publisher.close()
+
+
+def _python_executable() -> str:
+    # Inside Kit, sys.executable is the Kit binary, which can't run a multiprocessing child
+    if os.path.basename(sys.executable).startswith("python"):
+        return sys.executable
+    for name in ("python3", "python"):
+        candidate = os.path.join(sys.prefix, "bin", name)
+        if os.path.exists(candidate):
+            return candidate
+    return sys.executable
+
+
+class IsolatedSpaceMouse(SpaceMouse):
+    """ A SpaceMouse whose HID reading and decoding happens in a dedicated subprocess """
+    def __init__(self,
+        spec: DeviceSpec,
+        control_rate=TELEOP_CONTROL_RATE,
+        auto_reconnect=False,
+        cpu_affinity: Optional[Iterable[int]] = None,
+        nice: Optional[int] = None,
+        realtime_priority: Optional[int] = None,
+        python_executable: Optional[str] = None,
+        ring_size: int = SHM_RING_SIZE):
+        """
+        Args:
+            cpu_affinity (Iterable[int], optional): CPUs the reader process may run on
+            nice (int, optional): niceness of the reader process. Negative values need privileges.
+            realtime_priority (int, optional): run the reader process with SCHED_FIFO at this priority
+            python_executable (str, optional): interpreter for the reader process. Defaults to the Python
+                that runs this process (inside Kit, the bundled Python rather than the Kit binary).
+            ring_size (int): samples kept in shared memory
+        """
+        super().__init__(spec, control_rate, auto_reconnect)
+        self.cpu_affinity = cpu_affinity
+        self.nice = nice
+        self.realtime_priority = realtime_priority
+        self.python_executable = python_executable
+        self.ring_size = ring_size
+        self._process = None
+        self._process_stop = None
+        self._reader = None
+        self._notify = None
+        self._connection = None
+
+    @property
+    def is_connected(self) -> bool:
+        return self.is_running and self._process is not None and self._process.is_alive()
+
+    def run(self):
+        """ Start the reader process, or resume reading from it if it's still running. Blocks until the process
+            has opened the device, which typically takes under a second, and raises RuntimeError if it can't or
+            takes longer than ISOLATED_START_TIMEOUT.
+        """
+        if self.thread:
+            return
+        if self._process is not None and self._process.is_alive():
+            # Stopped but not closed, so the reader process is still going
+            self.thread = threading.Thread(target=self._run_loop, name="spacemouse-reader")
+            self.thread.daemon = True
+            self.thread.start()
+            return
+        self._shutdown_process()
+        context = multiprocessing.get_context("spawn")
+        connection, child_connection = context.Pipe(duplex=False)
+        notify, child_notify = context.Pipe(duplex=False)
+        self._process_stop = context.Event()
+        self._process = context.Process(
+            target=_reader_process_main,
+            args=(self.name, self._control_rate, self.auto_reconnect, self.ring_size, child_connection, child_notify,
+                  self._process_stop, self.cpu_affinity, self.nice, self.realtime_priority),
+            daemon=True,
+        )
+        # The executable is a process-wide setting. Only this child gets ours.
+        previous_executable = multiprocessing.spawn.get_executable()
+        context.set_executable(self.python_executable or _python_executable())
+        try:
+            self._process.start()
+        finally:
+            context.set_executable(previous_executable)
+        child_connection.close()
+        child_notify.close()
+
+        status, detail = ("error", "reader process didn't start")
+        if connection.poll(ISOLATED_START_TIMEOUT):
+            try:
+                status, detail = connection.recv()
+            except EOFError:
+                pass
+        if status != "ready":
+            log_error(f"Unable to open {self.name} in the reader process: {detail}")
+            connection.close()
+            notify.close()
+            self._shutdown_process()
+            raise RuntimeError("Couldn't open device")
+
+        # Kept open for the child's read counts
+        self._connection = connection
+        self._notify = notify
+        # The child shares our resource tracker, which must keep tracking the block in case the child dies
+        self._reader = SharedMemoryReader(detail, untrack=False)
+        self.thread = threading.Thread(target=self._run_loop, name="spacemouse-reader")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        self.stop()
+        self.stop_recording()
+        self._stop_watchdog()
+        self._shutdown_process()
+
+    def _shutdown_process(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._notify is not None:
+            self._notify.close()
+            self._notify = None
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        if self._process is not None:
+            self._process_stop.set()
+            if self._process.pid is not None:
+                self._process.join(timeout=2.0)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join()
+            self._process = None
+
+    def _run_loop(self):
+        # Shared memory carries monotonic stamps; consumers expect the same wall clock stamps as SpaceMouse gives
+        clock_offset = time.time() - time.monotonic()
+        timeout = 1.0 / self._control_rate
+        reader = self._reader
+        # Samples from before this thread started are old news, apart from the newest
+        last_sequence = max(0, reader.write_count - 1)
+        notify_fd = self._notify.fileno()
+        next_counts = time.monotonic() + ISOLATED_COUNTS_INTERVAL
+        while not self._stop_event.is_set():
+            if time.monotonic() >= next_counts:
+                next_counts += ISOLATED_COUNTS_INTERVAL
+                self._receive_read_counts()
+            # Sleeps without holding the GIL until the child signals a sample
+            if self._notify.poll(timeout):
+                try:
+                    # An empty read means the child closed its end, i.e. exited
+                    alive = len(os.read(notify_fd, 4096)) > 0
+                except BlockingIOError:
+                    alive = True
+            else:
+                alive = self._process.is_alive()
+                if alive:
+                    self._publish_heartbeat()
+                    continue
+            if not alive:
+                log_warn("SpaceMouse reader process exited. Closing device.")
+                self._publish(SpaceMouseData(time.time(), np.zeros(3), np.zeros(3), 0))
+                self._shutdown_process()
+                if self._unexpected_close_callback:
+                    self._unexpected_close_callback()
+                self.thread = None
+                break
+            pending = reader.write_count - last_sequence
+            if pending <= 0:
+                continue
+            samples = [sample for sample in reader.read_recent(pending) if sample.sequence > last_sequence]
+            if not samples:
+                continue
+            overrun = samples[-1].sequence - last_sequence - len(samples)
+            last_sequence = samples[-1].sequence
+            if overrun:
+                counters = self._counters
+                if counters is not None:
+                    counters.on_ring_overrun(overrun)
+            for sample in samples:
+                values = sample.values
+                self._publish(SpaceMouseData(sample.t + clock_offset, np.array(values[:3]), np.array(values[3:]), sample.buttons))
+
+    def _receive_read_counts(self):
+        counters = self._counters
+        try:
+            while self._connection.poll():
+                kind, counts = self._connection.recv()
+                if counters is not None:
+                    counters.add_read_counts(counts)
+        except (EOFError, OSError):
+            # The child exited, which the notify pipe reports to the loop
+            pass
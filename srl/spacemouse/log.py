@@ -0,0 +1,24 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+""" Logging that goes to carb inside Kit and to the standard `logging` module everywhere else, so the driver
+    can be used from plain Python processes.
+"""
+
+import logging
+
+try:
+    import carb
+except ImportError:
+    carb = None
+
+if carb is not None:
+    log_info = carb.log_info
+    log_warn = carb.log_warn
+    log_error = carb.log_error
+else:
+    _logger = logging.getLogger("srl.spacemouse")
+    log_info = _logger.info
+    log_warn = _logger.warning
+    log_error = _logger.error
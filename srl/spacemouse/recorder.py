@@ -0,0 +1,248 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+""" Record every sample of a SpaceMouse to disk as columns, split into episodes.
+
+    Layout of a recording directory:
+
+        episode_000000/
+            meta.json
+            t/000000.npy, t/000001.npy, ...
+            sequence/...
+            raw/...          (N, 6) x, y, z, roll, pitch, yaw as published by the device
+            filtered/...     (N, 6) after the device's position/rotation callbacks
+            buttons/...
+        episode_000001/
+            ...
+
+    Every chunk is a plain .npy file, so it can be memory mapped with `np.load(..., mmap_mode="r")`.
+    Samples are appended to preallocated columns on the reader thread; full chunks are handed to a background
+    thread which does all of the file IO.
+"""
+
+import json
+import os
+import queue
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from srl.spacemouse.buttons import DEVICE_BUTTON_STRUCT_INDICES
+from srl.spacemouse.device import SpaceMouseData
+
+RECORDER_CHUNK_SIZE = 4096
+
+RECORDER_COLUMNS = {
+    "t": ((), np.float64),
+    "sequence": ((), np.int64),
+    "raw": ((6,), np.float32),
+    "filtered": ((6,), np.float32),
+    "buttons": ((), np.int64),
+}
+
+
+def _allocate_chunk(chunk_size: int) -> Dict[str, np.ndarray]:
+    return {name: np.empty((chunk_size,) + shape, dtype=dtype) for name, (shape, dtype) in RECORDER_COLUMNS.items()}
+
+
+def _button_mask(name_to_index: Dict[str, int], names: Optional[Iterable[str]]) -> int:
+    mask = 0
+    for name in names or ():
+        if name not in name_to_index:
+            raise ValueError(f"Unknown button {name}, expected one of {list(name_to_index.keys())}")
+        mask |= 1 << name_to_index[name]
+    return mask
+
+
+class EpisodeRecorder:
+    def __init__(self,
+        device,
+        directory: str,
+        chunk_size: int = RECORDER_CHUNK_SIZE,
+        start_buttons: Optional[Iterable[str]] = None,
+        stop_buttons: Optional[Iterable[str]] = None,
+        record_filtered: bool = True) -> None:
+        """
+        Args:
+            device (SpaceMouse): device to record
+            directory (str): where to create episode directories
+            chunk_size (int): samples per chunk file
+            start_buttons (Iterable[str], optional): pressing any of these buttons ends the current episode (if
+                any) and starts a new one. If neither start nor stop buttons are given, recording starts
+                immediately and runs until close().
+            stop_buttons (Iterable[str], optional): pressing any of these buttons ends the current episode
+            record_filtered (bool): also record the output of `device.get_controller_state()`
+        """
+        name_to_index = DEVICE_BUTTON_STRUCT_INDICES[device.name]
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.record_filtered = record_filtered
+        self.episode_count = 0
+        self.sample_count = 0
+        self.write_errors = 0
+        self.last_error = None
+        self._device = device
+        self._start_mask = _button_mask(name_to_index, start_buttons)
+        self._stop_mask = _button_mask(name_to_index, stop_buttons)
+        self._last_buttons = 0
+        self._episode_dir = None
+        self._episode_meta = None
+        self._chunk = None
+        self._chunk_fill = 0
+        self._chunk_index = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        # After the highest existing index rather than the count, which would collide if an episode was deleted
+        indices = [_episode_index(path) for path in list_episodes(directory)]
+        self._next_episode = max((index for index in indices if index is not None), default=-1) + 1
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop)
+        self._writer.daemon = True
+        self._writer.start()
+
+        if not self._start_mask and not self._stop_mask:
+            self.start_episode()
+        device.add_sample_listener(self._on_sample)
+
+    @property
+    def is_recording(self) -> bool:
+        return self._episode_dir is not None
+
+    def start_episode(self) -> str:
+        """ End the current episode, if any, and start a new one. Returns the new episode's directory. """
+        with self._lock:
+            self._end_episode()
+            self._episode_dir = os.path.join(self.directory, f"episode_{self._next_episode:06d}")
+            self._next_episode += 1
+            self._episode_meta = {"device": self._device.name, "samples": 0, "chunks": 0, "start_t": None, "end_t": None}
+            self._chunk = _allocate_chunk(self.chunk_size)
+            self._chunk_fill = 0
+            self._chunk_index = 0
+            return self._episode_dir
+
+    def end_episode(self) -> None:
+        with self._lock:
+            self._end_episode()
+
+    def close(self) -> None:
+        """ Stop recording and wait for everything to be written """
+        self._device.remove_sample_listener(self._on_sample)
+        self.end_episode()
+        self._queue.put(None)
+        self._writer.join()
+
+    def _on_sample(self, sample: SpaceMouseData, sequence: int) -> None:
+        # Called on the reader thread, so everything here has to stay cheap
+        buttons = int(sample.buttons)
+        pressed = buttons & ~self._last_buttons
+        self._last_buttons = buttons
+        if pressed & self._start_mask:
+            self.start_episode()
+        elif pressed & self._stop_mask:
+            self.end_episode()
+
+        with self._lock:
+            if self._episode_dir is None:
+                return
+            chunk = self._chunk
+            i = self._chunk_fill
+            chunk["t"][i] = sample.t
+            chunk["sequence"][i] = sequence
+            chunk["raw"][i, :3] = sample.xyz
+            chunk["raw"][i, 3:] = sample.rpy
+            chunk["buttons"][i] = buttons
+            filtered = self._device._filtered_state() if self.record_filtered else None
+            if filtered is not None:
+                chunk["filtered"][i, :3] = filtered.xyz
+                chunk["filtered"][i, 3:] = filtered.rpy
+            else:
+                chunk["filtered"][i] = np.nan
+            if self._episode_meta["start_t"] is None:
+                self._episode_meta["start_t"] = sample.t
+            self._episode_meta["end_t"] = sample.t
+            self._chunk_fill = i + 1
+            self.sample_count += 1
+            if self._chunk_fill == self.chunk_size:
+                self._flush_chunk()
+
+    def _flush_chunk(self) -> None:
+        if self._chunk_fill == 0:
+            return
+        self._queue.put((self._episode_dir, self._chunk_index, self._chunk, self._chunk_fill))
+        self._episode_meta["samples"] += self._chunk_fill
+        self._episode_meta["chunks"] += 1
+        self._chunk_index += 1
+        self._chunk = _allocate_chunk(self.chunk_size)
+        self._chunk_fill = 0
+
+    def _end_episode(self) -> None:
+        if self._episode_dir is None:
+            return
+        self._flush_chunk()
+        self._queue.put((self._episode_dir, None, dict(self._episode_meta), 0))
+        self.episode_count += 1
+        self._episode_dir = None
+        self._episode_meta = None
+        self._chunk = None
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            episode_dir, chunk_index, payload, fill = item
+            try:
+                if chunk_index is None:
+                    os.makedirs(episode_dir, exist_ok=True)
+                    with open(os.path.join(episode_dir, "meta.json"), "w") as f:
+                        json.dump(payload, f)
+                    continue
+                for name, column in payload.items():
+                    column_dir = os.path.join(episode_dir, name)
+                    os.makedirs(column_dir, exist_ok=True)
+                    np.save(os.path.join(column_dir, f"{chunk_index:06d}.npy"), column[:fill])
+            except OSError as e:
+                self.write_errors += 1
+                self.last_error = e
+
+
+def _episode_index(episode_dir: str) -> Optional[int]:
+    try:
+        return int(os.path.basename(episode_dir)[len("episode_"):])
+    except ValueError:
+        return None
+
+
+def list_episodes(directory: str) -> List[str]:
+    """ Episode directories in a recording directory, in recording order """
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory) if name.startswith("episode_"))
+    return [os.path.join(directory, name) for name in names]
+
+
+def load_episode(episode_dir: str, mmap_mode: Optional[str] = "r") -> Dict[str, np.ndarray]:
+    """ Load every column of an episode. Columns that were written as a single chunk stay memory mapped;
+        multi-chunk columns are concatenated into memory.
+    """
+    columns = {}
+    for name, (shape, dtype) in RECORDER_COLUMNS.items():
+        column_dir = os.path.join(episode_dir, name)
+        chunk_files = sorted(os.listdir(column_dir)) if os.path.isdir(column_dir) else []
+        chunks = [np.load(os.path.join(column_dir, f), mmap_mode=mmap_mode) for f in chunk_files]
+        if not chunks:
+            columns[name] = np.empty((0,) + shape, dtype=dtype)
+        elif len(chunks) == 1:
+            columns[name] = chunks[0]
+        else:
+            columns[name] = np.concatenate(chunks)
+    return columns
+
+
+def episode_samples(columns: Dict[str, np.ndarray], filtered: bool = False) -> SpaceMouseData:
+    """ View a loaded episode as a SpaceMouseData of arrays, e.g. for `srl.spacemouse.resample.resample` """
+    values = columns["filtered" if filtered else "raw"]
+    return SpaceMouseData(columns["t"], values[:, :3], values[:, 3:], columns["buttons"])
@@ -0,0 +1,85 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+""" 6x6 matrices that map the device's (x, y, z, roll, pitch, yaw) onto the axes your application uses.
+
+    Samples come out of the device in its own frame: x to the right, y away from the user and z up, with roll,
+    pitch and yaw as rotations about those axes. `SpaceMouse.set_axis_remap` applies one of these matrices to
+    every sample as it is published. Combine them by multiplying, e.g.
+    `scale_remap(.5, 1.) @ camera_relative_remap(camera_rotation)`.
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+AXIS_NAMES = ("x", "y", "z")
+
+# Device axes expressed in a USD camera's frame, where the camera looks down -Z with +Y up: pushing the puck
+# away from you moves along the view direction, pushing right moves right and lifting moves up.
+DEVICE_TO_CAMERA = np.array((
+    (1., 0., 0.),
+    (0., 0., 1.),
+    (0., -1., 0.),
+))
+
+
+def identity_remap() -> np.ndarray:
+    return np.eye(6)
+
+
+def block_remap(translation: np.ndarray, rotation: np.ndarray) -> np.ndarray:
+    """ A remap that transforms translation and rotation by separate 3x3 matrices """
+    remap = np.zeros((6, 6))
+    remap[:3, :3] = translation
+    remap[3:, 3:] = rotation
+    return remap
+
+
+def frame_remap(rotation: np.ndarray) -> np.ndarray:
+    """ Re-express both translation and rotation in another frame, given the 3x3 rotation from device to that frame """
+    rotation = np.asarray(rotation, dtype=float)
+    return block_remap(rotation, rotation)
+
+
+def signed_axes(axes: Sequence[str]) -> np.ndarray:
+    """ 3x3 matrix that picks and flips axes, e.g. ("y", "-x", "z") sends device y to output x and -x to output y """
+    matrix = np.zeros((3, 3))
+    for row, axis in enumerate(axes):
+        sign = -1. if axis.startswith("-") else 1.
+        matrix[row, AXIS_NAMES.index(axis.lstrip("+-"))] = sign
+    return matrix
+
+
+def axes_remap(translation_axes: Sequence[str] = AXIS_NAMES, rotation_axes: Sequence[str] = AXIS_NAMES) -> np.ndarray:
+    """ Swap and flip axes, separately for translation and rotation (see signed_axes) """
+    return block_remap(signed_axes(translation_axes), signed_axes(rotation_axes))
+
+
+def scale_remap(translation_scale=1., rotation_scale=1.) -> np.ndarray:
+    """ Scale translation and rotation, either uniformly or per axis """
+    scales = np.empty(6)
+    scales[:3] = translation_scale
+    scales[3:] = rotation_scale
+    return np.diag(scales)
+
+
+def camera_relative_remap(camera_rotation: np.ndarray) -> np.ndarray:
+    """ Commands in world coordinates that move relative to what a camera sees.
+
+        camera_rotation is the camera's 3x3 world rotation (world from camera, e.g. the upper left of its USD world
+        transform, transposed since USD matrices are row-major). Pushing the puck away from you then moves into the
+        screen, whichever way the camera faces.
+    """
+    return frame_remap(np.asarray(camera_rotation, dtype=float) @ DEVICE_TO_CAMERA)
+
+
+def robot_base_remap(base_rotation: np.ndarray, user_rotation: Optional[np.ndarray] = None) -> np.ndarray:
+    """ Commands in a robot's base frame for a user facing a fixed direction.
+
+        base_rotation is the base's 3x3 world rotation (world from base). user_rotation is the device's orientation
+        in the world (world from device), by default lined up with the world axes.
+    """
+    world_from_device = np.eye(3) if user_rotation is None else np.asarray(user_rotation, dtype=float)
+    return frame_remap(np.asarray(base_rotation, dtype=float).T @ world_from_device)
@@ -0,0 +1,178 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+""" Convert irregularly timed SpaceMouse samples to a fixed rate.
+
+    Methods:
+        "zoh": value of the newest sample at or before each grid time
+        "linear": linear interpolation between the samples around each grid time
+        "decimate": average of the (held) signal over the grid period ending at each grid time. This is an exact
+            box filter for irregular input, so it doesn't alias when going to a lower rate.
+
+    Buttons are bitfields. Each output holds the button state at the grid time, except that a bit which toggled
+    an even number of times within the period (a press and release, or release and press, shorter than one
+    period) is inverted for that output, so no edge is lost.
+"""
+
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from srl.spacemouse.device import SpaceMouseData
+
+RESAMPLE_METHODS = ("zoh", "linear", "decimate")
+
+
+def stack_samples(samples: Iterable[SpaceMouseData]) -> SpaceMouseData:
+    """ Turn a sequence of samples into a single SpaceMouseData of arrays (t: (N,), xyz/rpy: (N, 3), buttons: (N,)) """
+    samples = list(samples)
+    t = np.array([s.t for s in samples], dtype=float)
+    xyz = np.array([s.xyz for s in samples], dtype=float).reshape(-1, 3)
+    rpy = np.array([s.rpy for s in samples], dtype=float).reshape(-1, 3)
+    buttons = np.array([int(s.buttons) for s in samples], dtype=np.int64)
+    return SpaceMouseData(t, xyz, rpy, buttons)
+
+
+def make_grid(start: float, end: float, rate: float) -> np.ndarray:
+    """ Grid times start, start + 1/rate, ... up to and including end """
+    count = int(np.floor((end - start) * rate + 1e-9)) + 1
+    return start + np.arange(max(count, 0)) / rate
+
+
+def _sample_indices(t_out: np.ndarray, t: np.ndarray) -> np.ndarray:
+    # Index of the newest sample at or before each grid time (-1 if there is none)
+    return np.searchsorted(t, t_out, side="right") - 1
+
+
+def resample_values(t_out: np.ndarray, t: np.ndarray, values: np.ndarray, method: str = "zoh", period: Optional[float] = None) -> np.ndarray:
+    """
+    Args:
+        t_out (np.ndarray): (M,) grid times
+        t (np.ndarray): (N,) sample times, non-decreasing
+        values (np.ndarray): (N, C) sample values
+        method (str): one of RESAMPLE_METHODS
+        period (float, optional): averaging window for "decimate". Defaults to the grid spacing.
+
+    Returns:
+        np.ndarray: (M, C) resampled values. Grid times outside the sampled range hold the nearest sample.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(t) == 0:
+        raise ValueError("Need at least one sample to resample")
+    if method == "zoh":
+        return values[np.clip(_sample_indices(t_out, t), 0, None)]
+
+    elif method == "linear":
+        if len(t) == 1:
+            return np.repeat(values, len(t_out), axis=0)
+        i0 = np.clip(_sample_indices(t_out, t), 0, len(t) - 2)
+        span = t[i0 + 1] - t[i0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            w = np.where(span > 0, (t_out - t[i0]) / span, 1.0)
+        w = np.clip(w, 0.0, 1.0)[:, None]
+        return values[i0] * (1.0 - w) + values[i0 + 1] * w
+
+    elif method == "decimate":
+        if period is None:
+            period = t_out[1] - t_out[0] if len(t_out) > 1 else 0.0
+        if period <= 0:
+            return resample_values(t_out, t, values, "zoh")
+        # Integral of the held signal, evaluated exactly at both ends of every window
+        cumulative = np.zeros_like(values)
+        cumulative[1:] = np.cumsum(values[:-1] * np.diff(t)[:, None], axis=0)
+
+        def integral(times):
+            i = np.clip(_sample_indices(times, t), 0, None)
+            return cumulative[i] + values[i] * (times - t[i])[:, None]
+
+        return (integral(t_out) - integral(t_out - period)) / period
+
+    raise ValueError(f"Unknown resampling method {method}, expected one of {RESAMPLE_METHODS}")
+
+
+def resample_buttons(t_out: np.ndarray, t: np.ndarray, buttons: np.ndarray) -> np.ndarray:
+    """ Edge preserving resampling of button bitfields. The period of each output is the interval since the
+        previous grid time.
+
+    Returns:
+        np.ndarray: (M,) int64 bitfields
+    """
+    buttons = np.asarray(buttons, dtype=np.int64)
+    idx = np.clip(_sample_indices(t_out, t), 0, None)
+    held = buttons[idx]
+    if len(t_out) < 2 or len(buttons) < 2:
+        return held
+    num_bits = max(int(buttons.max()).bit_length(), 1)
+    bits = (buttons[:, None] >> np.arange(num_bits)) & 1
+    # Running count of toggles per bit, so that toggles inside a period are a difference of two lookups
+    toggles = np.zeros_like(bits)
+    toggles[1:] = np.cumsum(bits[1:] != bits[:-1], axis=0)
+    counts = np.zeros((len(t_out), num_bits), dtype=np.int64)
+    counts[1:] = toggles[idx[1:]] - toggles[idx[:-1]]
+    pulses = (counts > 0) & (counts % 2 == 0)
+    return held ^ (pulses.astype(np.int64) << np.arange(num_bits)).sum(axis=1)
+
+
+def resample(samples: SpaceMouseData, rate: float, method: str = "zoh", start: Optional[float] = None, end: Optional[float] = None) -> SpaceMouseData:
+    """ Resample a whole recording in one pass
+
+    Args:
+        samples (SpaceMouseData): arrays of samples, see `stack_samples`
+        rate (float): output rate in Hz
+        method (str): one of RESAMPLE_METHODS
+        start (float, optional): first grid time. Defaults to the first sample time.
+        end (float, optional): last possible grid time. Defaults to the last sample time.
+
+    Returns:
+        SpaceMouseData: arrays at the fixed rate
+    """
+    t = np.asarray(samples.t, dtype=float)
+    values = np.hstack((np.asarray(samples.xyz, dtype=float), np.asarray(samples.rpy, dtype=float)))
+    t_out = make_grid(t[0] if start is None else start, t[-1] if end is None else end, rate)
+    out = resample_values(t_out, t, values, method, 1.0 / rate)
+    return SpaceMouseData(t_out, out[:, :3], out[:, 3:], resample_buttons(t_out, t, samples.buttons))
+
+
+class StreamResampler:
+    """ Incremental version of `resample` for live samples. Push samples as they arrive; every push returns the
+        grid points up to the new sample's time, which can't change anymore.
+    """
+    def __init__(self, rate: float, method: str = "zoh", start: Optional[float] = None) -> None:
+        if method not in RESAMPLE_METHODS:
+            raise ValueError(f"Unknown resampling method {method}, expected one of {RESAMPLE_METHODS}")
+        self.rate = rate
+        self.method = method
+        self._next_grid = start
+        self._t: List[float] = []
+        self._values: List[np.ndarray] = []
+        self._buttons: List[int] = []
+
+    def push(self, sample: SpaceMouseData) -> Optional[SpaceMouseData]:
+        """ Returns:
+            Optional[SpaceMouseData]: arrays of newly completed grid points, or None if there are none
+        """
+        self._t.append(sample.t)
+        self._values.append(np.concatenate((sample.xyz, sample.rpy)))
+        self._buttons.append(int(sample.buttons))
+        if self._next_grid is None:
+            self._next_grid = sample.t
+        if sample.t < self._next_grid:
+            return None
+
+        t = np.array(self._t)
+        t_out = make_grid(self._next_grid, sample.t, self.rate)
+        period = 1.0 / self.rate
+        values = resample_values(t_out, t, np.array(self._values), self.method, period)
+        # The first output's button period starts one grid step back, so prepend that grid time and drop it after
+        buttons = resample_buttons(np.concatenate(([t_out[0] - period], t_out)), t, np.array(self._buttons))[1:]
+        self._next_grid = t_out[-1] + period
+        self._trim(t_out[-1] - period)
+        return SpaceMouseData(t_out, values[:, :3], values[:, 3:], buttons)
+
+    def _trim(self, keep_after: float) -> None:
+        # Keep the newest sample at or before keep_after, and everything since
+        first = max(int(np.searchsorted(self._t, keep_after, side="right")) - 1, 0)
+        del self._t[:first]
+        del self._values[:first]
+        del self._buttons[:first]
@@ -0,0 +1,138 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+""" Keep open devices alive across disengage and extension hot reloads.
+
+    Opening a device (and, for an `IsolatedSpaceMouse`, starting its reader process) takes a while and throws
+    away the filter's state. A `DeviceSession` keeps the open device and the filter feeding it. Disengaging only
+    pauses it (see `SpaceMouse.pause`), and the next engage of the same device resumes it.
+
+    The registry is stored on the `sys` module rather than in this module, because a hot reload re-imports this
+    module (and with it its globals) but `sys` stays. A session is only reused if none of the source files of
+    its device or filter classes changed since it was opened. Otherwise the reload is for driver code, and the
+    device is reopened with the new code.
+"""
+
+import atexit
+import os
+import sys
+from typing import Callable, Dict, Optional, Tuple
+
+from srl.spacemouse.log import log_info, log_warn
+
+# Attribute of `sys` holding {device name: DeviceSession}
+SESSION_REGISTRY_ATTR = "_srl_spacemouse_sessions"
+
+
+def _registry() -> Dict[str, "DeviceSession"]:
+    registry = getattr(sys, SESSION_REGISTRY_ATTR, None)
+    if registry is None:
+        registry = {}
+        setattr(sys, SESSION_REGISTRY_ATTR, registry)
+        # Registered once per process, not once per reload
+        atexit.register(close_all_sessions)
+    return registry
+
+
+def _code_stamp(*objects) -> Tuple:
+    """ Modification times of the files defining the classes of objects (and their bases) """
+    stamp = []
+    for obj in objects:
+        for cls in type(obj).__mro__:
+            path = getattr(sys.modules.get(cls.__module__), "__file__", None)
+            if path is not None and cls.__module__.startswith("srl."):
+                try:
+                    stamp.append((path, os.path.getmtime(path)))
+                except OSError:
+                    stamp.append((path, None))
+    return tuple(sorted(set(stamp)))
+
+
+class DeviceSession:
+    """ An open device, how it was opened and the filter its callbacks point to """
+    def __init__(self, name: str, kind: str, device, filter) -> None:
+        self.name = name
+        self.kind = kind
+        self.device = device
+        self.filter = filter
+        self.code_stamp = _code_stamp(device, filter)
+        # Called if the device closes unexpectedly while the session is active, e.g. by the extension
+        self.on_unexpected_close: Optional[Callable[[], None]] = None
+        device.set_unexpected_close_callback(self._on_unexpected_close)
+
+    @property
+    def is_reusable(self) -> bool:
+        return self.device.is_running and self.code_stamp == _code_stamp(self.device, self.filter)
+
+    def pause(self) -> None:
+        self.on_unexpected_close = None
+        self.device.pause()
+
+    def resume(self) -> None:
+        self.device.resume()
+
+    def close(self) -> None:
+        self.on_unexpected_close = None
+        self.device.close()
+
+    def _on_unexpected_close(self) -> None:
+        registry = _registry()
+        if registry.get(self.name) is self:
+            del registry[self.name]
+        if self.on_unexpected_close is not None:
+            self.on_unexpected_close()
+
+
+def acquire_session(name: str, kind: str, factory: Callable, filter) -> Tuple[DeviceSession, bool]:
+    """ Resume the session of the named device, or open a new one.
+
+        Args:
+            name (str): device name, the registry key. There is at most one session per device.
+            kind (str): how the device is opened (e.g. "hid", "isolated", "synthetic"). A session of another kind
+                is closed and replaced.
+            factory (Callable): returns a new, not yet running device
+            filter: filter for a new session, whose callbacks the caller sets
+
+        Returns:
+            (session, whether it was resumed rather than opened). Raises RuntimeError if the device can't be opened.
+    """
+    registry = _registry()
+    session = registry.get(name)
+    if session is not None:
+        if session.kind == kind and session.is_reusable:
+            session.resume()
+            log_info(f"Resumed {name} session")
+            return session, True
+        log_warn(f"Reopening {name}: its session can't be reused")
+        close_session(name)
+    device = factory()
+    device.run()
+    session = DeviceSession(name, kind, device, filter)
+    registry[name] = session
+    return session, False
+
+
+def get_session(name: str) -> Optional[DeviceSession]:
+    return _registry().get(name)
+
+
+def close_session(name: str) -> None:
+    """ Close the named device for real and forget its session """
+    session = _registry().pop(name, None)
+    if session is not None:
+        session.close()
+
+
+def close_sessions_except(name: str, kind: str, device=None) -> None:
+    """ Close every session but the named device's opened as kind, and the one of device if given, e.g. the
+        paused sessions of devices the user switched away from
+    """
+    for other, session in list(_registry().items()):
+        if (other != name or session.kind != kind) and session.device is not device:
+            close_session(other)
+
+
+def close_all_sessions() -> None:
+    for name in list(_registry()):
+        close_session(name)
@@ -0,0 +1,225 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+""" Publish SpaceMouse samples into a `multiprocessing.shared_memory` block for consumers in other processes.
+
+    In the device process:
+
+        publisher = SharedMemoryPublisher("spacemouse")
+        device.add_sample_listener(publisher.on_sample)
+
+    or, to publish the output of the device's position/rotation callbacks rather than the raw samples:
+
+        publisher = SharedMemoryPublisher("spacemouse", device=device, filtered=True)
+
+    In any other process (no numpy, Kit or hid needed):
+
+        reader = SharedMemoryReader("spacemouse")
+        sample = reader.read_latest()
+
+    Layout (little endian): a header of (magic, version, ring size, flags, write count) followed by a ring of slots.
+    Each slot is (seqlock, monotonic t, x, y, z, roll, pitch, yaw, buttons). The writer makes a slot's seqlock
+    odd while it writes and sets it to twice the sample number when done, so a reader that sees the same even
+    value before and after copying a slot knows the copy isn't torn. A reader gives up on a slot that stays odd
+    for SHM_READ_TIMEOUT, i.e. whose writer died in the middle of writing it.
+"""
+
+import struct
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+from typing import List, Optional
+
+SHM_MAGIC = b"SPMS"
+SHM_VERSION = 1
+SHM_RING_SIZE = 64
+# Longest a reader waits for a slot that is being written
+SHM_READ_TIMEOUT = 0.05
+
+# Set in the header flags when the published axes have been through the device's position/rotation callbacks
+SHM_FLAG_FILTERED = 1
+
+_HEADER = struct.Struct("<4sIIIQ")
+_SLOT = struct.Struct("<Qd6dQ")
+_COUNT = struct.Struct("<Q")
+_FLAGS = struct.Struct("<I")
+_FLAGS_OFFSET = 12
+_COUNT_OFFSET = 16
+
+# A sample as read from shared memory. `values` holds (x, y, z, roll, pitch, yaw).
+SharedSample = namedtuple("SharedSample", ["sequence", "t", "values", "buttons"])
+
+
+def _slot_offset(index: int) -> int:
+    return _HEADER.size + index * _SLOT.size
+
+
+# Blocks created by publishers in this process
+_published_names = set()
+
+
+def _attach(name: str, untrack: bool) -> shared_memory.SharedMemory:
+    # Readers must not unlink the block when they exit, which the resource tracker would otherwise do
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if untrack and shm.name not in _published_names:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class SharedMemoryPublisher:
+    def __init__(self, name: Optional[str] = None, ring_size: int = SHM_RING_SIZE, device=None,
+                 filtered: bool = False) -> None:
+        """
+        Args:
+            name (str, optional): name of the shared memory block. A random name is used if not given.
+            ring_size (int): number of recent samples kept available to readers
+            device (SpaceMouse, optional): device to publish the samples of. Otherwise add `on_sample` as a
+                sample listener yourself.
+            filtered (bool): publish the output of the device's position/rotation callbacks instead of the raw
+                sample. Needs device.
+        """
+        if ring_size < 1:
+            raise ValueError("ring_size must be at least 1")
+        if filtered and device is None:
+            raise ValueError("filtered needs the device")
+        self.ring_size = ring_size
+        self.filtered = filtered
+        self._device = device
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=_slot_offset(ring_size))
+        self._buf = self._shm.buf
+        _published_names.add(self._shm.name)
+        _HEADER.pack_into(self._buf, 0, SHM_MAGIC, SHM_VERSION, ring_size, SHM_FLAG_FILTERED if filtered else 0, 0)
+        self._count = 0
+        if device is not None:
+            device.add_sample_listener(self.on_sample)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def publish(self, t: float, values, buttons: int) -> None:
+        """
+        Args:
+            t (float): monotonic timestamp of the sample (`time.monotonic()` clock)
+            values: the 6 axis values (x, y, z, roll, pitch, yaw)
+            buttons (int): button bitfield
+        """
+        count = self._count + 1
+        offset = _slot_offset((count - 1) % self.ring_size)
+        _COUNT.pack_into(self._buf, offset, 2 * count - 1)
+        _SLOT.pack_into(self._buf, offset, 2 * count - 1, t, *values, buttons)
+        _COUNT.pack_into(self._buf, offset, 2 * count)
+        _COUNT.pack_into(self._buf, _COUNT_OFFSET, count)
+        self._count = count
+
+    def on_sample(self, sample, sequence: int) -> None:
+        """ Sample listener for `SpaceMouse.add_sample_listener` """
+        if self.filtered:
+            state = self._device._filtered_state()
+            if state is not None:
+                sample = state
+        x, y, z = sample.xyz
+        r, p, ya = sample.rpy
+        self.publish(time.monotonic(), (x, y, z, r, p, ya), int(sample.buttons))
+
+    def close(self, unlink: bool = True) -> None:
+        if self._shm is None:
+            return
+        if self._device is not None:
+            self._device.remove_sample_listener(self.on_sample)
+        self._buf = None
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+        _published_names.discard(self._shm.name)
+        self._shm = None
+
+
+class SharedMemoryReader:
+    def __init__(self, name: str, untrack: bool = True) -> None:
+        """
+        Args:
+            name (str): name of the publisher's shared memory block
+            untrack (bool): keep the resource tracker from unlinking the block when this process exits. Pass False
+                if the publisher runs in a multiprocessing child of this process, which shares the tracker.
+        """
+        self._shm = _attach(name, untrack)
+        self._buf = self._shm.buf
+        magic, version, ring_size, _, _ = _HEADER.unpack_from(self._buf, 0)
+        if magic != SHM_MAGIC or version != SHM_VERSION:
+            self.close()
+            raise ValueError(f"{name} is not a SpaceMouse shared memory block")
+        self.ring_size = ring_size
+
+    @property
+    def filtered(self) -> bool:
+        """ Whether the publisher sends the output of the device's position/rotation callbacks """
+        return bool(_FLAGS.unpack_from(self._buf, _FLAGS_OFFSET)[0] & SHM_FLAG_FILTERED)
+
+    @property
+    def write_count(self) -> int:
+        """ Number of samples the publisher has written so far """
+        return _COUNT.unpack_from(self._buf, _COUNT_OFFSET)[0]
+
+    def _read_slot(self, sequence: int) -> Optional[SharedSample]:
+        offset = _slot_offset((sequence - 1) % self.ring_size)
+        deadline = None
+        while True:
+            before = _COUNT.unpack_from(self._buf, offset)[0]
+            if not before & 1:
+                lock, t, x, y, z, r, p, ya, buttons = _SLOT.unpack_from(self._buf, offset)
+                if lock == before and _COUNT.unpack_from(self._buf, offset)[0] == before:
+                    break
+            # Writer is in the middle of this slot, unless it died there
+            if deadline is None:
+                deadline = time.monotonic() + SHM_READ_TIMEOUT
+            elif time.monotonic() > deadline:
+                return None
+        if before != 2 * sequence:
+            # Overwritten by a newer sample since we looked it up
+            return None
+        return SharedSample(sequence, t, (x, y, z, r, p, ya), buttons)
+
+    def read_latest(self) -> Optional[SharedSample]:
+        """ Returns the newest sample, or None if nothing has been published yet """
+        while True:
+            count = self.write_count
+            if count == 0:
+                return None
+            sample = self._read_slot(count)
+            if sample is not None or self.write_count == count:
+                # Read, or the slot stayed unreadable without a newer sample coming along
+                return sample
+
+    def read_recent(self, n: int) -> List[SharedSample]:
+        """ Returns up to `n` of the newest samples, oldest first """
+        count = self.write_count
+        n = min(n, count, self.ring_size)
+        samples = []
+        for sequence in range(count - n + 1, count + 1):
+            sample = self._read_slot(sequence)
+            # Samples that were overwritten while we read are skipped
+            if sample is not None:
+                samples.append(sample)
+        return samples
+
+    def wait_for_next(self, after: int, timeout: Optional[float] = None, poll_interval: float = 0.0002) -> Optional[SharedSample]:
+        """ Block until a sample newer than sequence `after` is published, or the timeout expires """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.write_count <= after:
+            if deadline is not None and time.monotonic() > deadline:
+                return None
+            time.sleep(poll_interval)
+        return self.read_latest()
+
+    def close(self) -> None:
+        if self._shm is None:
+            return
+        self._buf = None
+        self._shm.close()
+        self._shm = None
@@ -5,13 +5,21 @@
 
 import time
 import threading
-from typing import Optional
+import asyncio
+from typing import AsyncIterator, Optional
 
 from srl.spacemouse.device import DeviceSpec, SpaceMouseData
 from srl.spacemouse.buttons import ButtonState, ButtonStateStruct, DEVICE_BUTTON_STRUCT_INDICES
+from srl.spacemouse.async_stream import SampleChannel
+from srl.spacemouse.recorder import EpisodeRecorder
+from srl.spacemouse.counters import PerfCounters
+from srl.spacemouse.hotplug import HotplugWatcher
+from srl.spacemouse.integrator import PoseIntegrator
+from srl.spacemouse.calibration import NoiseEstimate, NoiseEstimator
+from srl.spacemouse.trace import TRACE_CAPACITY, Tracer
+from srl.spacemouse.log import log_info, log_warn, log_error
 
 import numpy as np
-import carb
 
 # control rate (in hz) - try to enforce this rate of control for reading from the device and sending commands
 TELEOP_CONTROL_RATE = 20
@@ -28,8 +36,24 @@ def convert(b1, b2, axis_scale: float):
     return scale_to_control(as_int16, axis_scale)
 
 
+def has_motion(sample: SpaceMouseData) -> bool:
+    # Checked on every publish; going through lists is several times faster than ndarray.any() on 3 values
+    return any(sample.xyz.tolist()) or any(sample.rpy.tolist())
+
+
+def _output_array(buffer, name: str) -> np.ndarray:
+    # A writable view of buffer. np.asarray copies a list or tuple (and anything else it can't view), and
+    # writing into that copy would silently leave buffer unchanged.
+    if isinstance(buffer, np.ndarray):
+        return buffer
+    array = np.asarray(buffer)
+    if not array.flags.writeable or not np.may_share_memory(array, buffer):
+        raise TypeError(f"{name} must be a numpy array or a writable buffer, not {type(buffer).__name__}")
+    return array
+
+
 class SpaceMouse:
-    def __init__(self, spec: DeviceSpec, control_rate=TELEOP_CONTROL_RATE):
+    def __init__(self, spec: DeviceSpec, control_rate=TELEOP_CONTROL_RATE, auto_reconnect=False):
 
         # Note: these can be found using `hid.enumerate()`
         self.hid_ids = spec.hid_ids
@@ -37,14 +61,55 @@ class SpaceMouse:
         self.button_mapping = spec.button_mapping
         self.axis_scale = spec.axis_scale
         self.name = spec.name
+        self.device = None
         self._control = None
 
         # Optional delegate functions that will be called to process/transform position and rotation
         # signal before it is passed out to consumers.
         self._position_callback = None
         self._rotation_callback = None
+        # Optional filter of whole samples (see set_filter), used instead of the two callbacks
+        self._filter = None
+        # Callback output for the latest sample, computed as it's published, so the callbacks run exactly once
+        # per sample no matter how many consumers poll
+        self._filtered = None
+        # (filtered sample, the same as one 6-vector) for get_controller_state_into
+        self._command_cache = None
+        # Reentrant, so the watchdog can check and publish atomically
+        self._publish_lock = threading.RLock()
+        # Monotonic time the latest sample was published, for staleness checks
+        self._published_at = time.monotonic()
+        # Optional watchdog that zeroes motion older than _watchdog_max_age
+        self._watchdog_max_age = None
+        self._watchdog_thread = None
+        self._watchdog_stop = threading.Event()
+        self.watchdog_trips = 0
+        # Whether the latest sample is at rest and the callbacks' output has settled at zero
+        self._resting = False
+        # Optional 6x6 matrix applied to (x, y, z, roll, pitch, yaw) of every sample as it's published
+        self._remap = None
+        # Optional per-axis zero offset subtracted before the remap, and the estimator that can supply it
+        self._zero_offset = None
+        self._noise_estimator = None
         self._unexpected_close_callback = None
         self._control_rate = control_rate
+        # Whether to wait for the device to come back when it drops, instead of stopping
+        self.auto_reconnect = auto_reconnect
+        self._reconnecting = False
+        # Functions called from the reader thread with every published sample
+        self._sample_listeners = []
+        self._sequence = 0
+        self._recorder = None
+        # Optional runtime counters, None unless enabled
+        self._counters = None
+        # Optional timeline of reads, decoding, publishing and filtering, None unless enabled
+        self._tracer = None
+        # Optional target pose integrated from every sample, None unless enabled
+        self._integrator = None
+        self._integrate_filtered = True
+        # While paused the reader keeps the device open and reading, but holds back the latest sample
+        self._paused = False
+        self._held_sample = None
 
         self.thread = None
         self._stop_event = threading.Event()
@@ -61,42 +126,494 @@ class SpaceMouse:
         readings from the spacemouse. This is useful to remap which direction
         moves which axis (e.g. pushing right moves +y instead of + x). Callback
         should take a single argument (3-dim numpy array for translation) and
-        return a 3-dim array as well
+        return a 3-dim array as well. It runs on the reader thread, once per
+        published sample.
         """
         self._position_callback = callback
+        self._filter = None
+        self._resting = False
 
     def set_rotation_callback(self, callback):
         """
         Set a function that will get called to process the raw RPY readings from the
-        spacemouse, before forming an absolute rotation. Callback should take
-        3 arguments - roll, pitch, yaw, and return roll, pitch, yaw. This is useful
-        for re-mapping the device knob twists to different RPY settings.
+        spacemouse, before forming an absolute rotation (see enable_pose_integration).
+        Callback should take 3 arguments - roll, pitch, yaw, and return roll, pitch, yaw.
+        This is useful for re-mapping the device knob twists to different RPY settings.
         """
         self._rotation_callback = callback
+        self._filter = None
+        self._resting = False
+
+    def set_filter(self, filter):
+        """
+        Filter the translation and rotation of every sample together with
+        filter.modify(xyz, rpy) (e.g. a SpaceMouseFilter), instead of the
+        position/rotation callbacks, which this clears. Unlike two separate
+        callbacks, the filter reads its parameters once per sample. If the
+        filter has in_deadband(xyz, rpy), samples inside its deadband count as
+        rest once the output is zero, so sensor jitter doesn't keep the filter
+        running. Pass None to stop filtering.
+        """
+        self._position_callback = None
+        self._rotation_callback = None
+        self._filter = filter
+        self._resting = False
+
+    def get_filter(self):
+        return self._filter
+
+    def set_axis_remap(self, remap: Optional[np.ndarray]):
+        """
+        Set a 6x6 matrix that transforms (x, y, z, roll, pitch, yaw) of every sample
+        as it comes off the device, before the position/rotation callbacks, listeners
+        and recordings see it. See srl.spacemouse.remap for common conventions.
+        Can be changed at any time; each sample uses either the old or the new matrix.
+        Pass None to go back to the device's own axes.
+        """
+        if remap is not None:
+            remap = np.array(remap, dtype=float)
+            if remap.shape != (6, 6):
+                raise ValueError(f"Axis remap must be a 6x6 matrix, got shape {remap.shape}")
+            # The reader thread keeps using whatever matrix it picked up, so it must never change under it
+            remap.setflags(write=False)
+        self._remap = remap
+
+    def get_axis_remap(self) -> Optional[np.ndarray]:
+        return self._remap
+
+    def set_zero_offset(self, offset: Optional[np.ndarray]):
+        """
+        Set the per-axis reading (x, y, z, roll, pitch, yaw, in device axes) of the
+        untouched puck, to be subtracted from every sample before the remap. Axes that
+        read exactly zero are left alone, as that's what a released puck reports.
+        Pass None to stop subtracting.
+        """
+        if offset is not None:
+            offset = np.array(offset, dtype=float)
+            if offset.shape != (6,):
+                raise ValueError(f"Zero offset must have 6 values, got shape {offset.shape}")
+            offset.setflags(write=False)
+        self._zero_offset = offset
+
+    def get_zero_offset(self) -> Optional[np.ndarray]:
+        return self._zero_offset
+
+    def enable_noise_estimation(self, enabled: bool = True, **kwargs) -> Optional[NoiseEstimator]:
+        """
+        Accumulate per-axis statistics of the raw samples while the puck is at rest,
+        on the reader thread. Keyword arguments are passed to NoiseEstimator, e.g.
+        spectral=True to also keep samples for a noise spectrum.
+        """
+        if not enabled:
+            self._noise_estimator = None
+            return None
+        kwargs.setdefault("resolution", 1.0 / self.axis_scale)
+        self._noise_estimator = NoiseEstimator(**kwargs)
+        return self._noise_estimator
+
+    @property
+    def noise_estimator(self) -> Optional[NoiseEstimator]:
+        return self._noise_estimator
+
+    def get_noise_estimate(self) -> Optional[NoiseEstimate]:
+        """
+        Returns the zero offset (device axes) and noise level and suggested minimal
+        deadbands (published axes, i.e. after the remap), or None if noise estimation
+        isn't enabled or hasn't seen enough resting samples yet.
+        """
+        estimator = self._noise_estimator
+        if estimator is None:
+            return None
+        return estimator.estimate(self._remap)
+
+    def apply_zero_offset(self) -> Optional[NoiseEstimate]:
+        """
+        Subtract the estimated zero offset from now on. Returns the estimate used, or
+        None (changing nothing) if there isn't one yet.
+        """
+        estimate = self.get_noise_estimate()
+        if estimate is not None:
+            self.set_zero_offset(estimate.offset)
+        return estimate
 
     def set_unexpected_close_callback(self, callback):
         self._unexpected_close_callback = callback
 
-    def get_controller_state(self) -> Optional[SpaceMouseData]:
+    def add_sample_listener(self, listener):
+        """
+        Register a function that will get called from the reader thread with every
+        sample the device publishes. Listener should take two arguments - the
+        unfiltered (but remapped, see set_axis_remap) SpaceMouseData and its sequence
+        number. Listeners run on the input path, so they must return quickly.
+        """
+        # Copy on write, so the reader thread can iterate without holding a lock
+        self._sample_listeners = self._sample_listeners + [listener]
+
+    def remove_sample_listener(self, listener):
+        self._sample_listeners = [l for l in self._sample_listeners if l != listener]
+
+    def start_recording(self, directory: str, **kwargs) -> EpisodeRecorder:
+        """
+        Record every published sample (raw and filtered, with buttons and timestamps)
+        into episodes under directory. Keyword arguments are passed to EpisodeRecorder,
+        e.g. start_buttons={"LEFT"} to begin a new episode on every press of LEFT.
+        """
+        self.stop_recording()
+        self._recorder = EpisodeRecorder(self, directory, **kwargs)
+        return self._recorder
+
+    def stop_recording(self):
+        """
+        Finish the current episode and wait for it to be written to disk
+        """
+        if self._recorder is None:
+            return
+        self._recorder.close()
+        self._recorder = None
+
+    def enable_perf_counters(self, enabled: bool = True):
+        """
+        Turn on runtime counters (reports per channel, read timeouts, published and
+        overwritten samples, poll rate, filter time, reader thread scheduling delay).
+        Disabled counters cost a single attribute check on the input path.
+        """
+        if enabled and self._counters is None:
+            self._counters = PerfCounters()
+        elif not enabled:
+            self._counters = None
+
+    def reset_perf_counters(self):
+        if self._counters is not None:
+            self._counters.reset()
+
+    def enable_pose_integration(self, enabled: bool = True, filtered: bool = True, **kwargs) -> Optional[PoseIntegrator]:
+        """
+        Integrate every published sample into a target pose on the reader thread, so the
+        pose doesn't depend on how often it is polled. With filtered=True the samples go
+        through the position/rotation callbacks first. Keyword arguments are passed to
+        PoseIntegrator, e.g. frame="tool" or position_bounds=((-1, -1, 0), (1, 1, 1)).
+        """
+        if self._integrator is not None:
+            self.remove_sample_listener(self._integrate_sample)
+            self._integrator = None
+        if not enabled:
+            return None
+        self._integrate_filtered = filtered
+        self._integrator = PoseIntegrator(**kwargs)
+        self.add_sample_listener(self._integrate_sample)
+        return self._integrator
+
+    def get_target_pose(self, now: Optional[float] = None):
+        """
+        Returns the integrated (position, orientation quaternion (w, x, y, z)), or None
+        if pose integration isn't enabled. The command currently held is applied up to
+        now (defaults to the current time).
+        """
+        integrator = self._integrator
+        if integrator is None:
+            return None
+        return integrator.get_pose(now)
+
+    def reset_target_pose(self, position=None, orientation=None):
+        """
+        Re-anchor the integrated pose, e.g. to where the robot actually is. Defaults to
+        the origin and identity orientation.
+        """
+        if self._integrator is not None:
+            self._integrator.reset(position, orientation)
+
+    def pause(self):
+        """
+        Stop publishing samples without closing the device. The reader thread keeps
+        draining reports and the callbacks keep their parameters, so resume() is instant.
+        Motion is zeroed first, filtered output included, so nothing keeps moving on the
+        last sample.
+        """
+        with self._publish_lock:
+            if self._paused:
+                return
+            control = self._control
+            if control is not None and not self._resting:
+                self._publish(SpaceMouseData(time.time(), np.zeros(3), np.zeros(3), control.buttons), settled=True)
+            self._held_sample = None
+            self._paused = True
+
+    def resume(self):
+        """
+        Publish again, starting with the latest sample that came in while paused
+        """
+        with self._publish_lock:
+            if not self._paused:
+                return
+            self._paused = False
+            held = self._held_sample
+            self._held_sample = None
+            if held is not None:
+                self._publish(held)
+
+    @property
+    def is_paused(self) -> bool:
+        return self._paused
+
+    def _integrate_sample(self, sample: SpaceMouseData, sequence: int):
+        integrator = self._integrator
+        if integrator is None:
+            return
+        if self._integrate_filtered:
+            sample = self._filtered_state()
+        integrator.update(sample.t, sample.xyz, sample.rpy)
+
+    def enable_tracing(self, enabled: bool = True, capacity: int = TRACE_CAPACITY) -> Optional[Tracer]:
+        """
+        Record a span for every HID read, report decode, publish and filter run, tagged
+        with its thread, keeping the latest `capacity`. Dump them with
+        `tracer.dump(path)` and open the file in ui.perfetto.dev or chrome://tracing.
+        Disabled tracing costs a single attribute check at each of those points.
+        """
+        if not enabled:
+            self._tracer = None
+        elif self._tracer is None or self._tracer.capacity != capacity:
+            self._tracer = Tracer(capacity)
+        return self._tracer
+
+    @property
+    def tracer(self) -> Optional[Tracer]:
+        return self._tracer
+
+    def get_perf_counters(self) -> Optional[dict]:
+        """
+        Returns a snapshot of the runtime counters, or None if they aren't enabled
+        """
+        counters = self._counters
+        if counters is None:
+            return None
+        return counters.snapshot()
+
+    @property
+    def is_resting(self) -> bool:
+        """
+        True while the puck is untouched (no input beyond the filter's deadband) and the
+        output of the filter or position/rotation callbacks has settled at zero. get_controller_state() then returns zeros
+        without running the callbacks, and consumers can skip work of their own.
+        """
+        return self._resting
+
+    @property
+    def sequence(self) -> int:
+        """
+        Number of samples published since the device was created
+        """
+        return self._sequence
+
+    def get_controller_state(self, max_age: Optional[float] = None) -> Optional[SpaceMouseData]:
         """
         Returns the current state of the 3d mouse, a dictionary of pos, orn, and button on/off.
+        The position/rotation callbacks run once per published sample, however many
+        consumers poll, and every caller gets its own copy of the result.
+        With max_age (seconds), motion from a sample published longer ago than that
+        comes back as zero, e.g. when the reader stalled or the wireless link dropped.
         """
-        # Get a copy of the latest data
-        control = self._control
-        if control is None:
+        counters = self._counters
+        if counters is not None:
+            counters.on_poll(self._sequence)
+        state = self._filtered_state()
+        if state is None:
             # The caller must've beaten the actual device thread. No state to give them yet.
             return None
-        dpos = np.array(control.xyz)
-        rot = np.array(control.rpy)
+        if max_age is not None and self._is_stale(state, max_age):
+            return SpaceMouseData(state.t, np.zeros(3), np.zeros(3), state.buttons)
+        return SpaceMouseData(state.t, state.xyz.copy(), state.rpy.copy(), state.buttons)
+
+    def get_sample_age(self) -> float:
+        """
+        Seconds since the latest sample was published (monotonic clock)
+        """
+        return time.monotonic() - self._published_at
+
+    def _is_stale(self, state: SpaceMouseData, max_age: float) -> bool:
+        if not has_motion(state):
+            # Zero motion is safe no matter how old
+            return False
+        age = time.monotonic() - self._published_at
+        if age <= max_age:
+            return False
+        counters = self._counters
+        if counters is not None:
+            counters.on_stale_read(age)
+        return True
+
+    def set_watchdog(self, max_age: Optional[float]):
+        """
+        Publish a zero-motion sample whenever the latest sample with motion is older
+        than max_age seconds, so every consumer (listeners, recordings, pose
+        integration, polling) stops moving on stale input. Runs on its own thread
+        with a monotonic timer, so it works even if the reader thread is stuck.
+        Pass None to turn it off.
+        """
+        self._watchdog_max_age = max_age
+        if max_age is None:
+            self._stop_watchdog()
+        elif self._watchdog_thread is None:
+            self._watchdog_stop.clear()
+            self._watchdog_thread = threading.Thread(target=self._watchdog_loop, name="spacemouse-watchdog")
+            self._watchdog_thread.daemon = True
+            self._watchdog_thread.start()
+
+    def _stop_watchdog(self):
+        if self._watchdog_thread is None:
+            return
+        self._watchdog_stop.set()
+        if self._watchdog_thread is not threading.current_thread():
+            self._watchdog_thread.join()
+        self._watchdog_thread = None
+
+    def _watchdog_loop(self):
+        while True:
+            max_age = self._watchdog_max_age
+            if max_age is None or self._watchdog_stop.wait(max_age / 4):
+                return
+            control = self._control
+            if control is None or not self._output_moving(control):
+                continue
+            age = time.monotonic() - self._published_at
+            if age > max_age:
+                log_warn(f"No input from {self.name} for {age:.2f} s. Zeroing motion.")
+                self.watchdog_trips += 1
+                counters = self._counters
+                if counters is not None:
+                    counters.on_watchdog(age)
+                with self._publish_lock:
+                    # The reader may have published while we were deciding
+                    if self._control is control:
+                        # Settled: the heartbeat that would decay the callbacks' output runs on the stalled reader
+                        self._publish(SpaceMouseData(time.time(), np.zeros(3), np.zeros(3), control.buttons), settled=True)
+
+    def _output_moving(self, control: SpaceMouseData) -> bool:
+        """
+        Whether consumers would see motion for this sample, after the callbacks
+        """
+        if self._resting:
+            return False
+        if not self._is_idle(control):
+            return True
+        return has_motion(self._filtered_state())
+
+    def get_controller_state_into(self, out, env_ids=None, buttons_out=None, max_age: Optional[float] = None) -> bool:
+        """
+        Write the filtered (x, y, z, roll, pitch, yaw) command into a caller-owned
+        buffer instead of allocating new arrays. out is a numpy array or a writable
+        object exposing the buffer protocol, shaped (6,) or (num_envs, 6); the command
+        is broadcast to every row, or only to the rows selected by env_ids (an index
+        array, list or slice). buttons_out, shaped () or (num_envs,), receives the
+        button bitfield the same way. max_age works as for get_controller_state.
+        Returns False, writing nothing, if there's no state yet. Raises TypeError for
+        outputs that can't be written in place, such as lists.
+        """
+        # Checked before anything is written, so a bad buttons_out doesn't leave out half updated
+        target = _output_array(out, "out")
+        buttons = _output_array(buttons_out, "buttons_out") if buttons_out is not None else None
+        counters = self._counters
+        if counters is not None:
+            counters.on_poll(self._sequence)
+        state = self._filtered_state()
+        if state is None:
+            return False
+        if max_age is not None and self._is_stale(state, max_age):
+            state = SpaceMouseData(state.t, np.zeros(3), np.zeros(3), state.buttons)
+        command = self._command_cache
+        if command is None or command[0] is not state:
+            # Flattened once per sample, then broadcast into as many buffers as ask for it
+            command = (state, np.concatenate((state.xyz, state.rpy)))
+            self._command_cache = command
+        if env_ids is None:
+            target[...] = command[1]
+        else:
+            target[env_ids] = command[1]
+        if buttons is not None:
+            if env_ids is None:
+                buttons[...] = state.buttons
+            else:
+                buttons[env_ids] = state.buttons
+        return True
+
+    def _filtered_state(self) -> Optional[SpaceMouseData]:
+        """
+        The latest sample after the position/rotation callbacks. Shared, so don't modify it.
+        """
+        return self._filtered
+
+    def _is_filtered(self) -> bool:
+        return self._filter is not None or self._position_callback is not None or self._rotation_callback is not None
+
+    def _is_idle(self, sample: SpaceMouseData) -> bool:
+        """
+        Whether sample is no input: inside the filter's deadband, or exactly zero
+        """
+        if not has_motion(sample):
+            return True
+        in_deadband = getattr(self._filter, "in_deadband", None)
+        return in_deadband is not None and in_deadband(sample.xyz, sample.rpy)
+
+    def _run_callbacks(self, sample: SpaceMouseData) -> SpaceMouseData:
+        """
+        Run the position/rotation callbacks on a copy of sample. Only called by _publish, so the callbacks'
+        state (e.g. smoothing) advances once per published sample.
+        """
+        filter = self._filter
+        position_callback = self._position_callback
+        rotation_callback = self._rotation_callback
+        if filter is None and position_callback is None and rotation_callback is None:
+            return sample
+        counters = self._counters
+        if counters is not None:
+            filter_start = time.perf_counter()
+        tracer = self._tracer
+        if tracer is not None:
+            trace_start = time.perf_counter_ns()
+        dpos = np.array(sample.xyz)
+        rot = np.array(sample.rpy)
 
         # handle callbacks
-        if self._position_callback is not None:
-            self._position_callback(dpos)
+        if filter is not None:
+            filter.modify(dpos, rot)
+
+        if position_callback is not None:
+            position_callback(dpos)
+
+        if rotation_callback is not None:
+            rotation_callback(rot)
 
-        if self._rotation_callback is not None:
-            self._rotation_callback(rot)
+        if counters is not None:
+            counters.on_filter(time.perf_counter() - filter_start)
+        if tracer is not None:
+            tracer.add("filter", trace_start)
+        return SpaceMouseData(sample.t, dpos, rot, sample.buttons)
 
-        return SpaceMouseData(control.t, dpos, rot, control.buttons)
+    async def next_sample(self, filtered: bool = True, timeout: Optional[float] = None) -> SpaceMouseData:
+        """
+        Wait for the device to publish a new sample. With filtered=True the result is
+        the same as get_controller_state(), otherwise it's the raw sample.
+        Raises asyncio.TimeoutError if no sample arrives within timeout seconds.
+        """
+        channel = SampleChannel(self, filtered)
+        try:
+            return await asyncio.wait_for(channel.next(), timeout)
+        finally:
+            channel.close()
+
+    async def stream(self, filtered: bool = True) -> AsyncIterator[SpaceMouseData]:
+        """
+        Iterate over samples as the device publishes them, e.g. `async for sample in device.stream()`.
+        A consumer that falls behind skips straight to the newest sample. The generator
+        stops listening to the device when it's closed, so wrap it in
+        contextlib.aclosing() if you break out of the loop early.
+        """
+        channel = SampleChannel(self, filtered)
+        try:
+            while True:
+                yield await channel.next()
+        finally:
+            channel.close()
 
     def get_button_state(self) -> Optional[ButtonStateStruct]:
         control = self._control
@@ -108,12 +625,15 @@ class SpaceMouse:
     def is_running(self) -> bool:
         return self.thread is not None
 
-    def run(self):
-        import hid
-        if self.thread:
-            return
+    @property
+    def is_connected(self) -> bool:
+        """
+        False while the reader is waiting for a dropped device to come back
+        """
+        return self.is_running and not self._reconnecting
 
-        opened = False
+    def _open_device(self) -> bool:
+        import hid
         for vendor_id, product_id in self.hid_ids:
             # Some devices have alternate identifiers. Loop through trying all of them
             try:
@@ -122,22 +642,26 @@ class SpaceMouse:
                 self.device = hid.device()
                 # self.device.open_path(bytes("/dev/spacemouse", "UTF-8"))
                 self.device.open(vendor_id, product_id)
-                opened = True
-                carb.log_info(f"Successfully connected to: {self.name}, vendor id: { vendor_id }, product id: {product_id}")
-                break
+                log_info(f"Successfully connected to: {self.name}, vendor id: { vendor_id }, product id: {product_id}")
+                return True
             except OSError as e:
                 self.device.close()
                 self.device = None
                 continue
+        return False
 
-        if not opened:
-            carb.log_error("Unable to open specified spacemouse device. Ensure you have installed spacenavd, obtained the correct vendor_id and product_id, as well as setting up the correct udev rule and the device is plugged in. ")
+    def run(self):
+        if self.thread:
+            return
+
+        if not self._open_device():
+            log_error("Unable to open specified spacemouse device. Ensure you have installed spacenavd, obtained the correct vendor_id and product_id, as well as setting up the correct udev rule and the device is plugged in. ")
             raise RuntimeError("Couldn't open device")
         # We'll use the blocking interface and rely on the timeout feature instead
         # self.device.set_nonblocking(True)
 
         # launch daemon thread to listen to SpaceNav
-        self.thread = threading.Thread(target=self._run_loop)
+        self.thread = threading.Thread(target=self._run_loop, name="spacemouse-reader")
         self.thread.daemon = True
         self.thread.start()
 
@@ -155,7 +679,11 @@ class SpaceMouse:
 
     def close(self):
         self.stop()
-        self.device.close()
+        self.stop_recording()
+        self._stop_watchdog()
+        if self.device:
+            self.device.close()
+            self.device = None
 
     def _run_loop(self):
         def state_to_tuple(state):
@@ -172,24 +700,142 @@ class SpaceMouse:
             "buttons_changed": False,
             "xyz_rpy_change_count": 0,
         }
-        self._control = state_to_tuple(working_state)
+        self._publish(state_to_tuple(working_state))
+        timeout = 1.0 / self._control_rate
         while not self._stop_event.is_set():
+            counters = self._counters
+            if counters is not None:
+                read_start = time.perf_counter()
+            tracer = self._tracer
+            if tracer is not None:
+                trace_start = time.perf_counter_ns()
             try:
                 d = self.device.read(13, timeout_ms=1000 / self._control_rate)
             except OSError as e:
                 # This usually means the device was unplugged
-                carb.log_warn("Lost connection to SpaceMouse. Closing device.")
+                log_warn("Lost connection to SpaceMouse. Closing device.")
                 self.device.close()
+                self.device = None
+
+                if self.auto_reconnect:
+                    # Nothing is coming from the device anymore, so don't leave the last motion applied
+                    for name in self.mappings:
+                        working_state[name] = 0.
+                    working_state["buttons"] = ButtonState([0] * len(self.button_mapping))
+                    working_state["t"] = time.time()
+                    working_state["xyz_rpy_change_count"] = 0
+                    self._publish(state_to_tuple(working_state))
+                    if self._reconnect():
+                        continue
+                    # Asked to stop while waiting
+                    break
 
                 if self._unexpected_close_callback:
                     self._unexpected_close_callback()
                 self.thread = None
                 break
+            if counters is not None:
+                counters.on_read(d, time.perf_counter() - read_start, timeout)
+            if tracer is not None:
+                tracer.add("hid_read", trace_start, {"bytes": len(d) if d else 0})
             if d is not None and len(d) > 0:
+                if tracer is not None:
+                    trace_start = time.perf_counter_ns()
                 self.process(d, working_state)
+                if tracer is not None:
+                    tracer.add("process", trace_start, {"channel": d[0]})
                 if working_state["xyz_rpy_change_count"] == 2 or working_state["buttons_changed"]:
-                    self._control = state_to_tuple(working_state)
+                    self._publish(state_to_tuple(working_state))
                     working_state["xyz_rpy_change_count"] = 0
+            else:
+                self._publish_heartbeat()
+
+    def _reconnect(self) -> bool:
+        """
+        Wait for the device to reappear and reopen it. Returns False if stop() was called first.
+        """
+        self._reconnecting = True
+        watcher = HotplugWatcher(self.hid_ids)
+        log_warn(f"Waiting for {self.name} to reconnect")
+        try:
+            while watcher.wait_for_device(self._stop_event):
+                if self._open_device():
+                    log_warn(f"Reconnected to {self.name}")
+                    return True
+                # Enumerated but not openable yet, e.g. while udev is still applying permissions
+                self._stop_event.wait(watcher.next_delay())
+            return False
+        finally:
+            self._reconnecting = False
+
+    def _publish_heartbeat(self):
+        """
+        The device goes quiet once the puck is at rest, but the callbacks (e.g. smoothing)
+        only advance once per sample. Keep publishing zero samples at the control rate
+        until their output has settled at zero too.
+        """
+        control = self._control
+        if control is None or self._resting or not self._is_filtered():
+            return
+        if not self._is_idle(control):
+            return
+        state = self._filtered_state()
+        if has_motion(state):
+            self._publish(SpaceMouseData(time.time(), np.zeros(3), np.zeros(3), control.buttons))
+
+    def _publish(self, sample: SpaceMouseData, settled: bool = False):
+        # With settled, a zero sample is published with zero filtered output, and the filter's smoothing is zeroed to match.
+        # The watchdog publishes from its own thread; keep sequence numbers and listener calls in order
+        with self._publish_lock:
+            tracer = self._tracer
+            if tracer is not None:
+                trace_start = time.perf_counter_ns()
+            if self._paused:
+                self._held_sample = sample
+                return
+            remap = self._remap
+            offset = self._zero_offset
+            estimator = self._noise_estimator
+            if remap is not None or offset is not None or estimator is not None:
+                values = np.concatenate((sample.xyz, sample.rpy))
+                if estimator is not None:
+                    estimator.update(sample.t, values)
+                if offset is not None:
+                    moved = values != 0
+                    values[moved] -= offset[moved]
+                if remap is not None:
+                    values = remap @ values
+                sample = SpaceMouseData(sample.t, values[:3], values[3:], sample.buttons)
+            # A sample without input (zero, or inside the filter's deadband) after zero output leaves the filter
+            # (deadband, smoothing) at zero, so skip it
+            if settled:
+                resting = True
+                settle = getattr(self._filter, "settle", None)
+                if settle is not None:
+                    settle()
+            else:
+                previous = self._filtered
+                resting = previous is not None and not has_motion(previous) and self._is_idle(sample)
+            if resting:
+                filtered = SpaceMouseData(sample.t, np.zeros(3), np.zeros(3), sample.buttons)
+            else:
+                filtered = self._run_callbacks(sample)
+            # Stored before the sample itself, so a consumer that sees the sample also sees its output
+            self._filtered = filtered
+            self._resting = resting
+            self._sequence += 1
+            self._published_at = time.monotonic()
+            self._control = sample
+            counters = self._counters
+            if counters is not None:
+                counters.on_publish(self._sequence)
+            for listener in self._sample_listeners:
+                try:
+                    listener(sample, self._sequence)
+                except Exception as e:
+                    log_error(f"SpaceMouse sample listener failed: {e}")
+            if tracer is not None:
+                tracer.add("publish", trace_start, {"sequence": self._sequence, "resting": resting})
 
     def process(self, data, state):
         """
@@ -4,11 +4,18 @@
 
 
 import os
+import time
 from typing import Optional
 from srl.spacemouse.spacemouse import SpaceMouse
-from srl.spacemouse.spacemousefilter import SpaceMouseFilter
+from srl.spacemouse.isolated import IsolatedSpaceMouse
+from srl.spacemouse.synthetic import SyntheticSpaceMouse
+from srl.spacemouse.spacemousefilter import FilterParams, SpaceMouseFilter
 from srl.spacemouse.device import DEVICE_NAMES, DEVICE_SPECS
-from omni.isaac.ui.ui_utils import setup_ui_headers, get_style
+from srl.spacemouse.usd_forwarder import SpaceMouseUsdForwarder, UsdAttributeSink
+from srl.spacemouse.counters import format_snapshot
+from srl.spacemouse.calibration import format_estimate
+from srl.spacemouse.session import acquire_session, close_sessions_except, get_session
+from omni.isaac.ui.ui_utils import setup_ui_headers, get_style, btn_builder, cb_builder, str_builder
 import numpy as np
 import carb
 
@@ -17,6 +24,7 @@ from omni.kit.menu.utils import add_menu_items, remove_menu_items, MenuItemDescr
 import weakref
 
 import omni.ext
+import omni.usd
 import asyncio
 from omni.isaac.core import World
 
@@ -26,6 +34,9 @@ from srl.spacemouse.ui_utils import xyz_plot_builder, combo_floatfield_slider_bu
 
 instance = None
 
+# Saved filter presets, {name: {FilterParams field: value}}. Persistent settings are kept across sessions.
+PRESET_SETTINGS_PATH = "/persistent/exts/srl.spacemouse/presets"
+
 
 def get_global_spacemouse() -> Optional[SpaceMouse]:
     return instance._device
@@ -43,6 +54,10 @@ class SpaceMouseExtension(omni.ext.IExt):
         self._menu_items = menu_items
         add_menu_items(self._menu_items, "SRL")
         self._device = None
+        # Bumped by disengage and shutdown, so an engage still opening the device knows it was called off
+        self._engage_generation = 0
+        # One engage opens a device at a time
+        self._engage_lock = asyncio.Lock()
         self._models = dict()
         self._build_ui(
             name="SpaceMouse",
@@ -60,18 +75,14 @@ class SpaceMouseExtension(omni.ext.IExt):
         self.build_control_ui(frame)
         self.build_data_ui(self.get_frame(index=1))
         # Read defaults straight from the models so that we start the state in sync with the UI
-        self.filter = SpaceMouseFilter(
-            self._models["Smoothing Factor"][0].get_value_as_float(),
-            self._models["Softmax Temperature"][0].get_value_as_float(),
-            self._models["Translation Sensitivity"][0].get_value_as_float(),
-            self._models["Rotation Sensitivity"][0].get_value_as_float(),
-            self._models["Translation Deadband"][0].get_value_as_float(),
-            self._models["Rotation Deadband"][0].get_value_as_float(),
-            self._models["Modes"][0].get_value_as_bool(),
-            self._models["Modes"][1].get_value_as_bool()
-        )
+        self.filter = SpaceMouseFilter(*self._ui_filter_params())
         self._plotting_event_subscription = None
+        self._forwarding_event_subscription = None
+        self._forwarder = None
         self._plotting_buffer = np.zeros((360, 6))
+        self._counters_display_time = 0.0
+        self._noise_estimator = None
+        self._calibration_time = 0.0
         self.engage_sub_handle = self._models["Engage"][0].subscribe_value_changed_fn(self._engage_value_changed)
         global instance
         instance = self
@@ -109,11 +120,27 @@ class SpaceMouseExtension(omni.ext.IExt):
                 dict = {
                     "label": "Engage",
                     "tooltip": "Connect and enable the choosen device",
-                    "on_clicked_fn": [self._on_engage_event, lambda x: None, None],
+                    "on_clicked_fn": [self._on_engage_event, self._on_device_selection_event, None],
                     "items": DEVICE_NAMES
                 }
                 self._models["Engage"] = combo_cb_dropdown_builder(**dict)
 
+                dict = {
+                    "label": "Reader Process",
+                    "tooltip": "Read the device in a separate process so input timing doesn't suffer when Kit is busy. Applies on the next engage.",
+                    "default_val": False,
+                    "on_clicked_fn": self._on_device_selection_event,
+                }
+                self._models["Reader Process"] = cb_builder(**dict)
+
+                dict = {
+                    "label": "Synthetic Input",
+                    "tooltip": "Engage a simulated device of the selected type that generates test motion at 1 kHz, for load testing without hardware. Applies on the next engage.",
+                    "default_val": False,
+                    "on_clicked_fn": self._on_device_selection_event,
+                }
+                self._models["Synthetic Input"] = cb_builder(**dict)
+
 
                 dict = {
                     "label": "Modes",
@@ -183,6 +210,72 @@ class SpaceMouseExtension(omni.ext.IExt):
                 self._models["Rotation Deadband"] = combo_floatfield_slider_builder(**dict)
                 self._models["Rotation Deadband"][0].add_value_changed_fn(partial(self._on_deadband_event, "rot"))
 
+                dict = {
+                    "label": "Preset",
+                    "tooltip": "Name to save the filter settings above under, or to load them from",
+                    "default_val": "default",
+                }
+                self._models["Preset"] = str_builder(**dict)
+                dict = {
+                    "label": "Save Preset",
+                    "type": "button",
+                    "text": "Save",
+                    "tooltip": "Save the filter settings under the preset name",
+                    "on_clicked_fn": self._on_save_preset_event,
+                }
+                btn_builder(**dict)
+                dict = {
+                    "label": "Load Preset",
+                    "type": "button",
+                    "text": "Load",
+                    "tooltip": "Apply the filter settings saved under the preset name",
+                    "on_clicked_fn": self._on_load_preset_event,
+                }
+                btn_builder(**dict)
+
+                dict = {
+                    "label": "Max Input Age",
+                    "tooltip": ["Seconds without new input after which motion is zeroed, in case the device or its reader stalls. 0 disables the watchdog.", ""],
+                    "default_val": 0.5,
+                    "min": 0.0,
+                    "max": 2.0
+                }
+                self._models["Max Input Age"] = combo_floatfield_slider_builder(**dict)
+                self._models["Max Input Age"][0].add_value_changed_fn(self._on_max_age_event)
+
+                dict = {
+                    "label": "Noise Estimation",
+                    "tooltip": "Measure each axis' zero offset and noise while the puck is untouched, and suggest the smallest safe deadbands",
+                    "default_val": False,
+                    "on_clicked_fn": self._on_noise_estimation_event,
+                }
+                self._models["Noise Estimation"] = cb_builder(**dict)
+
+                dict = {
+                    "label": "Auto Calibrate",
+                    "tooltip": "Subtract the estimated zero offset and use the suggested per-axis deadbands instead of the sliders",
+                    "default_val": False,
+                    "on_clicked_fn": self._on_auto_calibrate_event,
+                }
+                self._models["Auto Calibrate"] = cb_builder(**dict)
+                self._models["Calibration"] = ui.Label("", word_wrap=True, height=0)
+
+                dict = {
+                    "label": "USD Prim",
+                    "tooltip": "Prim that receives the forwarded device state as spacemouse:* attributes",
+                    "default_val": "/SpaceMouse",
+                }
+                self._models["USD Prim"] = str_builder(**dict)
+                self._models["USD Prim"].add_value_changed_fn(self._on_forwarding_prim_event)
+
+                dict = {
+                    "label": "Forward to USD",
+                    "tooltip": "Write filtered device state onto the USD prim while engaged",
+                    "default_val": False,
+                    "on_clicked_fn": self._on_forwarding_event,
+                }
+                self._models["Forward to USD"] = cb_builder(**dict)
+
         return
 
     def build_data_ui(self, frame):
@@ -210,6 +303,37 @@ class SpaceMouseExtension(omni.ext.IExt):
                     "rpy_vals"
                 ] = xyz_plot_builder(**kwargs)
 
+                dict = {
+                    "label": "Perf Counters",
+                    "tooltip": "Collect and show runtime counters for the reader thread and consumers",
+                    "default_val": False,
+                    "on_clicked_fn": self._on_counters_event,
+                }
+                self._models["Perf Counters"] = cb_builder(**dict)
+                self._models["Counters"] = ui.Label("", word_wrap=True, height=0)
+
+                dict = {
+                    "label": "Trace",
+                    "tooltip": "Record a timeline of device reads, decoding, publishing, filtering and plotting, for lining up input hitches with frame timings",
+                    "default_val": False,
+                    "on_clicked_fn": self._on_trace_event,
+                }
+                self._models["Trace"] = cb_builder(**dict)
+                dict = {
+                    "label": "Trace File",
+                    "tooltip": "Where Save Trace writes the Chrome trace JSON",
+                    "default_val": "~/spacemouse_trace.json",
+                }
+                self._models["Trace File"] = str_builder(**dict)
+                dict = {
+                    "label": "Save Trace",
+                    "type": "button",
+                    "text": "Save",
+                    "tooltip": "Write the recorded timeline, to open in ui.perfetto.dev or chrome://tracing",
+                    "on_clicked_fn": self._on_save_trace_event,
+                }
+                btn_builder(**dict)
+
         return
 
     def toggle_plotting_event_subscription(self, val=None):
@@ -223,9 +347,56 @@ class SpaceMouseExtension(omni.ext.IExt):
         else:
             self._plotting_event_subscription = None
 
+    def toggle_forwarding_event_subscription(self, val=None):
+        if val:
+            if not self._forwarding_event_subscription:
+                self._forwarding_event_subscription = (
+                    omni.kit.app.get_app().get_update_event_stream().create_subscription_to_pop(self._on_forwarding_step)
+                )
+        else:
+            self._forwarding_event_subscription = None
+            self._forwarder = None
+
+    def _on_forwarding_step(self, e: carb.events.IEvent):
+        if self._device is None:
+            return
+        stage = omni.usd.get_context().get_stage()
+        if stage is None:
+            self._forwarder = None
+            return
+        # The device is created asynchronously on engage, so the forwarder is built on first use. It's rebuilt
+        # when a new stage is opened, since the old sink keeps writing to the closed one.
+        if self._forwarder is None or self._forwarder.device is not self._device or self._forwarder.sink.stage is not stage:
+            prim_path = self._models["USD Prim"].get_value_as_string()
+            self._forwarder = SpaceMouseUsdForwarder(self._device, UsdAttributeSink(stage), prim_path=prim_path)
+        self._forwarder.update()
+
+    def _on_forwarding_event(self, val):
+        self.toggle_forwarding_event_subscription(val and self._models["Engage"][0].as_bool)
+
+    def _on_forwarding_prim_event(self, model):
+        if self._forwarder is not None:
+            self._forwarder.prim_path = model.get_value_as_string()
+            self._forwarder.reset()
+
     def _on_plotting_step(self, e: carb.events.IEvent):
         if self._device is None:
             return
+        tracer = self._device.tracer
+        if tracer is None:
+            self._plotting_step()
+            return
+        with tracer.span("plotting_step"):
+            self._plotting_step()
+
+    def _plotting_step(self):
+        if self._device.get_perf_counters() is not None:
+            self._update_counters_display()
+        if self._noise_estimator is not None:
+            self._update_calibration()
+        # While the puck rests the plots would only scroll zeros, so leave them until it moves again
+        if self._device.is_resting and not self._plotting_buffer[0].any():
+            return
         control = self._device.get_controller_state()
         if control is None:
             return
@@ -250,6 +421,77 @@ class SpaceMouseExtension(omni.ext.IExt):
             self._models["rpy_vals"][3].set_value(np.linalg.norm(self._plotting_buffer[0,3:]))
 
 
+    def _update_counters_display(self):
+        # Text updates are comparatively expensive and nobody can read them at frame rate
+        now = time.monotonic()
+        if now - self._counters_display_time < 0.5:
+            return
+        self._counters_display_time = now
+        snapshot = self._device.get_perf_counters()
+        if snapshot is not None:
+            self._models["Counters"].text = format_snapshot(snapshot)
+
+    def _update_calibration(self):
+        now = time.monotonic()
+        if now - self._calibration_time < 0.5:
+            return
+        self._calibration_time = now
+        estimate = self._device.get_noise_estimate()
+        self._models["Calibration"].text = format_estimate(estimate, self._noise_estimator.peak_frequencies())
+        if estimate is not None and self._models["Auto Calibrate"].get_value_as_bool():
+            self._device.set_zero_offset(estimate.offset)
+            try:
+                self.filter.update(translation_deadband=estimate.deadband[:3], rotation_deadband=estimate.deadband[3:])
+            except ValueError as e:
+                carb.log_warn(f"Not applying the calibrated deadbands: {e}")
+
+    def _enable_noise_estimation(self, enabled):
+        self._noise_estimator = None
+        if self._device is not None:
+            if enabled and self._device.noise_estimator is not None:
+                # Keep what a resumed session has measured so far
+                self._noise_estimator = self._device.noise_estimator
+            else:
+                self._noise_estimator = self._device.enable_noise_estimation(enabled, spectral=True)
+        if self._noise_estimator is None:
+            self._models["Calibration"].text = ""
+
+    def _on_noise_estimation_event(self, val):
+        self._enable_noise_estimation(val or self._models["Auto Calibrate"].get_value_as_bool())
+
+    def _on_auto_calibrate_event(self, val):
+        if val:
+            self._enable_noise_estimation(True)
+            return
+        # Back to the sliders
+        self._enable_noise_estimation(self._models["Noise Estimation"].get_value_as_bool())
+        if self._device is not None:
+            self._device.set_zero_offset(None)
+        self.filter.update(translation_deadband=self._models["Translation Deadband"][0].get_value_as_float(),
+                           rotation_deadband=self._models["Rotation Deadband"][0].get_value_as_float())
+
+    def _on_counters_event(self, val):
+        if self._device is not None:
+            self._device.enable_perf_counters(val)
+        if not val:
+            self._models["Counters"].text = ""
+
+    def _on_trace_event(self, val):
+        if self._device is not None:
+            self._device.enable_tracing(val)
+
+    def _on_save_trace_event(self):
+        tracer = self._device.tracer if self._device is not None else None
+        if tracer is None:
+            carb.log_warn("No SpaceMouse trace to save. Check Trace while the device is engaged.")
+            return
+        try:
+            path = tracer.dump(self._models["Trace File"].get_value_as_string())
+        except OSError as e:
+            carb.log_error(f"Unable to save SpaceMouse trace: {e}")
+            return
+        carb.log_info(f"Saved SpaceMouse trace to {path}. Open it in ui.perfetto.dev or chrome://tracing.")
+
     def get_frame(self, index):
         if index >= len(self._extra_frames):
             raise Exception("there were {} extra frames created only".format(len(self._extra_frames)))
@@ -265,32 +507,56 @@ class SpaceMouseExtension(omni.ext.IExt):
         elif kind == "rot":
             self.filter.rotation_enabled = model
 
+    def _set_filter_param(self, name, model):
+        """ Apply a field's value to the filter, or put the field back to the filter's value if it's invalid """
+        try:
+            self.filter.update(**{name: model.get_value_as_float()})
+        except ValueError as e:
+            carb.log_warn(f"Ignoring SpaceMouse setting: {e}")
+            current = getattr(self.filter, name)
+            # Per-axis deadbands from calibration can't be shown in the field
+            if np.ndim(current) == 0:
+                model.set_value(float(current))
+
     def _on_sensitivity_event(self, kind, model):
         if kind == "trans":
-            self.filter.translation_modifier = model.get_value_as_float()
+            self._set_filter_param("translation_modifier", model)
         elif kind == "rot":
-            self.filter.rotation_modifier = model.get_value_as_float()
+            self._set_filter_param("rotation_modifier", model)
 
     def _on_smoothing_event(self, model):
-        self.filter.smoothing_factor = model.get_value_as_float()
+        self._set_filter_param("smoothing_factor", model)
 
     def _on_deadband_event(self, kind, model):
+        if self._models["Auto Calibrate"].get_value_as_bool():
+            # The calibrated per-axis deadbands stay in charge
+            return
         if kind == "trans":
-            self.filter.translation_deadband = model.get_value_as_float()
+            self._set_filter_param("translation_deadband", model)
         elif kind == "rot":
-            self.filter.rotation_deadband = model.get_value_as_float()
+            self._set_filter_param("rotation_deadband", model)
+
+    def _watchdog_max_age(self):
+        max_age = self._models["Max Input Age"][0].get_value_as_float()
+        return max_age if max_age > 0 else None
+
+    def _on_max_age_event(self, model):
+        if self._device is not None:
+            self._device.set_watchdog(self._watchdog_max_age())
 
     def _on_softmax_event(self, kind, model):
-        self.filter.softmax_temp = model.get_value_as_float()
+        self._set_filter_param("softmax_temp", model)
 
     def _on_engage_event(self, model):
         cb_model, dropdown_model = self._models["Engage"]
         device_selection = dropdown_model.model.get_item_value_model().as_int
         device_selection = DEVICE_NAMES[device_selection]
-        if self._device and self._device.is_running and cb_model.as_bool == False:
-            asyncio.ensure_future(
-                self._on_disengage_event_async()
-            )
+        if cb_model.as_bool == False:
+            self._engage_generation += 1
+            if self._device and self._device.is_running:
+                asyncio.ensure_future(
+                    self._on_disengage_event_async()
+                )
 
         elif cb_model.as_bool:
             # User (or code!) tried to make it true
@@ -316,39 +582,145 @@ class SpaceMouseExtension(omni.ext.IExt):
         dropdown_model.model.get_item_value_model().set_value(0)
         return False
 
+    def _on_device_selection_event(self, val):
+        self._close_unselected_sessions()
+
+    def _close_unselected_sessions(self):
+        # A paused session keeps its device open, which is only worth it for the device the next engage opens.
+        # The engaged device stays open until it's disengaged.
+        cb_model, dropdown_model = self._models["Engage"]
+        spec = DEVICE_SPECS[DEVICE_NAMES[dropdown_model.model.get_item_value_model().as_int]]
+        close_sessions_except(spec.name, self._device_kind(), self._device)
+
+    def _device_kind(self):
+        if self._models["Synthetic Input"].get_value_as_bool():
+            return "synthetic"
+        elif self._models["Reader Process"].get_value_as_bool():
+            return "isolated"
+        return "hid"
+
     async def _on_engage_event_async(self, device_name, model):
+        spec = DEVICE_SPECS[device_name]
+        kind = self._device_kind()
+        factory = {"synthetic": SyntheticSpaceMouse, "isolated": IsolatedSpaceMouse, "hid": SpaceMouse}[kind]
+        generation = self._engage_generation
         try:
-            spec = DEVICE_SPECS[device_name]
-            self._device = SpaceMouse(spec)
-            self._device.set_position_callback(self.filter._translation_modifier)
-            self._device.set_rotation_callback(self.filter._rotation_modifier)
-            self._device.set_unexpected_close_callback(self._on_unexpected_close)
-            self._device.run()
-            return True
+            # The device stays open across disengage and hot reload, so this is usually a resume. Opening can
+            # take seconds (an isolated reader waits for its process), so it happens off the UI thread.
+            async with self._engage_lock:
+                session, resumed = await asyncio.to_thread(
+                    acquire_session, spec.name, kind, partial(factory, spec, auto_reconnect=True), self.filter)
         except RuntimeError:
             carb.log_error(f"Unable to open device { spec.name }. Did you plug in the device, set up spacenavd and udev rules correctly?")
+            if generation != self._engage_generation:
+                return False
             self._device = None
             model.set_value(False)
             return False
+        if generation != self._engage_generation:
+            # Disengaged or shut down while opening
+            session.pause()
+            self._close_unselected_sessions()
+            return False
+        if resumed:
+            # Keep the warm filter state, with the settings currently in the UI
+            self.filter = session.filter
+            self._apply_filter_params(self._ui_filter_params())
+        self._device = session.device
+        session.on_unexpected_close = self._on_unexpected_close
+        self._device.set_filter(self.filter)
+        self._device.enable_perf_counters(self._models["Perf Counters"].get_value_as_bool())
+        self._device.enable_tracing(self._models["Trace"].get_value_as_bool())
+        self._enable_noise_estimation(self._models["Noise Estimation"].get_value_as_bool() or self._models["Auto Calibrate"].get_value_as_bool())
+        self._device.set_watchdog(self._watchdog_max_age())
+        return True
+
+    def _ui_filter_params(self) -> FilterParams:
+        return FilterParams(
+            self._models["Smoothing Factor"][0].get_value_as_float(),
+            self._models["Softmax Temperature"][0].get_value_as_float(),
+            self._models["Translation Sensitivity"][0].get_value_as_float(),
+            self._models["Rotation Sensitivity"][0].get_value_as_float(),
+            self._models["Translation Deadband"][0].get_value_as_float(),
+            self._models["Rotation Deadband"][0].get_value_as_float(),
+            self._models["Modes"][0].get_value_as_bool(),
+            self._models["Modes"][1].get_value_as_bool(),
+        )
+
+    def _apply_filter_params(self, params: FilterParams):
+        if self._models["Auto Calibrate"].get_value_as_bool():
+            # The calibrated per-axis deadbands stay in charge
+            params = params._replace(translation_deadband=self.filter.translation_deadband,
+                                     rotation_deadband=self.filter.rotation_deadband)
+        # All at once, so the reader never filters with a mix of old and new settings
+        self.filter.set_params(params)
+
+    def _on_save_preset_event(self):
+        name = self._models["Preset"].get_value_as_string().strip()
+        if not name or "/" in name:
+            carb.log_warn(f"Invalid preset name '{name}'")
+            return
+        for field, value in self._ui_filter_params()._asdict().items():
+            self._settings.set(f"{PRESET_SETTINGS_PATH}/{name}/{field}", value)
+        carb.log_info(f"Saved SpaceMouse preset '{name}'")
+
+    def _on_load_preset_event(self):
+        name = self._models["Preset"].get_value_as_string().strip()
+        values = self._settings.get(f"{PRESET_SETTINGS_PATH}/{name}") if name and "/" not in name else None
+        if not isinstance(values, dict) or any(field not in values for field in FilterParams._fields):
+            presets = self._settings.get(PRESET_SETTINGS_PATH) or {}
+            carb.log_warn(f"No SpaceMouse preset '{name}'. Saved presets: {', '.join(presets) or 'none'}")
+            return
+        params = FilterParams(**{field: values[field] for field in FilterParams._fields})
+        try:
+            self._apply_filter_params(params)
+        except ValueError as e:
+            carb.log_warn(f"Invalid SpaceMouse preset '{name}': {e}")
+            return
+        # Bring the UI in line. Its callbacks set the values the filter already has.
+        self._models["Smoothing Factor"][0].set_value(params.smoothing_factor)
+        self._models["Softmax Temperature"][0].set_value(params.softmax_temp)
+        self._models["Translation Sensitivity"][0].set_value(params.translation_modifier)
+        self._models["Rotation Sensitivity"][0].set_value(params.rotation_modifier)
+        self._models["Translation Deadband"][0].set_value(params.translation_deadband)
+        self._models["Rotation Deadband"][0].set_value(params.rotation_deadband)
+        self._models["Modes"][0].set_value(params.translation_enabled)
+        self._models["Modes"][1].set_value(params.rotation_enabled)
 
     def _on_unexpected_close(self):
         cb_model, dropdown_model = self._models["Engage"]
         self._device = None
         cb_model.set_value(False)
 
-    async def _on_disengage_event_async(self):
-        self._device.close()
+    def _release_device(self):
+        # Pause rather than close, so the next engage (or this extension after a reload) resumes instantly
+        session = get_session(self._device.name)
+        if session is not None and session.device is self._device:
+            session.pause()
+        else:
+            self._device.close()
         self._device = None
+        # Closed instead if the selection changed while it was engaged
+        self._close_unselected_sessions()
+
+    async def _on_disengage_event_async(self):
+        self._release_device()
 
     def _engage_value_changed(self, model):
         self.toggle_plotting_event_subscription(model.as_bool)
+        forwarding = model.as_bool and self._models["Forward to USD"].get_value_as_bool()
+        self.toggle_forwarding_event_subscription(forwarding)
 
     def on_shutdown(self):
         self.engage_sub_handle.unsubscribe()
         self.engage_sub_handle = None
+        self._engage_generation += 1
+        self.toggle_forwarding_event_subscription(False)
         if self._device:
-            self._device.close()
-            self._device = None
+            self._release_device()
+        else:
+            # Only the selected device's session is kept for a hot reload
+            self._close_unselected_sessions()
         self._extra_frames = []
 
         if self._menu_items is not None:
@@ -3,28 +3,113 @@
 # Licensed under the MIT License [see LICENSE for details].
 
 
+import threading
+from collections import namedtuple
+
 import numpy as np
 
 EPS = np.finfo(float).eps
+# Weight of the cubic term in the deadband's response curve
+DEADBAND_CUBIC_WEIGHT = .4
+
+# Field order matches the SpaceMouseFilter constructor. Deadbands can be a scalar or one value per axis.
+FilterParams = namedtuple("FilterParams", [
+    "smoothing_factor", "softmax_temp", "translation_modifier", "rotation_modifier",
+    "translation_deadband", "rotation_deadband", "translation_enabled", "rotation_enabled",
+])
+# What the filter needs per sample for translation or rotation, derived once per parameter change
+GroupConstants = namedtuple("GroupConstants", ["enabled", "deadband", "deadband_offset", "deadband_scale", "modifier"])
+# An immutable, versioned set of parameters and the constants derived from them
+FilterSnapshot = namedtuple("FilterSnapshot", ["version", "params", "keep", "smoothing", "inv_softmax_temp", "translation", "rotation"])
+
+
+def _unclipped(deadband, to_keep):
+    # Deadbands can be a scalar or one value per component
+    return deadband[to_keep] if np.ndim(deadband) else deadband
 
 
 def apply_linear_deadband(values, deadband, max_value=1.0):
     to_clip = np.abs(values) < deadband
     values[to_clip] = 0
-    values[~to_clip] = (values[~to_clip] - deadband * (np.abs(values[~to_clip]) / values[~to_clip])) / (max_value - deadband)
+    deadband = _unclipped(deadband, ~to_clip)
+    values[~to_clip] = (values[~to_clip] - deadband * np.sign(values[~to_clip])) / (max_value - deadband)
 
 
 def cubic(x, weight):
     return weight * x ** 3  + (1.0 - weight) * x
 
 
-def apply_cubic_deadband(values, deadband, max_value=1.0, weight=.4):
-    to_clip = np.abs(values) < deadband
-    values[to_clip] = 0
-    values[~to_clip] = (cubic(values[~to_clip], weight) - cubic(deadband, weight) * (np.abs(values[~to_clip]) / values[~to_clip])) / (max_value - cubic(deadband, weight))
+def _apply_cubic_deadband(values, deadband, offset, scale, weight):
+    # offset is cubic(deadband, weight) and scale 1 / (max_value - offset)
+    to_keep = np.abs(values) >= deadband
+    kept = values[to_keep]
+    values[:] = 0
+    if kept.size:
+        values[to_keep] = (cubic(kept, weight) - np.copysign(_unclipped(offset, to_keep), kept)) * _unclipped(scale, to_keep)
+
+
+def apply_cubic_deadband(values, deadband, max_value=1.0, weight=DEADBAND_CUBIC_WEIGHT):
+    offset = cubic(np.asarray(deadband, dtype=float), weight)
+    _apply_cubic_deadband(values, deadband, offset, 1.0 / (max_value - offset), weight)
+
+
+def _group_constants(enabled, deadband, modifier, max_value=1.0, weight=DEADBAND_CUBIC_WEIGHT) -> GroupConstants:
+    if np.ndim(deadband):
+        # Our own read-only copy, so the caller can't change it under the reader thread
+        deadband = np.array(deadband, dtype=float)
+        deadband.flags.writeable = False
+    else:
+        deadband = float(deadband)
+    offset = cubic(deadband, weight)
+    return GroupConstants(bool(enabled), deadband, offset, 1.0 / (max_value - offset), float(modifier))
+
+
+def make_snapshot(params: FilterParams, version: int = 0) -> FilterSnapshot:
+    """ Validate params and derive everything the filter computes from them """
+    if not 0 <= params.smoothing_factor < 1:
+        raise ValueError(f"smoothing_factor must be in [0, 1), got {params.smoothing_factor}")
+    if params.softmax_temp <= 0:
+        raise ValueError(f"softmax_temp must be positive, got {params.softmax_temp}")
+    for name in ("translation_deadband", "rotation_deadband"):
+        deadband = np.asarray(getattr(params, name), dtype=float)
+        # A deadband of 1 would zero the whole range (and divide by zero in its rescaling)
+        if not ((deadband >= 0) & (deadband < 1)).all():
+            raise ValueError(f"{name} must be in [0, 1), got {getattr(params, name)}")
+    translation = _group_constants(params.translation_enabled, params.translation_deadband, params.translation_modifier)
+    rotation = _group_constants(params.rotation_enabled, params.rotation_deadband, params.rotation_modifier)
+    params = params._replace(translation_deadband=translation.deadband, rotation_deadband=rotation.deadband)
+    return FilterSnapshot(version, params, 1.0 - params.smoothing_factor, float(params.smoothing_factor),
+                          1.0 / params.softmax_temp, translation, rotation)
+
+
+def _param_property(name):
+    def get(self):
+        return getattr(self._snapshot.params, name)
+
+    def set(self, value):
+        self.update(**{name: value})
+    return property(get, set)
 
 
 class SpaceMouseFilter:
+    """ Deadband, softmax redistribution across axes, sensitivity and exponential smoothing, applied in place
+        to the translation and rotation of every sample.
+
+        The parameters live in an immutable FilterSnapshot along with everything derived from them. Changes
+        (through the attributes, update() or set_params()) build a new snapshot and swap it in with a single
+        assignment. `modify` reads that reference once per sample, for translation and rotation alike, so a
+        sample is never filtered with a half-applied change or with different settings for its two halves.
+        Hand the filter to `SpaceMouse.set_filter` to have it filter every sample that way.
+    """
+
+    smoothing_factor = _param_property("smoothing_factor")
+    softmax_temp = _param_property("softmax_temp")
+    translation_modifier = _param_property("translation_modifier")
+    rotation_modifier = _param_property("rotation_modifier")
+    translation_deadband = _param_property("translation_deadband")
+    rotation_deadband = _param_property("rotation_deadband")
+    translation_enabled = _param_property("translation_enabled")
+    rotation_enabled = _param_property("rotation_enabled")
 
     def __init__(self,
         smoothing_factor,
@@ -38,69 +123,86 @@ class SpaceMouseFilter:
         self._world = None
         self._device = None
         self.spacemouse_prim = None
-        self.smoothing_factor = smoothing_factor
-        self.softmax_temp = softmax_temp
-        self.rotation_modifier = rotation_modifer
-        self.translation_modifier = translation_modifier
-        self.rotation_deadband = rotation_deadband
-        self.translation_deadband = translation_deadband
-        self.translation_enabled = translation_enabled
-        self.rotation_enabled = rotation_enabled
+        # Only writers take the lock, so concurrent changes to different fields don't undo each other
+        self._params_lock = threading.Lock()
+        self._snapshot = make_snapshot(FilterParams(
+            smoothing_factor, softmax_temp, translation_modifier, rotation_modifer,
+            translation_deadband, rotation_deadband, translation_enabled, rotation_enabled))
 
         self.prev_trans = np.array((0.,0.,0.))
         self.prev_rot = np.array((0.,0.,0.))
 
-    def _rotation_modifier(self, rot):
-        if not self.rotation_enabled:
-            rot[:] = 0
-            self.prev_rot[:] = 0
+    @property
+    def params(self) -> FilterParams:
+        return self._snapshot.params
+
+    @property
+    def snapshot(self) -> FilterSnapshot:
+        return self._snapshot
+
+    def set_params(self, params: FilterParams) -> FilterSnapshot:
+        """ Replace every parameter at once """
+        with self._params_lock:
+            self._snapshot = make_snapshot(params, self._snapshot.version + 1)
+            return self._snapshot
+
+    def update(self, **changes) -> FilterSnapshot:
+        """ Change some parameters at once, e.g. update(translation_deadband=.05, rotation_deadband=.08) """
+        with self._params_lock:
+            snapshot = self._snapshot
+            self._snapshot = make_snapshot(snapshot.params._replace(**changes), snapshot.version + 1)
+            return self._snapshot
+
+    def _modify(self, values, prev, group: GroupConstants, snapshot: FilterSnapshot):
+        if not group.enabled:
+            values[:] = 0
+            prev[:] = 0
             return
 
-        apply_cubic_deadband(rot, self.rotation_deadband)
+        _apply_cubic_deadband(values, group.deadband, group.deadband_offset, group.deadband_scale, DEADBAND_CUBIC_WEIGHT)
+
+        magnitude = min(np.linalg.norm(values), 1.0)
+        if magnitude != 0:
+            # Redistribute mass, smoothly favoring the stronger components. The softmax's normalization would
+            # cancel out in the renormalization to the original magnitude, so it's skipped.
+            values *= np.exp(np.abs(values) * snapshot.inv_softmax_temp)
+            values *= magnitude * group.modifier / np.linalg.norm(values) # renormalize and apply user scale factor
+
+        values[:] = snapshot.keep * values + snapshot.smoothing * prev
+        values[np.abs(values) < EPS] = 0
+        prev[:] = values
+
+    def modify(self, trans, rot):
+        """ Filter a sample's translation and rotation in place, with one set of parameters """
+        snapshot = self._snapshot
+        self._modify(trans, self.prev_trans, snapshot.translation, snapshot)
+        self._modify(rot, self.prev_rot, snapshot.rotation, snapshot)
+
+    def in_deadband(self, trans, rot) -> bool:
+        """ Whether every axis of the sample is inside its deadband (or its group is disabled). Filtering such a
+            sample only decays the smoothing, so once that has reached zero the output stays exactly zero.
+        """
+        snapshot = self._snapshot
+        for values, group in ((trans, snapshot.translation), (rot, snapshot.rotation)):
+            if not group.enabled:
+                continue
+            if np.ndim(group.deadband):
+                if not (np.abs(values) < group.deadband).all():
+                    return False
+            # Checked on every resting sample; going through a list is much faster than numpy on 3 values
+            elif max(map(abs, values.tolist())) >= group.deadband:
+                return False
+        return True
+
+    def settle(self) -> None:
+        """ Zero the smoothing state, as if the output had decayed, e.g. when motion is cut off """
+        self.prev_trans[:] = 0
+        self.prev_rot[:] = 0
 
-        magnitude = np.linalg.norm(rot)
-        # 
-        magnitude = min(magnitude, 1.0)
-        if magnitude == 0:
-            rot[:] = (1 - self.smoothing_factor) * rot + self.smoothing_factor * self.prev_rot
-            rot[np.abs(rot) < EPS] = 0
-            self.prev_rot[:] = rot[:]
-            return
-
-        rot_exp = np.exp(np.abs(rot) / self.softmax_temp)
-        softmax = rot_exp / np.sum(rot_exp)
-        rot[:] *= softmax # redistribute
-        rot[:] *= magnitude / np.linalg.norm(rot) # renormalize to original scale
-        rot[:] *= self.rotation_modifier # apply user scale factor
-
-        rot[:] = (1 - self.smoothing_factor) * rot + self.smoothing_factor * self.prev_rot
-        rot[np.abs(rot) < EPS] = 0
-        self.prev_rot[:] = rot[:]
+    def _rotation_modifier(self, rot):
+        snapshot = self._snapshot
+        self._modify(rot, self.prev_rot, snapshot.rotation, snapshot)
 
     def _translation_modifier(self, trans):
-        if not self.translation_enabled:
-            trans[:] = 0
-            self.prev_trans[:] = 0
-            return
-
-        apply_cubic_deadband(trans, self.translation_deadband)
-
-        magnitude = np.linalg.norm(trans)
-        # 
-        magnitude = min(magnitude, 1.0)
-        if magnitude == 0:
-            trans[:] = (1 - self.smoothing_factor) * trans + self.smoothing_factor * self.prev_trans
-            trans[np.abs(trans) < EPS] = 0
-            self.prev_trans[:] = trans[:]
-            return
-
-        # Redistribute mass, smoothly favoring the stronger components
-        trans_exp = np.exp(np.abs(trans) / self.softmax_temp)
-        softmax = trans_exp / np.sum(trans_exp)
-        trans[:] *= softmax # redistribute
-        trans[:] *= magnitude / np.linalg.norm(trans) # renormalize to original scale
-        trans[:] *= self.translation_modifier # apply user scale factor
-
-        trans[:] = (1 - self.smoothing_factor) * trans + self.smoothing_factor * self.prev_trans
-        trans[np.abs(trans) < EPS] = 0
-        self.prev_trans[:] = trans[:]
+        snapshot = self._snapshot
+        self._modify(trans, self.prev_trans, snapshot.translation, snapshot)
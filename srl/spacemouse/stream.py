@@ -0,0 +1,232 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+""" Stream SpaceMouse samples to another machine (UDP) or process (Unix datagram socket).
+
+    Every published sample is sent as one fixed-size datagram:
+    (magic, version, flags, epoch, sequence, t, x, y, z, roll, pitch, yaw, buttons), packed little endian.
+    Datagrams are never retransmitted; the receiver keeps the newest sample and counts lost and reordered ones.
+    The epoch is random per streamer, so the receiver can tell a restarted sender (whose sequence numbers start
+    over) from late datagrams, however soon it restarts.
+
+        streamer = SpaceMouseStreamer(device, ("192.168.1.20", 9870))
+        ...
+        receiver = SpaceMouseReceiver(("0.0.0.0", 9870), device_name="SpaceMouse Compact")
+        receiver.run()
+        stamp, trans, rot, raw_buttons = receiver.get_controller_state()
+"""
+
+import os
+import random
+import socket
+import struct
+import threading
+from collections import deque
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from srl.spacemouse.device import SpaceMouseData
+from srl.spacemouse.buttons import ButtonStateStruct, DEVICE_BUTTON_STRUCT_INDICES
+
+STREAM_MAGIC = b"SPMU"
+STREAM_VERSION = 2
+STREAM_PORT = 9870
+# Missing sequence numbers are remembered this far behind the newest one. A datagram arriving later than that
+# can't be told from a duplicate.
+REORDER_WINDOW = 1024
+
+# Set in the flags field when the axes have been through the device's position/rotation callbacks
+FLAG_FILTERED = 1
+
+_PACKET = struct.Struct("<4sHHIQd6dQ")
+PACKET_SIZE = _PACKET.size
+
+Address = Union[Tuple[str, int], str]
+
+
+def _make_socket(family: str) -> socket.socket:
+    if family == "udp":
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    elif family == "unix":
+        return socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    raise ValueError(f"Unknown socket family {family}, expected 'udp' or 'unix'")
+
+
+def pack_sample(sample: SpaceMouseData, sequence: int, flags: int = 0, epoch: int = 0) -> bytes:
+    x, y, z = sample.xyz
+    r, p, ya = sample.rpy
+    return _PACKET.pack(STREAM_MAGIC, STREAM_VERSION, flags, epoch, sequence, sample.t, x, y, z, r, p, ya,
+                        int(sample.buttons))
+
+
+def unpack_sample(data: bytes) -> Optional[Tuple[int, int, int, SpaceMouseData]]:
+    """ Returns (epoch, sequence, flags, sample), or None if the datagram isn't a SpaceMouse packet """
+    if len(data) != PACKET_SIZE:
+        return None
+    magic, version, flags, epoch, sequence, t, x, y, z, r, p, ya, buttons = _PACKET.unpack(data)
+    if magic != STREAM_MAGIC or version != STREAM_VERSION:
+        return None
+    return epoch, sequence, flags, SpaceMouseData(t, np.array((x, y, z)), np.array((r, p, ya)), buttons)
+
+
+class SpaceMouseStreamer:
+    def __init__(self, device, address: Address, family: str = "udp", filtered: bool = True) -> None:
+        """
+        Args:
+            device (SpaceMouse): device whose samples are sent
+            address: (host, port) for udp, or a socket path for unix
+            family (str): "udp" or "unix"
+            filtered (bool): send the output of the device's position/rotation callbacks instead of the raw sample
+        """
+        self.address = address
+        self.filtered = filtered
+        self.sent = 0
+        self.send_errors = 0
+        # Tells the receiver these sequence numbers are new if it saw an earlier streamer's
+        self.epoch = random.getrandbits(32)
+        self._device = device
+        self._socket = _make_socket(family)
+        self._socket.setblocking(False)
+        device.add_sample_listener(self._on_sample)
+
+    def _on_sample(self, sample: SpaceMouseData, sequence: int) -> None:
+        flags = 0
+        if self.filtered:
+            state = self._device._filtered_state()
+            if state is not None:
+                sample = state
+                flags = FLAG_FILTERED
+        try:
+            self._socket.sendto(pack_sample(sample, sequence, flags, self.epoch), self.address)
+            self.sent += 1
+        except OSError:
+            # Nobody listening or the buffer is full. Dropping is the right thing for live input.
+            self.send_errors += 1
+
+    def close(self) -> None:
+        if self._socket is None:
+            return
+        self._device.remove_sample_listener(self._on_sample)
+        self._socket.close()
+        self._socket = None
+
+
+class SpaceMouseReceiver:
+    """ Receiving end of a `SpaceMouseStreamer`. Offers the same read interface as `SpaceMouse`. """
+    def __init__(self, address: Address = ("0.0.0.0", STREAM_PORT), family: str = "udp", device_name: Optional[str] = None) -> None:
+        """
+        Args:
+            address: (host, port) to bind for udp, or a socket path for unix
+            family (str): "udp" or "unix"
+            device_name (str, optional): name of the sending device, needed to name buttons in get_button_state
+        """
+        self.address = address
+        self.name = device_name
+        self._family = family
+        self._socket = _make_socket(family)
+        self._socket.bind(address)
+        # Blocking with a timeout lets the thread notice stop() without busy waiting
+        self._socket.settimeout(0.1)
+        self._control = None
+        self._epoch = None
+        # Epochs of earlier senders, whose late datagrams are dropped rather than taken for yet another restart
+        self._old_epochs = deque(maxlen=8)
+        self._last_sequence = None
+        # Sequence numbers counted as lost, so a late one is only taken back off the lost count once
+        self._missing = set()
+        self._stats = {"received": 0, "lost": 0, "reordered": 0, "duplicates": 0, "invalid": 0}
+        self.thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def bound_address(self) -> Address:
+        return self._socket.getsockname()
+
+    @property
+    def is_running(self) -> bool:
+        return self.thread is not None
+
+    def run(self):
+        if self.thread:
+            return
+        self.thread = threading.Thread(target=self._run_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        if not self.is_running:
+            return
+        self._stop_event.set()
+        self.thread.join()
+        self._stop_event.clear()
+        self.thread = None
+
+    def close(self):
+        self.stop()
+        self._socket.close()
+        if self._family == "unix" and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def get_controller_state(self) -> Optional[SpaceMouseData]:
+        control = self._control
+        if control is None:
+            return None
+        return SpaceMouseData(control.t, np.array(control.xyz), np.array(control.rpy), control.buttons)
+
+    def get_button_state(self) -> Optional[ButtonStateStruct]:
+        control = self._control
+        if control is None:
+            return None
+        return ButtonStateStruct(control.buttons, DEVICE_BUTTON_STRUCT_INDICES.get(self.name, {}))
+
+    def get_stats(self) -> Dict[str, int]:
+        """ Counts of received, lost, reordered, duplicate and invalid datagrams """
+        return dict(self._stats)
+
+    def _run_loop(self):
+        stats = self._stats
+        while not self._stop_event.is_set():
+            try:
+                data = self._socket.recv(PACKET_SIZE + 1)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self._receive(data, stats)
+
+    def _receive(self, data: bytes, stats: Dict[str, int]):
+        unpacked = unpack_sample(data)
+        if unpacked is None:
+            stats["invalid"] += 1
+            return
+        epoch, sequence, _, sample = unpacked
+        stats["received"] += 1
+        if epoch != self._epoch:
+            if epoch in self._old_epochs:
+                stats["reordered"] += 1
+                return
+            # First datagram, or a new sender
+            if self._epoch is not None:
+                self._old_epochs.append(self._epoch)
+            self._epoch = epoch
+            self._last_sequence = sequence - 1
+            self._missing.clear()
+        missing = self._missing
+        if sequence > self._last_sequence:
+            gap = sequence - self._last_sequence - 1
+            if gap:
+                stats["lost"] += gap
+                missing.update(range(max(self._last_sequence + 1, sequence - REORDER_WINDOW), sequence))
+                if len(missing) > 2 * REORDER_WINDOW:
+                    self._missing = {s for s in missing if s >= sequence - REORDER_WINDOW}
+            self._last_sequence = sequence
+            self._control = sample
+        elif sequence in missing:
+            # A late datagram. It was counted as lost when the gap was seen, but it's stale now, so drop it.
+            missing.discard(sequence)
+            stats["reordered"] += 1
+            stats["lost"] -= 1
+        else:
+            stats["duplicates"] += 1
@@ -0,0 +1,282 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+""" Tune SpaceMouseFilter parameters offline by replaying recorded sessions (see `srl.spacemouse.recorder`).
+
+    python -m srl.spacemouse.sweep recordings/ --smoothing 0.3,0.5,0.7 --softmax 0.5,0.85 --trans-deadband 0.05,0.1
+
+    Every combination of the given values is run over the raw samples of every episode, exactly as the device
+    would run the filter once per published sample, and scored on:
+
+        lag        seconds the filtered signal trails the raw one (peak of their cross-correlation)
+        jitter     high frequency energy of the filtered signal relative to its total energy
+        crosstalk  share of the filtered motion that isn't on the dominant axis of its group
+        loss       share of the raw motion the filter removes entirely (e.g. a deadband that's too wide)
+
+    Lower is better for all four. Each is divided by its median over the grid and the weighted sum gives the
+    score the table is ranked by. Settings that lose more than --max-loss of the motion would score well on the
+    others for doing nothing, so they're rejected and ranked last. Episodes are memory mapped and settings are
+    spread over a process pool.
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from srl.spacemouse.log import log_warn
+from srl.spacemouse.recorder import episode_samples, list_episodes, load_episode
+from srl.spacemouse.resample import make_grid, resample_values
+from srl.spacemouse.spacemousefilter import SpaceMouseFilter
+
+SWEEP_RATE = 100.0
+SWEEP_MAX_LAG = 0.5
+# Raw samples with less motion than this (on every axis of a group) don't count towards crosstalk
+SWEEP_MOTION_THRESHOLD = 0.05
+# Settings that remove more than this share of the raw motion are rejected
+SWEEP_MAX_LOSS = 0.5
+
+SweepParams = namedtuple("SweepParams", [
+    "smoothing_factor", "softmax_temp", "translation_sensitivity", "rotation_sensitivity",
+    "translation_deadband", "rotation_deadband",
+])
+METRICS = ("lag", "jitter", "crosstalk", "loss")
+
+
+def run_filter(params: SweepParams, raw: np.ndarray) -> np.ndarray:
+    """ Filtered (N, 6) output for raw (N, 6) samples, starting from a fresh filter """
+    filter = SpaceMouseFilter(params.smoothing_factor, params.softmax_temp, params.translation_sensitivity,
+                              params.rotation_sensitivity, params.translation_deadband, params.rotation_deadband,
+                              True, True)
+    out = np.array(raw, dtype=float)
+    for row in out:
+        filter.modify(row[:3], row[3:])
+    return out
+
+
+def lag(raw: np.ndarray, filtered: np.ndarray, rate: float, max_lag: float) -> float:
+    """ Energy-weighted mean over axes of the delay (s) that best aligns filtered with raw, both on a uniform grid """
+    max_shift = min(int(max_lag * rate), len(raw) - 1)
+    delays, weights = [], []
+    for axis in range(raw.shape[1]):
+        x = raw[:, axis] - raw[:, axis].mean()
+        y = filtered[:, axis] - filtered[:, axis].mean()
+        energy = float(np.dot(x, x))
+        if energy == 0 or not np.dot(y, y):
+            continue
+        # From a shift of -1, so a peak at 0 can be interpolated too
+        correlation = [np.dot(x[1:], y[:-1])] + [np.dot(x[:len(x) - shift], y[shift:]) for shift in range(max_shift + 1)]
+        peak = int(np.argmax(correlation))
+        delay = float(peak - 1)
+        if 0 < peak < len(correlation) - 1:
+            # Parabolic interpolation, so lags shorter than a grid step still register
+            left, center, right = correlation[peak - 1:peak + 2]
+            curvature = left - 2 * center + right
+            if curvature < 0:
+                delay += 0.5 * (left - right) / curvature
+        delays.append(max(delay, 0.0) / rate)
+        weights.append(energy)
+    if not weights:
+        return 0.0
+    return float(np.average(delays, weights=weights))
+
+
+def jitter(filtered: np.ndarray) -> float:
+    """ Energy of the second difference relative to the signal's energy. Independent of the output scale. """
+    energy = float(np.sum(filtered ** 2))
+    if energy == 0 or len(filtered) < 3:
+        return 0.0
+    return float(np.sum(np.diff(filtered, n=2, axis=0) ** 2)) / energy
+
+
+def crosstalk(raw: np.ndarray, filtered: np.ndarray, threshold: float = SWEEP_MOTION_THRESHOLD) -> float:
+    """ For samples with motion, the mean share of each group's filtered energy off its dominant axis """
+    shares = []
+    for group in (slice(0, 3), slice(3, 6)):
+        moving = np.abs(raw[:, group]).max(axis=1) >= threshold
+        energy = filtered[moving, group] ** 2
+        total = energy.sum(axis=1)
+        valid = total > 0
+        if valid.any():
+            shares.append(1.0 - energy[valid].max(axis=1) / total[valid])
+    if not shares:
+        return 0.0
+    return float(np.concatenate(shares).mean())
+
+
+def loss(raw: np.ndarray, filtered: np.ndarray, threshold: float = SWEEP_MOTION_THRESHOLD) -> float:
+    """ Share of the samples with motion in a group (translation or rotation) whose filtered group is all zero """
+    moving_count = lost_count = 0
+    for group in (slice(0, 3), slice(3, 6)):
+        moving = np.abs(raw[:, group]).max(axis=1) >= threshold
+        moving_count += int(moving.sum())
+        lost_count += int((~filtered[moving, group].any(axis=1)).sum())
+    if moving_count == 0:
+        return 0.0
+    return lost_count / moving_count
+
+
+# Episodes loaded once per worker process
+_episodes: List[Dict[str, np.ndarray]] = []
+
+
+def _load_episodes(episode_dirs: Sequence[str]) -> None:
+    global _episodes
+    _episodes = [load_episode(path, mmap_mode="r") for path in episode_dirs]
+
+
+def evaluate(params: SweepParams, rate: float = SWEEP_RATE, max_lag: float = SWEEP_MAX_LAG) -> Dict[str, float]:
+    """ Metrics for one setting over the loaded episodes, weighted by episode duration """
+    totals = dict.fromkeys(METRICS, 0.0)
+    total_duration = 0.0
+    for columns in _episodes:
+        samples = episode_samples(columns)
+        if len(samples.t) < 3:
+            continue
+        raw = np.concatenate((samples.xyz, samples.rpy), axis=1)
+        filtered = run_filter(params, raw)
+        grid = make_grid(samples.t[0], samples.t[-1], rate)
+        raw_grid = resample_values(grid, samples.t, raw)
+        filtered_grid = resample_values(grid, samples.t, filtered)
+        duration = float(samples.t[-1] - samples.t[0])
+        totals["lag"] += duration * lag(raw_grid, filtered_grid, rate, max_lag)
+        totals["jitter"] += duration * jitter(filtered_grid)
+        totals["crosstalk"] += duration * crosstalk(raw, filtered)
+        totals["loss"] += duration * loss(raw, filtered)
+        total_duration += duration
+    if total_duration == 0:
+        return totals
+    return {name: value / total_duration for name, value in totals.items()}
+
+
+def _evaluate_task(args):
+    params, rate, max_lag = args
+    return params, evaluate(params, rate, max_lag)
+
+
+def make_grid_params(smoothing: Sequence[float], softmax: Sequence[float], translation_sensitivity: Sequence[float],
+                     rotation_sensitivity: Sequence[float], translation_deadband: Sequence[float],
+                     rotation_deadband: Sequence[float]) -> List[SweepParams]:
+    return [SweepParams(*values) for values in itertools.product(
+        smoothing, softmax, translation_sensitivity, rotation_sensitivity, translation_deadband, rotation_deadband)]
+
+
+def _normalizers(rows: List[dict]) -> Dict[str, float]:
+    """ What each metric is divided by: its median, or its mean if the median is 0. A metric that is 0 for every
+        row can't tell settings apart and gets 0, which leaves it out of the score. Both cases are logged.
+    """
+    normalizers = {}
+    for name in METRICS:
+        values = np.array([row[name] for row in rows])
+        normalizer = float(np.median(values)) if len(values) else 0.0
+        if normalizer <= 0:
+            normalizer = float(values.mean()) if len(values) else 0.0
+            if normalizer > 0:
+                log_warn(f"Median {name} is 0 over the grid; normalizing it by its mean instead")
+            else:
+                log_warn(f"{name} is 0 for every setting, so it doesn't affect the ranking")
+        normalizers[name] = normalizer
+    return normalizers
+
+
+def sweep(episode_dirs: Sequence[str], grid: Sequence[SweepParams], weights: Optional[Dict[str, float]] = None,
+          rate: float = SWEEP_RATE, max_lag: float = SWEEP_MAX_LAG, workers: Optional[int] = None,
+          max_loss: float = SWEEP_MAX_LOSS) -> List[dict]:
+    """ Evaluate every setting in grid over the episodes and return rows ranked by score, best first. Rows that
+        lose more than max_loss of the motion are marked rejected and ranked last.
+    """
+    weights = weights or dict.fromkeys(METRICS, 1.0)
+    tasks = [(params, rate, max_lag) for params in grid]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_load_episodes, initargs=(list(episode_dirs),)) as pool:
+        results = list(pool.map(_evaluate_task, tasks, chunksize=max(1, len(tasks) // (4 * (workers or os.cpu_count() or 1)))))
+
+    rows = [dict(params._asdict(), **metrics, rejected=metrics["loss"] > max_loss) for params, metrics in results]
+    accepted = [row for row in rows if not row["rejected"]]
+    if not accepted:
+        log_warn(f"Every setting loses more than {max_loss:.0%} of the motion")
+    # Normalized over the settings worth considering, so degenerate ones don't skew the scale
+    normalizers = _normalizers(accepted or rows)
+    for row in rows:
+        row["score"] = sum(weights.get(name, 0.0) * row[name] / normalizers[name]
+                           for name in METRICS if normalizers[name] > 0)
+    rows.sort(key=lambda row: (row["rejected"], row["score"]))
+    return rows
+
+
+def print_table(rows: List[dict], limit: Optional[int] = None) -> None:
+    columns = list(SweepParams._fields) + list(METRICS) + ["score"]
+    headers = ["smooth", "softmax", "t_sens", "r_sens", "t_dead", "r_dead", "lag_s", "jitter", "crosstalk", "loss", "score"]
+    print("rank  " + "  ".join(f"{header:>9}" for header in headers))
+    for rank, row in enumerate(rows[:limit], start=1):
+        rejected = "  rejected" if row["rejected"] else ""
+        print(f"{rank:>4}  " + "  ".join(f"{row[column]:>9.4g}" for column in columns) + rejected)
+
+
+def _floats(text: str) -> List[float]:
+    return [float(value) for value in text.split(",")]
+
+
+def _weights(text: str) -> Dict[str, float]:
+    weights = dict.fromkeys(METRICS, 0.0)
+    for item in text.split(","):
+        name, value = item.split("=")
+        if name not in METRICS:
+            raise argparse.ArgumentTypeError(f"Unknown metric {name}, expected one of {METRICS}")
+        weights[name] = float(value)
+    return weights
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m srl.spacemouse.sweep", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", nargs="+", help="recording directories (containing episode_*) or episode directories")
+    parser.add_argument("--smoothing", type=_floats, default=[.3, .5, .7, .85])
+    parser.add_argument("--softmax", type=_floats, default=[.5, .85])
+    parser.add_argument("--trans-sensitivity", type=_floats, default=[1.])
+    parser.add_argument("--rot-sensitivity", type=_floats, default=[1.])
+    parser.add_argument("--trans-deadband", type=_floats, default=[.05, .1, .15])
+    parser.add_argument("--rot-deadband", type=_floats, default=[.05, .1, .15])
+    parser.add_argument("--weights", type=_weights, default=None, help="e.g. lag=2,jitter=1,crosstalk=1,loss=1")
+    parser.add_argument("--max-loss", type=float, default=SWEEP_MAX_LOSS,
+                        help="reject settings that remove more than this share of the motion")
+    parser.add_argument("--rate", type=float, default=SWEEP_RATE, help="grid (Hz) for lag and jitter")
+    parser.add_argument("--max-lag", type=float, default=SWEEP_MAX_LAG, help="longest lag (s) considered")
+    parser.add_argument("--workers", type=int, default=None, help="processes, defaults to the number of cores")
+    parser.add_argument("--top", type=int, default=20, help="rows to print")
+    parser.add_argument("--csv", help="write all rows to this file")
+    parser.add_argument("--json", help="write all rows to this file")
+    args = parser.parse_args(argv)
+
+    episode_dirs = []
+    for path in args.recordings:
+        episode_dirs.extend(list_episodes(path) or [path])
+    if not episode_dirs:
+        print("No episodes found", file=sys.stderr)
+        return 1
+    grid = make_grid_params(args.smoothing, args.softmax, args.trans_sensitivity, args.rot_sensitivity,
+                            args.trans_deadband, args.rot_deadband)
+    print(f"{len(grid)} settings over {len(episode_dirs)} episodes")
+    rows = sweep(episode_dirs, grid, args.weights, args.rate, args.max_lag, args.workers, args.max_loss)
+    print_table(rows, args.top)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+
+import collections
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from srl.spacemouse.device import DeviceSpec
+from srl.spacemouse.log import log_info
+from srl.spacemouse.spacemouse import SpaceMouse, TELEOP_CONTROL_RATE
+
+REPORT_LENGTH = 13
+AXIS_NAMES = ("x", "y", "z", "r", "p", "ya")
+BUTTON_CHANNEL = 3
+SIGNAL_KINDS = ("constant", "step", "ramp", "sine", "noise", "burst")
+SYNTHETIC_REPORT_RATE = 1000.0
+
+
+def _to_int16(value: float, axis_scale: float, flip: float) -> int:
+    raw = int(round(value * axis_scale / flip))
+    return min(max(raw, -32768), 32767)
+
+
+def encode_reports(spec: DeviceSpec, values: Sequence[float], buttons: int = 0, include_buttons: bool = True) -> List[bytes]:
+    """ Build the HID reports a device of this spec would send for the given state. Decoding them with
+        `SpaceMouse.process` gives back `values` (up to int16 quantization and clipping to [-1, 1]).
+
+    Args:
+        spec (DeviceSpec): device to imitate
+        values (Sequence[float]): x, y, z, roll, pitch, yaw in [-1, 1]
+        buttons (int): button bitfield, in the order of spec.button_mapping
+        include_buttons (bool): also emit the button report
+
+    Returns:
+        List[bytes]: one 13-byte report per channel, in channel order
+    """
+    reports: Dict[int, bytearray] = {}
+    for axis, value in zip(AXIS_NAMES, values):
+        chan, b1, b2, flip = spec.mappings[axis]
+        report = reports.setdefault(chan, bytearray(REPORT_LENGTH))
+        report[0] = chan
+        low, high = _to_int16(value, spec.axis_scale, flip).to_bytes(2, "little", signed=True)
+        report[b1] = low
+        report[b2] = high
+    if include_buttons:
+        report = reports.setdefault(BUTTON_CHANNEL, bytearray(REPORT_LENGTH))
+        report[0] = BUTTON_CHANNEL
+        for index, (_, chan, byte, bit) in enumerate(spec.button_mapping):
+            if (buttons >> index) & 1:
+                report[byte] |= 1 << bit
+    return [bytes(reports[chan]) for chan in sorted(reports)]
+
+
+class AxisSignal:
+    """ A seeded test signal for one axis, evaluated at a time in seconds and clipped to [-1, 1].
+
+        constant: offset
+        step: square wave, +amplitude for the first `duty` of every period and -amplitude after
+        ramp: triangle wave between -amplitude and +amplitude
+        sine: amplitude * sin(2 pi t / period + phase)
+        noise: gaussian with standard deviation amplitude, drawn fresh every sample
+        burst: sine during the first `duty` of every period, zero (the puck at rest) otherwise
+
+        `noise` adds gaussian noise with that standard deviation on top of any kind.
+    """
+    def __init__(self, kind: str = "sine", amplitude: float = 1.0, period: float = 1.0, phase: float = 0.0,
+                 offset: float = 0.0, duty: float = 0.5, noise: float = 0.0) -> None:
+        if kind not in SIGNAL_KINDS:
+            raise ValueError(f"Unknown signal kind {kind}, expected one of {SIGNAL_KINDS}")
+        self.kind = kind
+        self.amplitude = amplitude
+        self.period = period
+        self.phase = phase
+        self.offset = offset
+        self.duty = duty
+        self.noise = noise
+
+    def __call__(self, t: float, rng: np.random.Generator) -> float:
+        cycle = (t / self.period + self.phase / (2 * np.pi)) % 1.0
+        if self.kind == "constant":
+            value = 0.0
+        elif self.kind == "step":
+            value = self.amplitude if cycle < self.duty else -self.amplitude
+        elif self.kind == "ramp":
+            value = self.amplitude * (4 * abs(cycle - 0.5) - 1)
+        elif self.kind == "sine":
+            value = self.amplitude * np.sin(2 * np.pi * cycle)
+        elif self.kind == "noise":
+            value = rng.normal(0.0, self.amplitude)
+        else:
+            value = self.amplitude * np.sin(2 * np.pi * cycle / self.duty) if cycle < self.duty else 0.0
+        if self.noise:
+            value += rng.normal(0.0, self.noise)
+        return min(max(value + self.offset, -1.0), 1.0)
+
+
+def default_signals() -> List[AxisSignal]:
+    """ Slow sines with different periods on every axis, so all of them move and none move together """
+    return [AxisSignal("sine", amplitude=0.8, period=1.0 + 0.37 * i) for i in range(len(AXIS_NAMES))]
+
+
+class SyntheticHidDevice:
+    """ Stands in for `hid.device`, producing the reports of a `DeviceSpec` from test signals.
+
+        Reports are paced to report_rate on a fixed schedule; a reader that falls behind gets the overdue
+        reports back to back, like it would from the kernel's buffer. Each time step sends the axis reports
+        (one per channel) and, when the buttons changed, the button report.
+    """
+    def __init__(self, spec: DeviceSpec, signals: Optional[Sequence[AxisSignal]] = None,
+                 report_rate: float = SYNTHETIC_REPORT_RATE, seed: int = 0, button_toggle_rate: float = 0.0,
+                 disconnect_after: Optional[int] = None) -> None:
+        """
+        Args:
+            spec (DeviceSpec): device to imitate
+            signals (Sequence[AxisSignal], optional): one signal per axis (x, y, z, roll, pitch, yaw)
+            report_rate (float): HID reports per second
+            seed (int): seed for noise and buttons
+            button_toggle_rate (float): average button toggles per second, each flipping a random button
+            disconnect_after (int, optional): raise OSError after this many reports, like an unplugged device
+        """
+        self.spec = spec
+        self.signals = list(signals) if signals is not None else default_signals()
+        if len(self.signals) != len(AXIS_NAMES):
+            raise ValueError(f"Expected {len(AXIS_NAMES)} signals, got {len(self.signals)}")
+        self.report_rate = report_rate
+        self.button_toggle_rate = button_toggle_rate
+        self.disconnect_after = disconnect_after
+        self.report_count = 0
+        self._rng = np.random.default_rng(seed)
+        self._pending = collections.deque()
+        self._buttons = 0
+        self._start = None
+        self._next_due = None
+        self._closed = False
+
+    def open(self, vendor_id: int = 0, product_id: int = 0) -> None:
+        self._start = time.perf_counter()
+        self._next_due = self._start
+
+    def close(self) -> None:
+        self._closed = True
+
+    def get_manufacturer_string(self) -> str:
+        return "Synthetic"
+
+    def get_product_string(self) -> str:
+        return self.spec.name
+
+    def _generate(self, t: float) -> None:
+        values = [signal(t, self._rng) for signal in self.signals]
+        buttons = self._buttons
+        if self.button_toggle_rate and self.spec.button_mapping:
+            # Each time step covers as many reports as there are axis channels
+            step_time = len({spec.channel for spec in self.spec.mappings.values()}) / self.report_rate
+            if self._rng.random() < self.button_toggle_rate * step_time:
+                buttons ^= 1 << int(self._rng.integers(len(self.spec.button_mapping)))
+        self._pending.extend(encode_reports(self.spec, values, buttons, include_buttons=buttons != self._buttons))
+        self._buttons = buttons
+
+    def read(self, length: int, timeout_ms: float = 0) -> List[int]:
+        if self._closed or self._start is None:
+            raise OSError("read error")
+        if self.disconnect_after is not None and self.report_count >= self.disconnect_after:
+            raise OSError("read error")
+        now = time.perf_counter()
+        wait = self._next_due - now
+        if wait > 0:
+            if wait * 1000 > timeout_ms:
+                time.sleep(timeout_ms / 1000)
+                return []
+            time.sleep(wait)
+        if not self._pending:
+            self._generate(self._next_due - self._start)
+        self._next_due += 1.0 / self.report_rate
+        self.report_count += 1
+        return list(self._pending.popleft()[:length])
+
+
+class SyntheticSpaceMouse(SpaceMouse):
+    """ A SpaceMouse fed by a `SyntheticHidDevice` instead of USB. The real decoding and publishing run
+        unchanged, so anything that works with a SpaceMouse can be load tested without hardware.
+    """
+    def __init__(self, spec: DeviceSpec, control_rate=TELEOP_CONTROL_RATE, auto_reconnect=False,
+                 signals: Optional[Sequence[AxisSignal]] = None, report_rate: float = SYNTHETIC_REPORT_RATE,
+                 seed: int = 0, button_toggle_rate: float = 0.0, disconnect_after: Optional[int] = None):
+        """ See SyntheticHidDevice for the synthetic arguments """
+        super().__init__(spec, control_rate, auto_reconnect)
+        self._spec = spec
+        self._device_args = dict(signals=signals, report_rate=report_rate, seed=seed,
+                                 button_toggle_rate=button_toggle_rate, disconnect_after=disconnect_after)
+
+    def _open_device(self) -> bool:
+        self.device = SyntheticHidDevice(self._spec, **self._device_args)
+        self.device.open()
+        log_info(f"Opened synthetic {self.name} at {self.device.report_rate:.0f} reports/s")
+        return True
+
+    def _reconnect(self) -> bool:
+        # There's nothing to wait for; come straight back, without the disconnect this time
+        self._device_args["disconnect_after"] = None
+        return self._open_device()
@@ -0,0 +1,90 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+""" Timeline tracing of the input pipeline, exported as Chrome trace JSON (chrome://tracing, ui.perfetto.dev).
+
+    Spans are kept as tuples in a bounded deque, so recording one is an append without locking, and the oldest
+    spans are dropped once the buffer is full. Timestamps come from `time.perf_counter_ns`, i.e. the monotonic
+    clock on Linux, so a trace can be lined up against other traces of this machine (e.g. Kit's profiler)
+    that use the same clock.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+TRACE_CAPACITY = 100000
+
+
+class _Span:
+    """ Context manager recording the time spent in its block """
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, args: Optional[Dict]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.tracer.add(self.name, self.start, self.args)
+
+
+class Tracer:
+    """ Bounded in-memory buffer of named spans, each tagged with the thread that recorded it """
+    def __init__(self, capacity: int = TRACE_CAPACITY) -> None:
+        self.capacity = capacity
+        # (name, thread id, start ns, duration ns, args or None)
+        self._spans = deque(maxlen=capacity)
+        self._thread_names: Dict[int, str] = {}
+        self.recorded = 0
+
+    def add(self, name: str, start_ns: int, args: Optional[Dict] = None) -> None:
+        """ Record a span from start_ns (`time.perf_counter_ns()`) until now """
+        end = time.perf_counter_ns()
+        tid = threading.get_ident()
+        if tid not in self._thread_names:
+            self._thread_names[tid] = threading.current_thread().name
+        self._spans.append((name, tid, start_ns, end - start_ns, args))
+        self.recorded += 1
+
+    def span(self, name: str, args: Optional[Dict] = None) -> _Span:
+        """ with tracer.span("step"): ... records the block, e.g. to line up your own code with the input """
+        return _Span(self, name, args)
+
+    def clear(self) -> None:
+        self._spans.clear()
+        self.recorded = 0
+
+    @property
+    def dropped(self) -> int:
+        return max(0, self.recorded - self.capacity)
+
+    def to_chrome_trace(self) -> Dict:
+        """ The buffered spans as a Chrome trace event dict, oldest first """
+        pid = os.getpid()
+        spans = list(self._spans)
+        events: List[Dict] = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "srl.spacemouse"}}]
+        for tid, thread_name in list(self._thread_names.items()):
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}})
+        for name, tid, start, duration, args in spans:
+            event = {"name": name, "ph": "X", "pid": pid, "tid": tid, "ts": start / 1e3, "dur": duration / 1e3}
+            if args:
+                event["args"] = args
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"clock": "perf_counter_ns", "dropped_spans": self.dropped}}
+
+    def dump(self, path: str) -> str:
+        """ Write the trace to path and return its absolute path """
+        path = os.path.abspath(os.path.expanduser(path))
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+        return path
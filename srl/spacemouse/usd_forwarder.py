@@ -0,0 +1,160 @@
+# Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Licensed under the MIT License [see LICENSE for details].
+
+
+import abc
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+# Attribute names written onto the target prim
+XYZ_ATTR = "spacemouse:xyz"
+RPY_ATTR = "spacemouse:rpy"
+BUTTONS_ATTR = "spacemouse:buttons"
+STAMP_ATTR = "spacemouse:t"
+
+FORWARDER_RATE = 60
+FORWARDER_EPSILON = 1e-4
+
+
+class AttributeSink(abc.ABC):
+    """ Destination for forwarded device values. Implementations receive every changed attribute for a prim
+        in one call and are expected to apply them as a single batch.
+    """
+    @abc.abstractmethod
+    def write(self, prim_path: str, values: Dict[str, Any]) -> None:
+        pass
+
+
+class InMemoryAttributeSink(AttributeSink):
+    """ Stand-in for a USD stage. Keeps the last value of every attribute and counts writes so that the
+        forwarder can be exercised without Kit.
+    """
+    def __init__(self) -> None:
+        self.attributes: Dict[str, Dict[str, Any]] = {}
+        self.batch_count = 0
+        self.write_count = 0
+
+    def write(self, prim_path: str, values: Dict[str, Any]) -> None:
+        self.attributes.setdefault(prim_path, {}).update(values)
+        self.batch_count += 1
+        self.write_count += len(values)
+
+    def get(self, prim_path: str, name: str) -> Any:
+        return self.attributes.get(prim_path, {}).get(name)
+
+
+class UsdAttributeSink(AttributeSink):
+    """ Writes values as attributes on a prim of a USD stage. All attributes of a batch are set inside one
+        `Sdf.ChangeBlock`, so listeners on the stage receive a single notification per batch.
+    """
+    def __init__(self, stage) -> None:
+        from pxr import Sdf
+        self._stage = stage
+        self._type_names = {
+            XYZ_ATTR: Sdf.ValueTypeNames.Float3,
+            RPY_ATTR: Sdf.ValueTypeNames.Float3,
+            BUTTONS_ATTR: Sdf.ValueTypeNames.Int,
+            STAMP_ATTR: Sdf.ValueTypeNames.Double,
+        }
+        self._attributes = {}
+
+    @property
+    def stage(self):
+        return self._stage
+
+    def _get_attribute(self, prim_path: str, name: str):
+        key = (prim_path, name)
+        attr = self._attributes.get(key)
+        if attr is None or not attr.IsValid():
+            prim = self._stage.GetPrimAtPath(prim_path)
+            if not prim.IsValid():
+                prim = self._stage.DefinePrim(prim_path)
+            attr = prim.GetAttribute(name)
+            if not attr.IsValid():
+                attr = prim.CreateAttribute(name, self._type_names[name])
+            self._attributes[key] = attr
+        return attr
+
+    def write(self, prim_path: str, values: Dict[str, Any]) -> None:
+        from pxr import Sdf
+        # Authoring new prims or attributes isn't safe inside a change block, so resolve them first
+        attrs = [(self._get_attribute(prim_path, name), value) for name, value in values.items()]
+        with Sdf.ChangeBlock():
+            for attr, value in attrs:
+                attr.Set(value)
+
+
+class SpaceMouseUsdForwarder:
+    """ Forwards the filtered device state onto attributes of a prim, so that other extensions can consume
+        SpaceMouse input through USD.
+
+        Call `update()` regularly (e.g. from an app update subscription); it polls the device at most `rate`
+        times per second and only writes attributes whose value moved by more than `epsilon` since the last
+        write. Every USD write triggers stage notifications, so unchanged values are never written. Coming to
+        rest always writes exact zeros, however close the last written value was.
+    """
+    def __init__(self, device, sink: AttributeSink, prim_path: str = "/SpaceMouse", rate: float = FORWARDER_RATE, epsilon: float = FORWARDER_EPSILON) -> None:
+        self.device = device
+        self._sink = sink
+        self.prim_path = prim_path
+        self.rate = rate
+        self.epsilon = epsilon
+        self._last_update = float('-inf')
+        self._last_xyz = None
+        self._last_rpy = None
+        self._last_buttons = None
+
+    @property
+    def sink(self) -> AttributeSink:
+        return self._sink
+
+    def reset(self) -> None:
+        """ Forget what was last written so that the next update writes every attribute again """
+        self._last_update = float('-inf')
+        self._last_xyz = None
+        self._last_rpy = None
+        self._last_buttons = None
+
+    def update(self, now: Optional[float] = None) -> bool:
+        """ Returns:
+            bool: whether anything was written to the sink
+        """
+        if now is None:
+            now = time.monotonic()
+        if self.rate > 0 and now - self._last_update < 1.0 / self.rate:
+            return False
+        self._last_update = now
+
+        control = self.device.get_controller_state()
+        if control is None:
+            return False
+
+        changed = {}
+        if self._moved(control.xyz, self._last_xyz):
+            self._last_xyz = np.array(control.xyz)
+            changed[XYZ_ATTR] = tuple(float(v) for v in control.xyz)
+        if self._moved(control.rpy, self._last_rpy):
+            self._last_rpy = np.array(control.rpy)
+            changed[RPY_ATTR] = tuple(float(v) for v in control.rpy)
+        if control.buttons != self._last_buttons:
+            self._last_buttons = control.buttons
+            changed[BUTTONS_ATTR] = int(control.buttons)
+        if not changed:
+            return False
+
+        # The stamp only goes out together with a change, otherwise it would force a write every time
+        changed[STAMP_ATTR] = float(control.t)
+        self._sink.write(self.prim_path, changed)
+        return True
+
+    def _moved(self, value: np.ndarray, last: Optional[np.ndarray]) -> bool:
+        if last is None:
+            return True
+        if not value.any():
+            # Consumers test for rest with == 0, so a small leftover must not survive the epsilon check
+            return bool(last.any())
+        return bool(np.any(np.abs(value - last) > self.epsilon))